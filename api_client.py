@@ -0,0 +1,64 @@
+import json
+
+import requests
+
+
+class ApiClient:
+  """Client of the HTTP API of server.py with the `run(query, onStatus)` interface of Orchestrator, so the
+  Streamlit app can be a thin client of a server pool instead of running the agents itself.
+
+  Args:
+    baseUrl (str): Base URL of the server, e.g. http://localhost:8000.
+    user (str): User name the session is created for.
+    timeout (float): Seconds to wait for the next event of a running query.
+  """
+
+  def __init__(self, baseUrl: str, user: str | None = None, timeout: float = 300):
+    self.baseUrl = baseUrl.rstrip("/")
+    self.user = user
+    self.timeout = timeout
+    self.sessionId: str | None = None
+
+  def createSession(self) -> str:
+    response = requests.post(f"{self.baseUrl}/sessions", json={"user": self.user}, timeout=10)
+    response.raise_for_status()
+    self.sessionId = response.json()["sessionId"]
+    return self.sessionId
+
+  def history(self) -> list[dict]:
+    if self.sessionId is None:
+      return []
+    response = requests.get(f"{self.baseUrl}/sessions/{self.sessionId}", timeout=10)
+    response.raise_for_status()
+    return response.json()["history"]
+
+  def run(self, query: str, onStatus=None) -> str:
+    """Answer `query` in this client's session, reporting stage updates of the server to `onStatus`. An exception
+    raised by `onStatus`, e.g. JobCancelled, closes the stream, which cancels the query on the server."""
+    if self.sessionId is None:
+      self.createSession()
+    response = self._post(query)
+    if response.status_code == 404:
+      # the session expired on the server, the conversation starts over
+      self.createSession()
+      response = self._post(query)
+    with response:
+      response.raise_for_status()
+      event = None
+      for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+          event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+          data = json.loads(line[len("data:"):])
+          if event == "status" and onStatus is not None:
+            onStatus(data["status"])
+          elif event == "message":
+            return data["response"]
+          elif event == "error":
+            raise RuntimeError(data["error"])
+    raise ConnectionError("The server closed the stream without an answer")
+
+  def _post(self, query: str) -> requests.Response:
+    return requests.post(
+        f"{self.baseUrl}/sessions/{self.sessionId}/messages", params={"stream": 1}, json={"query": query},
+        stream=True, timeout=(10, self.timeout))
@@ -1,15 +1,33 @@
+import os
+import re
+import math
 import time
-import json
-from datetime import datetime, timedelta
-from typing import Dict, Any
 import streamlit as st
 import argparse
-import base64
+from PIL import Image
+import folium
+from folium.plugins import PolyLineFromEncoded
+from streamlit_folium import st_folium
 
-from database_agent import queryDatabase
+from jobs import JOBS
+from user_store import getUserStore, defaultPreferences
+from route_geometry import getGeometryStore, levelForZoom, zoomForBounds
 
-CONFIG_DIR = "user_config"
 BG_IMAGE = "antonella-messaglia.png"
+# served by Streamlit under app/static/ (server.enableStaticServing)
+STATIC_DIR = "static"
+BG_MAX_WIDTH = 1920
+# with CHAT_HISTORY_WINDOW set, older messages are hidden behind a button so a rerun renders at most this many.
+# 0 (default) renders the full history
+HISTORY_WINDOW = int(os.environ.get("CHAT_HISTORY_WINDOW", 0))
+# typing effect, seconds per streamed word
+STREAM_DELAY = 0.02
+# seconds between status refreshes while the orchestrator runs in the background
+POLL_INTERVAL = 0.2
+# route geometries of a map view are cached this long, viewports are snapped to this grid (degrees) to share entries
+GEOMETRY_TTL = 3600
+VIEWPORT_GRID = 0.05
+MAP_HEIGHT = 400
 
 # take a username as arg from the command line
 
@@ -22,6 +40,57 @@ def parse_args():
   return parser.parse_args()
 
 
+def optimizeImage(imgPath: str, maxWidth: int = BG_MAX_WIDTH, quality: int = 80) -> str:
+  """Write a downscaled WebP copy of `imgPath` to STATIC_DIR unless it already exists and return its static URL."""
+  name = os.path.splitext(os.path.basename(imgPath))[0] + ".webp"
+  target = os.path.join(STATIC_DIR, name)
+  if not os.path.exists(target):
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    with Image.open(imgPath) as img:
+      img.thumbnail((maxWidth, maxWidth))
+      img.save(target, "WEBP", quality=quality, method=6)
+  return f"app/static/{name}"
+
+
+@st.cache_resource
+def backgroundCss(imgPath: str) -> str:
+  """Build the background CSS once per process. The image is referenced by URL, so the browser caches it
+  instead of receiving it inline with every rerun."""
+  return f"""
+    <style>
+    [data-testid="stAppViewContainer"] {{
+    background-image: url("{optimizeImage(imgPath)}");
+    background-size: cover;
+    }}
+    [data-testid="stHeader"] {{
+    background-color: rgba(0, 0, 0, 0);
+    }}
+    [data-testid="stBottom"] > div {{
+    background-color: rgba(0, 0, 0, 0);
+    }}
+    </style>
+    """
+
+
+@st.cache_data(ttl=GEOMETRY_TTL, max_entries=256)
+def mentionedRoutes(text: str) -> list[str]:
+  return getGeometryStore().mentioned(text)
+
+
+@st.cache_data(ttl=GEOMETRY_TTL, max_entries=1024)
+def routeGeometries(titles: tuple, level: int, viewport: tuple | None) -> dict[str, str]:
+  """Encoded polylines of the routes in `viewport` at `level`, shared by all sessions showing the same view."""
+  return getGeometryStore().get(list(titles), level, viewport)
+
+
+def snapViewport(bounds: dict) -> tuple:
+  """Leaflet bounds as (min_lon, min_lat, max_lon, max_lat), widened to VIEWPORT_GRID so small pans hit the cache."""
+  south, west = bounds["_southWest"]["lat"], bounds["_southWest"]["lng"]
+  north, east = bounds["_northEast"]["lat"], bounds["_northEast"]["lng"]
+  snap = lambda value, direction: round(direction(value / VIEWPORT_GRID) * VIEWPORT_GRID, 6)
+  return (snap(west, math.floor), snap(south, math.floor), snap(east, math.ceil), snap(north, math.ceil))
+
+
 class StreamlitApp:
 
   def __init__(self, orchestrator, user):
@@ -41,41 +110,17 @@ class StreamlitApp:
     if config:
       st.session_state.userPreferences = config
     else:
-      st.session_state.userPreferences = {
-          "name": f"{self.user}".capitalize(),
-          "age": None,
-          "distanceKm": 1,
-          "durationHours": 1,
-          "difficulty": 1,
-          "preferredActivities": ["Hiking"],
-          "location": "Trento"
-      }
+      st.session_state.userPreferences = defaultPreferences(self.user)
 
   def loadConfig(self):
-    file = f"{CONFIG_DIR}/{self.user}.json"
-    try:
-      with open(file, "r") as f:
-        return json.load(f)
-    except FileNotFoundError:
-      return {}
-
-  def saveConfig(self, config):
-    filename = f"{CONFIG_DIR}/{self.user}.json"
-    with open(filename, "w") as f:
-      json.dump(config, f, indent=2)
+    return getUserStore().get(self.user)
 
   def updateConfig(self, config, new_config):
-    config.update(new_config)
-    self.saveConfig(config)
-
-  def imgToBase64(self, imgPath: str) -> str:
-    with open(imgPath, "rb") as f:
-      imgFile = f.read()
-      return base64.b64encode(imgFile).decode()
+    config.update(getUserStore().update(self.user, {**config, **new_config}))
 
   def renderSidebar(self):
     st.sidebar.header(
-        f"Welcome back, {st.session_state.userPreferences.get("name", "User")}!")
+        f"Welcome back, {st.session_state.userPreferences.get('name', 'User')}!")
     with st.sidebar.form("preferences_form"):
 
       st.session_state.userPreferences["distanceKm"] = st.slider(
@@ -129,59 +174,106 @@ class StreamlitApp:
           self.loadConfig()
 
   def renderBackground(self):
-    img = self.imgToBase64("assets/" + BG_IMAGE)
-    bg = f"""
-    <style>
-    [data-testid="stAppViewContainer"] {{
-    background-image: url("data:image/jpg;base64,{img}");
-    background-size: cover;
-    }}
-    [data-testid="stHeader"] {{
-    background-color: rgba(0, 0, 0, 0);
-    }}
-    [data-testid="stBottom"] > div {{
-    background-color: rgba(0, 0, 0, 0);
-    }}
-    </style>
-    """
-    st.markdown(bg, unsafe_allow_html=True)
+    st.markdown(backgroundCss("assets/" + BG_IMAGE), unsafe_allow_html=True)
+
+  def renderMessage(self, role: str, content: str):
+    with st.chat_message(role, avatar="🤖" if role == "assistant" else "🧗"):
+      st.markdown(content)
 
+  @st.fragment
   def renderMainChat(self):
-    for i, msg in enumerate(st.session_state.chatHistory):
-      with st.chat_message(msg["role"], avatar="🤖" if msg["role"] == "assistant" else "🧗"):
-        st.markdown(msg["content"])
+    """Chat area as a fragment: a new message reruns only this function, not background and sidebar.
+    With a HISTORY_WINDOW, only its last messages are rendered unless the user asks for the full history."""
+    history = st.session_state.chatHistory
+    hidden = 0
+    if HISTORY_WINDOW and not st.session_state.get("showFullHistory"):
+      hidden = max(0, len(history) - HISTORY_WINDOW)
+    if hidden and st.button(f"Show {hidden} earlier messages"):
+      st.session_state.showFullHistory = True
+      st.rerun(scope="fragment")
+
+    for msg in history[hidden:]:
+      self.renderMessage(msg["role"], msg["content"])
 
     # Chat input
 
+    job = st.session_state.get("pendingJob")
     if userQuery := st.chat_input("Ask me anything about outdoor activities!"):
       st.session_state.chatHistory.append(
           {"role": "user", "content": userQuery})
 
-      with st.chat_message("user", avatar="🧗"):
-        st.markdown(userQuery)
-
-      self.generateResponse(userQuery)
-
-  def generateResponse(self, query: str):
+      self.renderMessage("user", userQuery)
+
+      # a new message supersedes the answer still being prepared
+      if job is not None:
+        job.cancel()
+      job = st.session_state.pendingJob = JOBS.submit(
+          lambda job: self.orchestrator.run(userQuery, onStatus=job.update), after=job)
+
+    # also picks up a run whose previous script run was interrupted, e.g. by a sidebar change
+    if job is not None:
+      self.generateResponse(job)
+
+    self.renderRouteMap()
+
+  @st.fragment
+  def renderRouteMap(self):
+    """Map of the routes the last answer mentions. Zooming or panning reruns only this fragment, which asks for the
+    level of detail of the new zoom and the routes in the new viewport."""
+    answers = [msg["content"] for msg in st.session_state.chatHistory if msg["role"] == "assistant"]
+    if getGeometryStore() is None or not answers:
+      return
+    titles = tuple(mentionedRoutes(answers[-1]))
+    if not titles:
+      return
+
+    view = st.session_state.get("mapView")
+    if view is None or view["titles"] != titles:
+      bounds = getGeometryStore().bounds(list(titles))
+      view = st.session_state.mapView = {"titles": titles, "zoom": zoomForBounds(bounds), "viewport": None, "bounds": bounds}
+    minLon, minLat, maxLon, maxLat = view["bounds"]
+    level = levelForZoom(view["zoom"], (minLat + maxLat) / 2)
+
+    routeMap = folium.Map(tiles="OpenStreetMap")
+    routeMap.fit_bounds([[minLat, minLon], [maxLat, maxLon]])
+    for title, encoded in routeGeometries(titles, level, view["viewport"]).items():
+      PolyLineFromEncoded(encoded, tooltip=title, color="#d9534f", weight=4).add_to(routeMap)
+    state = st_folium(routeMap, key="routeMap", height=MAP_HEIGHT, use_container_width=True, returned_objects=["zoom", "bounds"])
+
+    # fetch again only for another level of detail or when the map left the viewport loaded so far
+    if state and state.get("zoom") and (state.get("bounds") or {}).get("_southWest", {}).get("lat") is not None:
+      viewport = snapViewport(state["bounds"])
+      loaded = view["viewport"]
+      inside = loaded is None or (loaded[0] <= viewport[0] and loaded[1] <= viewport[1] and viewport[2] <= loaded[2] and viewport[3] <= loaded[3])
+      if levelForZoom(state["zoom"], (minLat + maxLat) / 2) != level or not inside:
+        southWest, northEast = state["bounds"]["_southWest"], state["bounds"]["_northEast"]
+        view.update(zoom=state["zoom"], viewport=viewport, bounds=(southWest["lng"], southWest["lat"], northEast["lng"], northEast["lat"]))
+        st.rerun(scope="fragment")
+
+  @staticmethod
+  def streamWords(text: str):
+    for token in re.split(r"(\s+)", text):
+      yield token
+      if token.strip():
+        time.sleep(STREAM_DELAY)
+
+  def generateResponse(self, job):
+    """Wait for a background orchestrator run and show its progress. Only sleeps and status updates happen
+    in the script thread, so Streamlit can interrupt it as soon as the user sends another message."""
     with st.chat_message("assistant", avatar="🤖"):
-      with st.spinner("🤔 Thinking..."):
-
-        response = self.orchestrator.run(query)
-
-        response_placeholder = st.empty()
-        streamed_response = ""
-
-        for char in response:
-          streamed_response += char
-          response_placeholder.markdown(streamed_response + "▌")
-          time.sleep(0.01)
-
-        response_placeholder.markdown(streamed_response)
-
-      st.session_state.chatHistory.append(
-          {"role": "assistant", "content": response})
-
-      st.rerun()
+      with st.status("🤔 Thinking...") as status:
+        while not job.done():
+          status.update(label=job.status)
+          time.sleep(POLL_INTERVAL)
+        status.update(label="Done", state="complete")
+
+      st.session_state.pendingJob = None
+      response = job.result()
+      st.write_stream(self.streamWords(response))
+
+    # the new turn is already on screen, appending is enough: no st.rerun() and no second render of the history
+    st.session_state.chatHistory.append(
+        {"role": "assistant", "content": response})
 
   def run(self):
     self.renderBackground()
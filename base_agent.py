@@ -1,9 +1,21 @@
+import threading
 from datetime import datetime
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.agents import create_tool_calling_agent, AgentExecutor
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.memory import ConversationSummaryBufferMemory
 
+from token_usage import TokenBudget, UsageTracker, UsageCallbackHandler
+from tracing import span, TracingCallbackHandler
+from llm_policy import LLMPolicy, ResilientChatModel
+from recorder import RECORDER, RecordingChatModel
+from rate_limit import getLimiter
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+# smaller/faster tier for classification and argument extraction
+LITE_MODEL = "gemini-2.0-flash-lite"
+
 
 class BaseAgent:
 
@@ -14,7 +26,7 @@ class BaseAgent:
       "Your scratchpad: {agent_scratchpad}"
   )
 
-  def __init__(self, apiKey: str, tools: list = list(), promptTemplate: str | None = None):
+  def __init__(self, apiKey: str, tools: list = list(), promptTemplate: str | None = None, budget: TokenBudget | None = None, policy: LLMPolicy | None = None, model: str = DEFAULT_MODEL):
     """Agent base class using the LangChain API. 
     Steps to instantiate an agent executor:
     1. Define tools
@@ -28,19 +40,60 @@ class BaseAgent:
         apiKey (str): API key for the LLM model, default is Google's Gemini
         tools (list): List of custom tools to be bound to the agent. Need to be decorated with @tool.
         promptTemplate (str | None): Custom prompt template for the agent. If None, a simple default template is used.
+        budget (TokenBudget | None): Token limits for history and agent output. If None, default limits are used.
+        policy (LLMPolicy | None): Timeout, retry, hedging and fallback settings for the LLM calls. If None, defaults without fallback are used.
+        model (str): Gemini model used by the agent, e.g. LITE_MODEL for agents that only extract tool arguments.
     """
     self.tools = tools
+    self.name = type(self).__name__
+    self.budget = budget or TokenBudget()
+    self.policy = policy or LLMPolicy()
+    self.model = model
+    self.usage = UsageTracker()
+    # held by speculative runs until they are kept or rolled back, see Orchestrator
+    self.runLock = threading.Lock()
     self.llm = self._loadModel(apiKey)
+    self.llm.callbacks = self._buildCallbacks()
     self.prompt = self._buildPrompt(promptTemplate)
     self.executor = self._buildExecutor()
 
-  def _loadModel(self, apiKey) -> ChatGoogleGenerativeAI:
-    """Load a specific model using LangChain wrapper. Model parameters can be changed here."""
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
+  def _loadModel(self, apiKey, model: str | None = None, policy: LLMPolicy | None = None) -> BaseChatModel:
+    """Load a specific model using LangChain wrapper. Model parameters can be changed here.
+    The model is wrapped with an LLMPolicy (deadline, hedging, retries, fallback model), the agent's unless
+    `policy` is given, and the process-wide rate limiter of each model."""
+    model = model or self.model
+    policy = policy or self.policy
+    fallback, fallbackLimiter = None, None
+    # falling back to the same model would only repeat the call that just failed
+    if policy.fallbackModel and policy.fallbackModel != model:
+      fallback = self._createModel(apiKey, policy.fallbackModel, policy.timeout)
+      fallbackLimiter = getLimiter(policy.fallbackModel)
+    return ResilientChatModel(
+        primary=self._createModel(apiKey, model, policy.timeout),
+        fallback=fallback,
+        policy=policy,
+        limiter=getLimiter(model),
+        fallbackLimiter=fallbackLimiter,
+        coalesceKey=model if policy.coalesce else None
+    )
+
+  def _createModel(self, apiKey, model: str, timeout: float | None = None) -> BaseChatModel:
+    # retries are handled by ResilientChatModel, the client only enforces the deadline
+    llm = ChatGoogleGenerativeAI(
+        model=model,
         temperature=0,
-        api_key=apiKey
+        api_key=apiKey,
+        timeout=timeout or self.policy.timeout,
+        max_retries=0
     )
+    if RECORDER.enabled:
+      return RecordingChatModel(inner=llm, service=model)
+    return llm
+
+  def _buildCallbacks(self, name: str | None = None) -> list:
+    """Callbacks attached to every LLM call of this agent: token accounting and tracing."""
+    name = name or self.name
+    return [UsageCallbackHandler(self.usage, name), TracingCallbackHandler(name)]
 
   def _buildPrompt(self, promptTemplate: str | None) -> ChatPromptTemplate:
     """Build a prompt template for the agent using the LangChain wrapper. A simple default template is used if no custom template is provided."""
@@ -57,7 +110,7 @@ class BaseAgent:
         llm=self.llm,
         memory_key="history",
         return_messages=True,
-        max_token_limit=1000,
+        max_token_limit=self.budget.maxHistoryTokens,
         input_key="input",
         output_key="output"
     )
@@ -77,11 +130,30 @@ class BaseAgent:
         memory=self._buildMemory(),
     )
 
-  def run(self, query: str) -> dict:
+  def attachUsage(self, tracker: UsageTracker, name: str | None = None):
+    """Report token usage of this agent to a shared tracker, e.g. the orchestrator's session tracker."""
+    self.usage = tracker
+    self.name = name or self.name
+    self.llm.callbacks = self._buildCallbacks()
+
+  def run(self, query: str, callbacks: list | None = None) -> dict:
     """Run agent with a user query. The query is passed to the LLM and the result is returned as a dict. Get the natural language result with key "output" and the tool call with the key "tool_call".
+    `callbacks` are added to the LangChain callbacks of this run only.
     """
     today = datetime.now().strftime("%Y-%m-%d")
-    return self.executor.invoke({"input": query, "today": today})
+    with span(f"agent.{self.name}.run"):
+      return self.executor.invoke({"input": query, "today": today}, config={"callbacks": callbacks} if callbacks else None)
+
+  def memorySnapshot(self) -> tuple:
+    memory = self.executor.memory
+    return list(memory.chat_memory.messages), memory.moving_summary_buffer
+
+  def restoreMemory(self, snapshot: tuple):
+    """Undo the conversation turns added since `snapshot`, e.g. of a run whose result was discarded."""
+    messages, summary = snapshot
+    memory = self.executor.memory
+    memory.chat_memory.messages = list(messages)
+    memory.moving_summary_buffer = summary
 
   def getChatSummary(self):
     """Get a summary of the chat history. The summary is generated by the LLM and returned as a string."""
@@ -0,0 +1,165 @@
+"""Batch mode: answer the queries of a JSONL file offline, e.g. for evaluation or to precompute recommendations.
+
+Every input line is a JSON object with the query in `query` (or `title` and `body`, as in requests.jsonl), an
+optional `id` (or `request_id`, the line number otherwise) and optionally a `user` whose stored profile to use or
+inline `preferences`. Every query starts a fresh conversation. Queries run concurrently on orchestrators reused
+across queries, sharing the forecast cache, the route source and the per-model rate limiters of the process.
+
+Results are appended to the output as JSON lines in completion order:
+
+  {"id": ..., "query": ..., "response": ..., "error": null, "seconds": ..., "tokens": ..., "llmCalls": ...}
+
+Queries already answered in the output are skipped, so an interrupted run continues where it stopped.
+
+  python batch.py requests.jsonl [--output results.jsonl] [--concurrency 8] [--user dennis] [--retry-errors]
+"""
+import json
+import os
+import sys
+import time
+from concurrent.futures import as_completed
+from contextvars import copy_context
+from typing import Callable
+
+from jobs import JobPool
+from server import OrchestratorPool, loadState
+from token_usage import currentQuery, percentile
+
+BATCH_CONCURRENCY = 8
+# completed queries between two progress lines
+PROGRESS_EVERY = 25
+
+
+def readQueries(path: str, user: str | None = None) -> list[dict]:
+  """Queries of a JSONL file as {"id", "query", "user", "preferences"}. `user` applies to lines without one."""
+  queries = list()
+  with open(path, "r") as f:
+    for number, line in enumerate(f, start=1):
+      if not line.strip():
+        continue
+      record = json.loads(line)
+      query = record.get("query") or "\n".join(str(record[key]) for key in ("title", "body") if record.get(key))
+      if not query:
+        raise ValueError(f"{path}:{number}: no query, title or body")
+      queries.append({
+          "id": str(record.get("id") or record.get("request_id") or number),
+          "query": query,
+          "user": record.get("user", user),
+          "preferences": record.get("preferences"),
+      })
+  return queries
+
+
+def completedIds(path: str, retryErrors: bool = False) -> set[str]:
+  """Ids answered in an earlier run's output. A line cut off by an interruption is ignored."""
+  if not os.path.exists(path):
+    return set()
+  done = set()
+  with open(path, "r") as f:
+    for line in f:
+      try:
+        result = json.loads(line)
+      except json.JSONDecodeError:
+        continue
+      if not (retryErrors and result.get("error")):
+        done.add(result["id"])
+  return done
+
+
+def answer(pool: OrchestratorPool, query: dict) -> dict:
+  """Answer one query in a fresh conversation and measure its latency, tokens and LLM calls. Any error, building
+  the orchestrator or loading the user's profile included, is reported in the result instead of raised."""
+  start = time.monotonic()
+  response, error, tokens, calls = None, None, 0, 0
+  try:
+    with pool.acquire() as orchestrator:
+      # inline preferences replace the stored profile of the user
+      if query["preferences"] is not None:
+        loadState(orchestrator, {"preferences": query["preferences"]})
+      else:
+        loadState(orchestrator, {"user": query["user"]})
+      # loadState starts a fresh usage tracker, the lookups below only scan this query's calls
+      context = copy_context()
+      try:
+        response = context.run(orchestrator.run, query["query"])
+      finally:
+        queryId = context.get(currentQuery)
+        if queryId is not None:
+          tokens = orchestrator.usage.byQuery().get(queryId, 0)
+          calls = orchestrator.usage.calls(queryId=queryId)
+  except Exception as e:
+    error = f"{type(e).__name__}: {e}"
+  return {
+      "id": query["id"],
+      "query": query["query"],
+      "response": response,
+      "error": error,
+      "seconds": round(time.monotonic() - start, 3),
+      "tokens": tokens,
+      "llmCalls": calls,
+  }
+
+
+def runBatch(queries: list[dict], output: str, pool: OrchestratorPool | None = None, concurrency: int = BATCH_CONCURRENCY,
+             progress: Callable[[str], None] | None = None) -> dict:
+  """Answer `queries` with `concurrency` workers, appending each result to `output` as soon as it is available.
+
+  Returns:
+    dict: Number of queries and errors, wall time, queries per minute and p50/p95 latency of this run.
+  """
+  pool = pool or OrchestratorPool()
+  jobs = JobPool(concurrency)
+  start = time.monotonic()
+  latencies, errors = list(), 0
+
+  with open(output, "ab+") as out:
+    # terminate a line cut off by an interruption, so the next result starts on its own line
+    if out.seek(0, os.SEEK_END) > 0:
+      out.seek(-1, os.SEEK_END)
+      if out.read(1) != b"\n":
+        out.write(b"\n")
+  with open(output, "a", encoding="utf-8") as out:
+    futures = [jobs.submit(lambda job, query=query: answer(pool, query)).future for query in queries]
+    for future in as_completed(futures):
+      result = future.result()
+      out.write(json.dumps(result, ensure_ascii=False) + "\n")
+      out.flush()
+      latencies.append(result["seconds"])
+      errors += result["error"] is not None
+      if progress and len(latencies) % PROGRESS_EVERY == 0:
+        elapsed = time.monotonic() - start
+        progress(f"{len(latencies)}/{len(queries)} queries, {60 * len(latencies) / elapsed:.1f}/min")
+
+  seconds = time.monotonic() - start
+  return {
+      "queries": len(latencies),
+      "errors": errors,
+      "seconds": round(seconds, 3),
+      "queriesPerMinute": round(60 * len(latencies) / seconds, 1) if seconds else 0.0,
+      "p50Seconds": percentile(latencies, 50),
+      "p95Seconds": percentile(latencies, 95),
+  }
+
+
+if __name__ == "__main__":
+  import argparse
+  from dotenv import load_dotenv
+
+  parser = argparse.ArgumentParser(description="Answer the queries of a JSONL file")
+  parser.add_argument("input", help="JSONL file with one query per line")
+  parser.add_argument("--output", default="results.jsonl", help="JSONL file the results are appended to")
+  parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Queries answered at the same time")
+  parser.add_argument("--user", help="User whose profile applies to lines without user or preferences")
+  parser.add_argument("--retry-errors", action="store_true", help="Answer queries that failed in an earlier run again")
+  args = parser.parse_args()
+
+  load_dotenv()
+  queries = readQueries(args.input, user=args.user)
+  done = completedIds(args.output, retryErrors=args.retry_errors)
+  pending = [query for query in queries if query["id"] not in done]
+  log = lambda message: print(message, file=sys.stderr)
+  log(f"{len(pending)} of {len(queries)} queries to answer, {len(queries) - len(pending)} already in {args.output}")
+
+  stats = runBatch(pending, args.output, concurrency=args.concurrency, progress=log)
+  log(f"{stats['queries']} queries ({stats['errors']} errors) in {stats['seconds']:.1f}s: "
+      f"{stats['queriesPerMinute']:.1f} queries/min, p50 {stats['p50Seconds']:.2f}s, p95 {stats['p95Seconds']:.2f}s")
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Adventure Advisor Offline Benchmark
+
+Measures the framework overhead of Orchestrator, BaseAgent and the tools without any network access:
+- Gemini is replaced by a scripted FakeChatModel with configurable latency
+- `queryDatabase` runs against a deterministic SQLite route fixture
+- weather and calendar tools return canned responses
+
+Results are stored in .benchmarks/ and can be compared with the previous run:
+  python benchmark.py [--rounds 50] [--latency 0.0] [--compare]
+
+The Streamlit chat render time per turn over a long conversation (echo orchestrator, no typing delay):
+  python benchmark.py --app [--turns 100] [--history-window 20]
+
+Startup cost, resident memory and query latency of a memory-mapped route snapshot (see route_snapshot.py):
+  python benchmark.py --snapshot 1000000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from fake_llm import FakeChatModel
+from database_agent import DatabaseAgent, Route, SqliteRouteSource, setRouteSource, fetchRoutes, queryDatabase, serializeRoutes, ROUTE_COLUMNS, DEFAULT_COLUMNS
+from weather_agent import WeatherAgent
+from calendar_agent import CalendarAgent
+from orchestrator import Orchestrator
+from enrichment import ForecastCache
+from recommendations import RecommendationStore, rankRoutes
+from tracing import traced
+
+RESULTS_DIR = ".benchmarks"
+BENCHMARK_QUERY = "Plan a hike near Trento for this weekend considering weather and my schedule"
+
+CATEGORIES = ["Hiking trail", "Mountain tour", "Mountainbiking", "Trail running", "Alpine tour", "Gravel Bike"]
+REGIONS = [("Trentino", "Dolomites"), ("Brenta", "Dolomites"), ("South Tyrol", "Dolomites"), ("Garda", "Prealps")]
+WEEKEND_QUERY = "Where should I hike this weekend, Trento, Bolzano or Riva del Garda?"
+WEEKEND_LOCATIONS = ["Trento", "Bolzano", "Riva del Garda"]
+WEEKEND_DATES = ["2025-06-07", "2025-06-08"]
+GENERIC_QUERY = "What should I do this weekend?"
+
+
+def routeFixture(size: int = 1000, seed: int = 42) -> SqliteRouteSource:
+  """Deterministic in-memory route catalogue."""
+  rng = random.Random(seed)
+  source = SqliteRouteSource()
+  routes = []
+  for i in range(size):
+    region, primaryRegion = rng.choice(REGIONS)
+    minAltitude = rng.randint(200, 1800)
+    ascent = rng.randint(100, 1800)
+    routes.append(Route(
+        title=f"{rng.choice(CATEGORIES)} {region} #{i}",
+        category=rng.choice(CATEGORIES),
+        difficulty=rng.randint(0, 3),
+        duration_min=rng.randint(30, 600),
+        length_m=rng.randint(2000, 40000),
+        ascent_m=ascent,
+        descent_m=ascent,
+        min_altitude=minAltitude,
+        max_altitude=minAltitude + ascent,
+        experience=rng.randint(0, 6),
+        region=region,
+        primary_region=primaryRegion,
+    ))
+  source.insert(routes)
+  return source
+
+
+# canned stand-ins with the same name and signature as the real tools
+@tool
+@traced("tool.getWeather")
+def getWeather(location: str, date: str) -> dict:
+  """
+  Get the weather forecast for a specific location and date.
+
+  Args:
+    location (str): The location for which to fetch the weather.
+    date (str): The date for which to fetch the weather, in YYYY-MM-DD format.
+  """
+  return {
+      "date": date, "location": location, "sunrise": "05:21", "sunset": "21:02",
+      "avg_temperature": 19, "highest_temperature": 24, "lowest_temperature": 12, "snowfall": 0.0,
+      "rain_chance": {"06:00:00": 0, "09:00:00": 10, "12:00:00": 20, "15:00:00": 40, "18:00:00": 10},
+  }
+
+
+@tool
+@traced("tool.getWeatherBatch")
+def getWeatherBatch(locations: list[str], dates: list[str]) -> str:
+  """
+  Get the weather forecast for several locations and dates in one call, e.g. to compare places over a weekend.
+
+  Args:
+    locations (list[str]): The locations for which to fetch the weather.
+    dates (list[str]): The dates for which to fetch the weather, in YYYY-MM-DD format.
+  """
+  rows = [f"{location}|{date}|19|24|12|0.0|40|05:21|21:02" for location in locations for date in dates]
+  return "\n".join(["location|date|avg_temp|high|low|snowfall|max_rain_chance|sunrise|sunset", *rows])
+
+
+@tool
+@traced("tool.getEvents")
+def getEvents(date: str, timezone: str = "Europe/Berlin"):
+  """Get the events that are stored in the user's calendar.
+  Args:
+      date (str): The date for which to retrieve events in YYYY-MM-DD format.
+      timezone (str): The timezone to use for the date. Defaults to "Europe/Berlin".
+  """
+  return {"date": date, "events": [{"summary": "Dentist", "start": f"{date}T09:00:00+02:00", "end": f"{date}T10:00:00+02:00"}]}
+
+
+def toolCaller(toolName: str, args: dict, finalAnswer: str) -> Callable:
+  """Scripted agent turn: call `toolName` once, then answer with `finalAnswer` once the tool result is in the prompt."""
+  def respond(messages) -> AIMessage | str:
+    prompt = "".join(str(m.content) for m in messages)
+    if "ToolMessage(" in prompt:
+      return finalAnswer
+    return AIMessage(content="", tool_calls=[{"name": toolName, "args": args, "id": f"call-{toolName}"}])
+  return respond
+
+
+def cannedForecasts(locations: list[str]) -> dict:
+  """Stand-in for weather_agent.fetchForecastsBatch: today and WEEKEND_DATES for every location, rain varies by location."""
+  dates = [datetime.now().strftime("%Y-%m-%d"), *WEEKEND_DATES]
+  return {location: {date: {
+      "date": date, "location": location, "sunrise": "05:21", "sunset": "21:02", "avg_temperature": 19,
+      "highest_temperature": 24, "lowest_temperature": 12, "snowfall": 0.0,
+      "rain_chance": {"09:00:00": 10, "15:00:00": 15 * (len(location) % 5)},
+  } for date in dates} for location in locations}
+
+
+def toolSequence(calls: list[tuple[str, dict]], finalAnswer: str) -> Callable:
+  """Scripted agent turns: one tool call per LLM step in the given order, then `finalAnswer`."""
+  def respond(messages) -> AIMessage | str:
+    done = "".join(str(m.content) for m in messages).count("ToolMessage(")
+    if done >= len(calls):
+      return finalAnswer
+    name, args = calls[done]
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call-{name}-{done}"}])
+  return respond
+
+
+class OfflineModels:
+  """Mixin replacing the Gemini client of an agent with a scripted FakeChatModel."""
+
+  def __init__(self, latency: float = 0.0, **kwargs):
+    self.latency = latency
+    super().__init__(apiKey="offline", **kwargs)
+
+  def _createModel(self, apiKey, model: str, timeout: float | None = None) -> FakeChatModel:
+    return FakeChatModel(responder=self.respond, latency=self.latency)
+
+  def respond(self, messages):
+    raise NotImplementedError
+
+
+class OfflineDatabaseAgent(OfflineModels, DatabaseAgent):
+  respond = staticmethod(toolCaller(
+      "queryDatabase", {"category": "Hiking", "region": "Trentino", "difficulty": 1},
+      '{"action": "return_activities", "data": [{"title": "Hiking trail Trentino #7", "location": "Trentino", "length": "12000", "difficulty": "1"}]}'))
+
+
+class OfflineWeatherAgent(OfflineModels, WeatherAgent):
+  def __init__(self, latency: float = 0.0):
+    super().__init__(latency=latency, tools=[getWeather])
+
+  respond = staticmethod(toolCaller(
+      "getWeather", {"location": "Trento", "date": "2025-06-07"},
+      '{"action": "return_weather", "data": {"date": "2025-06-07", "location": "Trento", "forecast": ["24°C, 20% rain"]}}'))
+
+
+class OfflineWeekendWeatherAgent(OfflineModels, WeatherAgent):
+  """Weather agent answering WEEKEND_QUERY with one getWeather call per location and day, or a single getWeatherBatch call."""
+
+  def __init__(self, latency: float = 0.0, batch: bool = False):
+    if batch:
+      calls = [("getWeatherBatch", {"locations": WEEKEND_LOCATIONS, "dates": WEEKEND_DATES})]
+    else:
+      calls = [("getWeather", {"location": location, "date": date}) for location in WEEKEND_LOCATIONS for date in WEEKEND_DATES]
+    self.respond = toolSequence(
+        calls, '{"action": "return_weather", "data": [{"date": "2025-06-07", "location": "Trento", "forecast": ["24°C, 40% rain"]}]}')
+    super().__init__(latency=latency, tools=[getWeather, getWeatherBatch])
+
+
+class OfflineCalendarAgent(OfflineModels, CalendarAgent):
+  def __init__(self, latency: float = 0.0):
+    super().__init__(latency=latency, tools=[getEvents])
+
+  respond = staticmethod(toolCaller(
+      "getEvents", {"date": "2025-06-07"},
+      '{"action": "return_scheduled_events", "data": {"date": "2025-06-07", "events": [{"start": "09:00", "end": "10:00", "summary": "Dentist"}]}}'))
+
+
+class OfflineOrchestrator(OfflineModels, Orchestrator):
+
+  def respond(self, messages) -> str:
+    prompt = "".join(str(m.content) for m in messages)
+    if "intelligent router" in prompt:
+      return "['calendar', 'weather', 'database']"
+    return "Saturday looks great for the Hiking trail Trentino #7: 24°C and only a dentist appointment in the morning."
+
+
+def buildOrchestrator(latency: float = 0.0, speculative: bool = False, user: str | None = None,
+                      recommendations: RecommendationStore | None = None) -> OfflineOrchestrator:
+  agents = {
+      "calendar": OfflineCalendarAgent(latency=latency),
+      "weather": OfflineWeatherAgent(latency=latency),
+      "database": OfflineDatabaseAgent(latency=latency),
+  }
+  return OfflineOrchestrator(latency=latency, agents=agents, forecasts=ForecastCache(cannedForecasts), speculative=speculative,
+                             user=user, recommendations=recommendations)
+
+
+def bench(name: str, func: Callable, rounds: int, warmup: int = 3, setup: Callable | None = None) -> Dict:
+  """Time `func` over `rounds` calls after `warmup` calls and return pytest-benchmark style statistics (seconds)."""
+  for _ in range(warmup):
+    if setup:
+      setup()
+    func()
+
+  times = []
+  for _ in range(rounds):
+    if setup:
+      setup()
+    start = time.perf_counter()
+    func()
+    times.append(time.perf_counter() - start)
+
+  quartiles = statistics.quantiles(times, n=4) if len(times) > 1 else [times[0]] * 3
+  mean = statistics.mean(times)
+  return {
+      "name": name,
+      "rounds": rounds,
+      "min": min(times),
+      "max": max(times),
+      "mean": mean,
+      "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+      "median": statistics.median(times),
+      "iqr": quartiles[2] - quartiles[0],
+      "ops": 1 / mean if mean else float("inf"),
+  }
+
+
+def runBenchmarks(rounds: int = 50, latency: float = 0.0) -> List[Dict]:
+  setRouteSource(routeFixture())
+  orchestrator = buildOrchestrator(latency)
+  agents = orchestrator.agents
+  speculative = buildOrchestrator(latency, speculative=True)
+  # a user without stored profile, whose list the nightly job computed for the empty profile
+  recommendations = RecommendationStore(":memory:")
+  recommendations.put("benchmark", {}, rankRoutes(fetchRoutes(columns=ROUTE_COLUMNS, limit=500), {}))
+  precomputed = buildOrchestrator(latency, user="benchmark", recommendations=recommendations)
+  weekend = {"single": OfflineWeekendWeatherAgent(latency), "batch": OfflineWeekendWeatherAgent(latency, batch=True)}
+  routes = [Route(*(f"v{i}" for i in range(len(ROUTE_COLUMNS)))) for _ in range(50)]
+  candidates = json.dumps({"action": "return_activities", "data": [
+      {"title": f"Route {i}", "location": REGIONS[i % len(REGIONS)][0], "length": "12000", "difficulty": "1"} for i in range(50)]})
+
+  def coldForecasts():
+    orchestrator.forecasts = ForecastCache(cannedForecasts)
+
+  def clearMemory():
+    # measure a fresh turn each round instead of an ever growing history
+    for agent in [orchestrator, speculative, precomputed, *agents.values(), *speculative.agents.values(),
+                  *precomputed.agents.values(), *weekend.values()]:
+      agent.executor.memory.clear()
+
+  return [
+      bench("serializeRoutes[50]", lambda: serializeRoutes(routes), rounds * 10),
+      bench("tool.queryDatabase[sqlite]", lambda: queryDatabase.invoke({"category": "Hiking", "difficulty": 1}), rounds * 10),
+      bench("orchestrator.routing", lambda: orchestrator.routing(BENCHMARK_QUERY), rounds),
+      bench("agent.database.run", lambda: agents["database"].run(BENCHMARK_QUERY), rounds, setup=clearMemory),
+      bench("agent.weather.run", lambda: agents["weather"].run(BENCHMARK_QUERY), rounds, setup=clearMemory),
+      bench("agent.calendar.run", lambda: agents["calendar"].run(BENCHMARK_QUERY), rounds, setup=clearMemory),
+      *[bench(f"agent.weather.weekend[{name}]", lambda agent=agent: agent.run(WEEKEND_QUERY), rounds, setup=clearMemory)
+        for name, agent in weekend.items()],
+      bench("orchestrator.enrich[50, cold]", lambda: orchestrator.enrichActivities(candidates), rounds, setup=coldForecasts),
+      bench("orchestrator.enrich[50, cached]", lambda: orchestrator.enrichActivities(candidates), rounds),
+      bench("orchestrator.summarize", lambda: orchestrator.summarize(BENCHMARK_QUERY, "x" * 2000), rounds),
+      bench("orchestrator.run", lambda: orchestrator.run(BENCHMARK_QUERY), rounds, setup=clearMemory),
+      bench("orchestrator.run[speculative]", lambda: speculative.run(BENCHMARK_QUERY), rounds, setup=clearMemory),
+      bench("orchestrator.run[generic]", lambda: orchestrator.run(GENERIC_QUERY), rounds, setup=clearMemory),
+      bench("orchestrator.run[precomputed]", lambda: precomputed.run(GENERIC_QUERY), rounds, setup=clearMemory),
+  ]
+
+
+def chatScript(root: str, historyWindow: int = 0):
+  """Streamlit script for AppTest, which runs it from a temporary file."""
+  import sys
+  sys.path.insert(0, root)
+  import app
+
+  class EchoOrchestrator:
+    def run(self, query: str, onStatus=None) -> str:
+      return f"You asked: {query}. " + "Saturday looks great for the Hiking trail Trentino #7. " * 10
+
+  app.STREAM_DELAY = 0
+  app.POLL_INTERVAL = 0.001
+  app.HISTORY_WINDOW = historyWindow
+  app.StreamlitApp(EchoOrchestrator(), user="benchmark").run()
+
+
+def runAppBenchmark(turns: int = 100, historyWindow: int = 0) -> List[Dict]:
+  """Render time of every chat turn of one conversation. With a `historyWindow` (see app.HISTORY_WINDOW), it
+  should not grow with the history."""
+  from streamlit.testing.v1 import AppTest
+
+  chat = AppTest.from_function(chatScript, args=(os.path.dirname(os.path.abspath(__file__)), historyWindow), default_timeout=30)
+  chat.run()
+  results = []
+  for turn in range(1, turns + 1):
+    start = time.perf_counter()
+    chat.chat_input[0].set_value(f"{BENCHMARK_QUERY} ({turn})").run()
+    results.append({"turn": turn, "time": time.perf_counter() - start, "messages": len(chat.chat_message)})
+    if chat.exception:
+      raise RuntimeError(chat.exception[0].message)
+  return results
+
+
+def printAppResults(results: List[Dict]):
+  print(f"{'Turn':>6}{'Render (ms)':>14}{'Rendered messages':>20}")
+  print("-" * 40)
+  for r in results:
+    if r["turn"] == 1 or r["turn"] % 10 == 0:
+      print(f"{r['turn']:>6}{r['time'] * 1e3:>14.1f}{r['messages']:>20}")
+  # the first turn includes imports and the image cache
+  times = [r["time"] for r in results[1:]] or [results[0]["time"]]
+  half = len(times) // 2 or 1
+  print(f"\nMedian render: first half {statistics.median(times[:half]) * 1e3:.1f} ms, "
+        f"second half {statistics.median(times[half:] or times) * 1e3:.1f} ms")
+
+
+def residentMemory() -> Dict:
+  """Resident memory of this process in MB: anonymous (private) and file-backed pages, which memory-mapped files
+  share with every other process mapping them. Linux only."""
+  memory = {}
+  with open("/proc/self/status") as f:
+    for line in f:
+      key, _, value = line.partition(":")
+      if key in ("RssAnon", "RssFile"):
+        memory[key] = int(value.split()[0]) / 1024
+  return memory
+
+
+def snapshotFixture(size: int, seed: int = 42):
+  """Route catalogue of `size` rows as a snapshot table, built column-wise to keep the setup fast at 1M rows."""
+  import numpy as np
+  import pyarrow as pa
+  from route_snapshot import SNAPSHOT_SCHEMA
+
+  rng = np.random.default_rng(seed)
+  regions = rng.integers(0, len(REGIONS), size)
+  categories = np.array(CATEGORIES)[rng.integers(0, len(CATEGORIES), size)]
+  minAltitude = rng.integers(200, 1800, size)
+  ascent = rng.integers(100, 1800, size)
+  columns = {
+      "id": np.arange(size),
+      "title": [f"{category} {REGIONS[region][0]} #{i}" for i, (category, region) in enumerate(zip(categories, regions))],
+      "category": categories,
+      "difficulty": rng.integers(0, 4, size),
+      "duration_min": rng.integers(30, 600, size),
+      "length_m": rng.integers(2000, 40000, size),
+      "ascent_m": ascent,
+      "descent_m": ascent,
+      "min_altitude": minAltitude,
+      "max_altitude": minAltitude + ascent,
+      "experience": rng.integers(0, 7, size),
+      "region": np.array([region for region, _ in REGIONS])[regions],
+      "primary_region": np.array([primary for _, primary in REGIONS])[regions],
+      "updated_at": ["2025-06-01T00:00:00"] * size,
+  }
+  return pa.table({name: pa.array(columns[name]) for name in SNAPSHOT_SCHEMA.names}).cast(SNAPSHOT_SCHEMA)
+
+
+def runSnapshotBenchmark(size: int = 1_000_000, rounds: int = 50) -> Dict:
+  """Startup cost, resident memory and query latency of the memory-mapped route snapshot, compared with reading
+  the same file into process memory."""
+  import tempfile
+  import pyarrow as pa
+  from route_snapshot import ArrowRouteSource, readSnapshot, writeSnapshot
+
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "routes.arrow")
+    writeSnapshot(snapshotFixture(size), path)
+    result = {"routes": size, "fileMB": os.path.getsize(path) / 2**20}
+
+    pa.default_memory_pool().release_unused()
+    before = residentMemory()
+    start = time.perf_counter()
+    source = ArrowRouteSource(path)
+    source.table
+    result["mmapOpenMs"] = (time.perf_counter() - start) * 1e3
+    queries = {
+        "category+difficulty": {"category": "hiking", "difficulty": 1},
+        "region+length": {"region": "brenta", "length_m": 20000},
+        "no filter": {},
+    }
+    result["queries"] = {
+        name: bench(name, lambda filters=filters: source.fetch(DEFAULT_COLUMNS, 5, filters), rounds)["median"] * 1e3
+        for name, filters in queries.items()}
+    after = residentMemory()
+    result["mmapAnonMB"] = after["RssAnon"] - before["RssAnon"]
+    result["mmapFileMB"] = after["RssFile"] - before["RssFile"]
+
+    pa.default_memory_pool().release_unused()
+    before = residentMemory()
+    start = time.perf_counter()
+    with pa.OSFile(path, "rb") as f:
+      copied = pa.ipc.open_file(f).read_all()
+    result["readOpenMs"] = (time.perf_counter() - start) * 1e3
+    result["readAnonMB"] = residentMemory()["RssAnon"] - before["RssAnon"]
+    del copied
+  return result
+
+
+def printSnapshotResults(result: Dict):
+  print(f"Snapshot of {result['routes']:,} routes, {result['fileMB']:.1f} MB")
+  print(f"  memory-mapped: open {result['mmapOpenMs']:.1f} ms, private memory +{result['mmapAnonMB']:.1f} MB, "
+        f"shared file pages +{result['mmapFileMB']:.1f} MB")
+  print(f"  read into memory: open {result['readOpenMs']:.1f} ms, private memory +{result['readAnonMB']:.1f} MB")
+  for name, median in result["queries"].items():
+    print(f"  fetch[{name}]: {median:.2f} ms median")
+
+
+def gitCommit() -> str:
+  try:
+    return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return "unknown"
+
+
+def saveResults(results: List[Dict], latency: float) -> str:
+  os.makedirs(RESULTS_DIR, exist_ok=True)
+  runs = sorted(f for f in os.listdir(RESULTS_DIR) if f.endswith(".json"))
+  commit = gitCommit()
+  path = os.path.join(RESULTS_DIR, f"{len(runs) + 1:04d}_{commit}.json")
+  with open(path, "w") as f:
+    json.dump({
+        "datetime": datetime.now().isoformat(),
+        "commit": commit,
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "fake_latency": latency,
+        "benchmarks": results,
+    }, f, indent=2)
+  return path
+
+
+def loadPrevious(exclude: str) -> Dict | None:
+  if not os.path.isdir(RESULTS_DIR):
+    return None
+  runs = sorted(os.path.join(RESULTS_DIR, f) for f in os.listdir(RESULTS_DIR) if f.endswith(".json"))
+  runs = [r for r in runs if os.path.abspath(r) != os.path.abspath(exclude)]
+  if not runs:
+    return None
+  with open(runs[-1]) as f:
+    return json.load(f)
+
+
+def printResults(results: List[Dict], previous: Dict | None = None):
+  baseline = {b["name"]: b for b in previous["benchmarks"]} if previous else {}
+  header = f"{'Name':<34}{'Min (ms)':>11}{'Median (ms)':>13}{'Mean (ms)':>11}{'StdDev':>9}{'OPS':>10}"
+  if baseline:
+    header += f"{'vs ' + previous['commit']:>16}"
+  print(header)
+  print("-" * len(header))
+  for b in results:
+    line = (f"{b['name']:<34}{b['min'] * 1e3:>11.3f}{b['median'] * 1e3:>13.3f}{b['mean'] * 1e3:>11.3f}"
+            f"{b['stddev'] * 1e3:>9.3f}{b['ops']:>10.1f}")
+    if b["name"] in baseline:
+      change = (b["median"] / baseline[b["name"]]["median"] - 1) * 100
+      line += f"{change:>+15.1f}%"
+    print(line)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Offline benchmark of the Adventure Advisor framework overhead")
+  parser.add_argument("--rounds", type=int, default=50, help="Rounds per benchmark")
+  parser.add_argument("--latency", type=float, default=0.0, help="Simulated latency of every fake LLM call in seconds")
+  parser.add_argument("--compare", action="store_true", help="Compare medians with the previous stored run")
+  parser.add_argument("--no-save", action="store_true", help="Do not store the results in .benchmarks/")
+  parser.add_argument("--app", action="store_true", help="Benchmark the Streamlit chat render time per turn instead")
+  parser.add_argument("--turns", type=int, default=100, help="Conversation length of the --app benchmark")
+  parser.add_argument("--history-window", type=int, default=0, help="Messages rendered by the --app benchmark, 0 for all")
+  parser.add_argument("--snapshot", type=int, metavar="ROUTES",
+                      help="Benchmark startup, memory and queries of a route snapshot of this size instead, e.g. 1000000")
+  args = parser.parse_args()
+
+  if args.app:
+    printAppResults(runAppBenchmark(args.turns, args.history_window))
+    return
+  if args.snapshot:
+    printSnapshotResults(runSnapshotBenchmark(args.snapshot, args.rounds))
+    return
+
+  results = runBenchmarks(args.rounds, args.latency)
+  path = "" if args.no_save else saveResults(results, args.latency)
+  printResults(results, loadPrevious(path) if args.compare else None)
+  if path:
+    print(f"\nResults saved to: {path}")
+
+
+if __name__ == "__main__":
+  main()
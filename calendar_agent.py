@@ -13,10 +13,13 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from base_agent import BaseAgent
+from tracing import traced
+from recorder import recorded
 
 load_dotenv()
 
-CREDENTIALS = json.loads(os.environ["GOOGLE_OAUTH_CREDENTIALS"])
+# empty when not configured, the OAuth flow in `getEvents` fails then instead of the import
+CREDENTIALS = json.loads(os.environ.get("GOOGLE_OAUTH_CREDENTIALS", "{}"))
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 CALENDAR_PROMPT_TEMPLATE = (
     "You are a helpful assistant that helps users check their calendar for events and time conflicts."
@@ -46,6 +49,8 @@ CALENDAR_PROMPT_TEMPLATE = (
 
 
 @tool
+@traced("tool.getEvents")
+@recorded("google-calendar")
 def getEvents(date: str, timezone: str = "Europe/Berlin"):
   """Get the events that are stored in the user's calendar.
   Args:
@@ -122,9 +127,10 @@ class CalendarAgent(BaseAgent):
   Specialized agent for fetching calendar events, uses LangChain framework and the Google Calendar API to get calendar data.
   """
 
-  def __init__(self, apiKey, tools=TOOLS, promptTemplate=CALENDAR_PROMPT_TEMPLATE):
+  def __init__(self, apiKey, tools=TOOLS, promptTemplate=CALENDAR_PROMPT_TEMPLATE, **kwargs):
     super().__init__(
         apiKey=apiKey,
         tools=tools,
-        promptTemplate=promptTemplate
+        promptTemplate=promptTemplate,
+        **kwargs
     )
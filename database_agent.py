@@ -1,8 +1,16 @@
 import os
+import csv
+import io
+import sqlite3
+import threading
+from contextvars import ContextVar
+from typing import NamedTuple
 from dotenv import load_dotenv
 from supabase import create_client
 from langchain_core.tools import tool
 from base_agent import BaseAgent
+from tracing import traced
+from recorder import recorded
 
 load_dotenv()
 
@@ -13,7 +21,8 @@ QUERY_PROMPT_TEMPLATE = (
     "You are a database query generator. Given a natural language query, you will utilize the tool `queryDatabase` to retrieve data from a Supabase database of hiking, biking, and other outdoor sports activities.\n\n"
     "Your job has two steps:\n"
     "1. Extract any relevant filters from the user query (e.g. category, difficulty, duration, region, etc.) and use them **as arguments to the tool**.\n"
-    "2. Take the response from the tool and generate a final JSON output like this:\n"
+    "2. The tool returns a compact table: the first line holds the column names, each following line is one activity, fields separated by '|'.\n"
+    "3. Take the response from the tool and generate a final JSON output like this:\n"
     """{{
     "action": "return_activities",
     "data": [
@@ -62,7 +71,202 @@ QUERY_PROMPT_TEMPLATE = (
 )
 
 
+class Route(NamedTuple):
+  """Single row of the `hiking_routes` table. Fields that were not selected by the column projection stay None.
+  NamedTuple keeps rows small (no per-instance __dict__), which matters when large candidate sets are cached."""
+  title: str | None = None
+  category: str | None = None
+  difficulty: int | None = None
+  duration_min: int | None = None
+  length_m: int | None = None
+  ascent_m: int | None = None
+  descent_m: int | None = None
+  min_altitude: int | None = None
+  max_altitude: int | None = None
+  experience: int | None = None
+  region: str | None = None
+  primary_region: str | None = None
+
+
+ROUTE_COLUMNS = Route._fields
+# columns returned by `queryDatabase`, change to project more or fewer fields into the agent prompt
+DEFAULT_COLUMNS = ("title", "region", "length_m", "difficulty")
+
+
+# how each filter is applied to its column
+STRING_FIELDS = {"category", "region", "primary_region"}
+LTE_FIELDS = {"max_altitude", "descent_m"}
+EQ_FIELDS = {"experience", "difficulty"}
+GTE_FIELDS = {"duration_min", "length_m", "ascent_m", "min_altitude"}
+
+# values of the `category` column, as listed in the `queryDatabase` docstring
+ROUTE_CATEGORIES = (
+    "Long distance cycling", "Winter hiking", "Alpine tour", "MTB Transalp", "Trail running", "Cycle routes", "Mountainbiking",
+    "Gravel Bike", "Hiking with kids", "Long distance hiking trail", "Mountain tour", "Alpine climbing", "Hiking trail",
+)
+
+# sidebar activities to a `category` substring matching the route categories
+ACTIVITY_CATEGORIES = {
+    "Hiking": "hiking",
+    "Cycling": "cycl",
+    "Running": "running",
+    "Climbing": "climbing",
+}
+
+# filters applied by `queryDatabase` to arguments the model left open, set per query by the orchestrator
+queryDefaults: ContextVar[dict | None] = ContextVar("queryDefaults", default=None)
+
+
+def preferenceFilters(preferences: dict) -> dict:
+  """Route filters implied by the user preferences: sidebar difficulty 1-5 mapped onto 0-3 and the first
+  preferred activity as category."""
+  filters = dict()
+  if preferences.get("difficulty"):
+    filters["difficulty"] = round((preferences["difficulty"] - 1) * 3 / 4)
+  for activity in preferences.get("preferredActivities") or []:
+    if activity in ACTIVITY_CATEGORIES:
+      filters["category"] = ACTIVITY_CATEGORIES[activity]
+      break
+  return filters
+
+
+class SupabaseRouteSource:
+  """Routes from Supabase. The client is created once and reused for every query."""
+
+  def __init__(self, url: str | None = URL, key: str | None = KEY, table: str = "random_hiking_routes"):
+    """NB: query from 'random_hiking_routes' for server-side shuffling. 'hiking_routes' is the original table"""
+    self.url = url
+    self.key = key
+    self.table = table
+    self._client = None
+
+  def fetch(self, columns: tuple, limit: int, filters: dict) -> list[Route]:
+    if self._client is None:
+      self._client = create_client(self.url, self.key)
+    query = self._client.from_(self.table).select(", ".join(columns))
+
+    for field, value in filters.items():
+      if value is None:
+        continue
+
+      if field in STRING_FIELDS and isinstance(value, str):
+        query = query.ilike(field, f"%{value}%")
+      elif field in LTE_FIELDS and isinstance(value, int):
+        query = query.lte(field, value)
+      elif field in GTE_FIELDS and isinstance(value, int):
+        query = query.gte(field, value)
+      elif field in EQ_FIELDS:
+        query = query.eq(field, value)
+
+    response = query.limit(limit).execute()
+    return [Route(**{col: row.get(col) for col in columns}) for row in response.data]
+
+
+class SqliteRouteSource:
+  """Routes from a local SQLite `hiking_routes` table with the same filter semantics as Supabase.
+  Used as an offline fixture, e.g. by the benchmark suite. Rows are returned in insertion order unless `shuffle` is set."""
+
+  def __init__(self, path: str = ":memory:", shuffle: bool = False):
+    self.shuffle = shuffle
+    self._lock = threading.Lock()
+    self._conn = sqlite3.connect(path, check_same_thread=False)
+    self._conn.execute(
+        f"create table if not exists hiking_routes ({', '.join(ROUTE_COLUMNS)})")
+
+  def insert(self, routes: list[Route]):
+    placeholders = ", ".join("?" for _ in ROUTE_COLUMNS)
+    with self._lock:
+      self._conn.executemany(f"insert into hiking_routes values ({placeholders})", routes)
+      self._conn.commit()
+
+  def fetch(self, columns: tuple, limit: int, filters: dict) -> list[Route]:
+    clauses, params = list(), list()
+    for field, value in filters.items():
+      if value is None:
+        continue
+
+      if field in STRING_FIELDS and isinstance(value, str):
+        # sqlite LIKE is case-insensitive for ASCII, like Postgres ILIKE
+        clauses.append(f"{field} like ?")
+        params.append(f"%{value}%")
+      elif field in LTE_FIELDS and isinstance(value, int):
+        clauses.append(f"{field} <= ?")
+        params.append(value)
+      elif field in GTE_FIELDS and isinstance(value, int):
+        clauses.append(f"{field} >= ?")
+        params.append(value)
+      elif field in EQ_FIELDS:
+        clauses.append(f"{field} = ?")
+        params.append(value)
+
+    sql = f"select {', '.join(columns)} from hiking_routes"
+    if clauses:
+      sql += " where " + " and ".join(clauses)
+    if self.shuffle:
+      sql += " order by random()"
+    sql += " limit ?"
+
+    with self._lock:
+      rows = self._conn.execute(sql, (*params, limit)).fetchall()
+    return [Route(**dict(zip(columns, row))) for row in rows]
+
+
+_routeSource = None
+
+
+def setRouteSource(source):
+  """Replace the source used by `fetchRoutes`, e.g. with a SqliteRouteSource for offline runs."""
+  global _routeSource
+  _routeSource = source
+
+
+def getRouteSource():
+  """Process-wide route source: the local snapshot at ROUTE_SNAPSHOT if set (see route_snapshot.py), Supabase otherwise."""
+  global _routeSource
+  if _routeSource is None:
+    path = os.environ.get("ROUTE_SNAPSHOT")
+    if path:
+      from route_snapshot import ArrowRouteSource
+      _routeSource = ArrowRouteSource(path, shuffle=True)
+    else:
+      _routeSource = SupabaseRouteSource()
+  return _routeSource
+
+
+def fetchRoutes(columns: tuple = DEFAULT_COLUMNS, limit: int = 5, **filters) -> list[Route]:
+  """Fetch routes from the configured route source (Supabase by default), selecting only `columns` and applying the given filters.
+
+  Args:
+    columns (tuple): Column projection, subset of ROUTE_COLUMNS.
+    limit (int): Maximum number of rows.
+    filters: Any of the filterable route fields, None values are ignored.
+  Returns:
+    list[Route]: Matching routes, unselected fields are None.
+  """
+  unknown = set(columns) - set(ROUTE_COLUMNS)
+  if unknown:
+    raise ValueError(f"Unknown route columns: {sorted(unknown)}")
+
+  return getRouteSource().fetch(tuple(columns), limit, filters)
+
+
+def serializeRoutes(routes: list[Route], columns: tuple = DEFAULT_COLUMNS) -> str:
+  """Serialize routes into a compact '|'-separated table with a single header line.
+  Column names are written once instead of once per row as in JSON, which keeps tool output short in the prompt."""
+  if not routes:
+    return "No activities found."
+
+  buffer = io.StringIO()
+  writer = csv.writer(buffer, delimiter="|", lineterminator="\n")
+  writer.writerow(columns)
+  for route in routes:
+    writer.writerow(["" if getattr(route, col) is None else getattr(route, col) for col in columns])
+  return buffer.getvalue().rstrip("\n")
+
+
 @tool
+@traced("tool.queryDatabase")
+@recorded("supabase")
 def queryDatabase(
     category: str = None, difficulty: int = None,
     duration_min: int = None, length_m: int = None, ascent_m: int = None,
@@ -87,58 +291,35 @@ def queryDatabase(
     region: str
     primary_region: str
   Returns:
-    list: list of dicts containing the query results, e.g. [{"title": "Hiking in the Alps", "region": "Alps", "length_m": 12000, "difficulty": 2}, {}, ...]
+    str: table with a header line and one activity per line, fields separated by '|', e.g.
+      title|region|length_m|difficulty
+      Hiking in the Alps|Alps|12000|2
   """
-
-  client = create_client(URL, KEY)
-
-  """NB: query from 'random_hiking_routes' for server-side shuffling. 'hiking_routes' is the original table"""
-  query = client.from_("random_hiking_routes").select(
-      "title, region, length_m, difficulty")
-
-  features = {
-      "category": category,
-      "difficulty": difficulty,
-      "duration_min": duration_min,
-      "length_m": length_m,
-      "ascent_m": ascent_m,
-      "descent_m": descent_m,
-      "min_altitude": min_altitude,
-      "max_altitude": max_altitude,
-      "experience": experience,
-      "region": region,
-      "primary_region": primary_region
-  }
-
-  # Define how to handle each field
-  stringFields = {"category", "region", "primary_region"}
-  lteFields = {"max_altitude", "descent_m"}
-  eqFields = {"experience", "difficulty"}
-  gteFields = {
-      "duration_min", "length_m", "ascent_m", "min_altitude"
-  }
-
-  for field, value in features.items():
-    if value is None:
-      continue
-
-    if field in stringFields and isinstance(value, str):
-      query = query.ilike(field, f"%{value}%")
-    elif field in lteFields and isinstance(value, int):
-      query = query.lte(field, value)
-    elif field in gteFields and isinstance(value, int):
-      query = query.gte(field, value)
-    elif field in eqFields:
-      query = query.eq(field, value)
-
-  response = query.limit(limit).execute()
-  return response.data
+  filters = dict(
+      category=category,
+      difficulty=difficulty,
+      duration_min=duration_min,
+      length_m=length_m,
+      ascent_m=ascent_m,
+      descent_m=descent_m,
+      min_altitude=min_altitude,
+      max_altitude=max_altitude,
+      experience=experience,
+      region=region,
+      primary_region=primary_region
+  )
+  # the user's preferences fill in what the query left open, instead of a clarifying question
+  defaults = {field: value for field, value in (queryDefaults.get() or {}).items() if filters.get(field) is None}
+  routes = fetchRoutes(columns=DEFAULT_COLUMNS, limit=limit, **{**filters, **defaults})
+  if not routes and defaults:
+    routes = fetchRoutes(columns=DEFAULT_COLUMNS, limit=limit, **filters)
+  return serializeRoutes(routes, DEFAULT_COLUMNS)
 
 
 TOOLS = [queryDatabase]
 
 
 class DatabaseAgent(BaseAgent):
-  def __init__(self, apiKey: str, tools: list = TOOLS, promptTemplate: str | None = QUERY_PROMPT_TEMPLATE):
+  def __init__(self, apiKey: str, tools: list = TOOLS, promptTemplate: str | None = QUERY_PROMPT_TEMPLATE, **kwargs):
 
-    super().__init__(apiKey=apiKey, tools=tools, promptTemplate=promptTemplate)
+    super().__init__(apiKey=apiKey, tools=tools, promptTemplate=promptTemplate, **kwargs)
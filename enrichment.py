@@ -0,0 +1,131 @@
+import json
+import re
+import threading
+import time
+from typing import Callable
+
+from weather_agent import fetchForecastsBatch
+
+# forecasts change slowly, one fetch per cell is shared by all sessions for this long
+FORECAST_TTL = 3600
+# cells whose fetch failed are retried after this long, so a short wttr.in outage does not hide them for FORECAST_TTL
+FAILURE_TTL = 60
+# temperature range (°C) that costs no points in `weatherScore`
+COMFORT_RANGE = (12, 24)
+
+
+def cellKey(activity: dict) -> str:
+  """Forecast cell of a route candidate. Routes carry no coordinates, so the region is the cell:
+  all candidates in e.g. the Brenta Dolomites share one forecast."""
+  return str(activity.get("location") or activity.get("region") or "").strip()
+
+
+def weatherScore(forecast: dict | None) -> float:
+  """Suitability of a day for outdoor activities from 0 (stay home) to 100, unknown weather scores 50."""
+  if forecast is None:
+    return 50.0
+  rain = max((int(chance) for chance in (forecast.get("rain_chance") or {}).values()), default=0)
+  snowfall = float(forecast.get("snowfall") or 0)
+  temperature = float(forecast.get("avg_temperature") or 0)
+  low, high = COMFORT_RANGE
+  discomfort = max(0.0, low - temperature, temperature - high)
+  return max(0.0, min(100.0, 100 - 0.6 * rain - min(30.0, 10 * snowfall) - 3 * discomfort))
+
+
+def describeForecast(forecast: dict | None) -> str:
+  if forecast is None:
+    return "no forecast"
+  rain = max((int(chance) for chance in (forecast.get("rain_chance") or {}).values()), default=0)
+  return f"{forecast.get('avg_temperature')}°C, {rain}% rain" + (f", {forecast['snowfall']} cm snow" if forecast.get("snowfall") else "")
+
+
+class ForecastCache:
+  """Forecasts per cell with a TTL, shared by all sessions. A lookup fetches all missing cells in one batch and
+  waits for the cells a concurrent lookup is already fetching.
+
+  Args:
+    fetch (Callable): Takes a list of cells (locations) and returns their forecasts keyed by cell and YYYY-MM-DD,
+      e.g. `weather_agent.fetchForecastsBatch`. Cells missing from the result are cached as unknown.
+    ttl (float): Seconds a fetched cell stays valid.
+    failureTtl (float): Seconds a cell missing from the fetch result stays unknown before it is fetched again.
+  """
+
+  def __init__(self, fetch: Callable[[list[str]], dict], ttl: float = FORECAST_TTL, failureTtl: float = FAILURE_TTL):
+    self.fetch = fetch
+    self.ttl = ttl
+    self.failureTtl = failureTtl
+    self.fetches = 0
+    self._cells: dict[str, tuple[float, dict]] = dict()
+    # cells being fetched, set once they are stored: concurrent lookups wait instead of fetching them again
+    self._inflight: dict[str, threading.Event] = dict()
+    self._lock = threading.Lock()
+
+  def get(self, cells: list[str], date: str) -> dict[str, dict | None]:
+    """Forecast of `date` for every cell, None where no forecast is available."""
+    now = time.monotonic()
+    with self._lock:
+      missing = sorted({cell for cell in cells if cell not in self._cells or self._cells[cell][0] <= now})
+      pending = {self._inflight[cell] for cell in missing if cell in self._inflight}
+      missing = [cell for cell in missing if cell not in self._inflight]
+      done = threading.Event()
+      for cell in missing:
+        self._inflight[cell] = done
+    if missing:
+      try:
+        fetched = self.fetch(missing)
+        with self._lock:
+          self.fetches += len(missing)
+          for cell in missing:
+            if cell in fetched:
+              self._cells[cell] = (now + self.ttl, fetched[cell])
+            else:
+              self._cells[cell] = (now + self.failureTtl, {})
+      finally:
+        with self._lock:
+          for cell in missing:
+            del self._inflight[cell]
+        done.set()
+    for event in pending:
+      event.wait()
+    with self._lock:
+      # a cell another lookup failed to fetch has no entry
+      return {cell: self._cells.get(cell, (0, {}))[1].get(date) for cell in cells}
+
+
+def parseActivities(output: str) -> dict | None:
+  """The `return_activities` JSON of the database agent, also when wrapped in a markdown code fence."""
+  match = re.search(r"\{.*\}", output, re.DOTALL)
+  if match is None:
+    return None
+  try:
+    parsed = json.loads(match.group(0))
+  except json.JSONDecodeError:
+    return None
+  if not isinstance(parsed, dict) or parsed.get("action") != "return_activities":
+    return None
+  return parsed
+
+
+def enrichActivities(output: str, date: str, cache: ForecastCache) -> str:
+  """Attach the forecast of its cell to every activity of the database agent output and rank the activities by
+  weather suitability, best first. Output that is not a list of activities is returned unchanged."""
+  parsed = parseActivities(output)
+  if parsed is None:
+    return output
+  activities = parsed.get("data")
+  if isinstance(activities, dict):
+    activities = [activities]
+  if not isinstance(activities, list) or not activities:
+    return output
+
+  activities = [activity for activity in activities if isinstance(activity, dict)]
+  forecasts = cache.get([cellKey(activity) for activity in activities if cellKey(activity)], date)
+  for activity in activities:
+    forecast = forecasts.get(cellKey(activity))
+    activity["weather"] = f"{date}: {describeForecast(forecast)}"
+    activity["weather_score"] = round(weatherScore(forecast))
+  activities.sort(key=lambda activity: activity["weather_score"], reverse=True)
+  return json.dumps({**parsed, "data": activities}, ensure_ascii=False)
+
+
+FORECAST_CACHE = ForecastCache(fetchForecastsBatch)
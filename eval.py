@@ -16,11 +16,13 @@ import os
 import sys
 import time
 import json
-import asyncio
 import logging
+import queue
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Any, Optional
-from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Tuple, Any, Optional, Callable
+from dataclasses import dataclass, field
 from enum import Enum
 import traceback
 
@@ -28,16 +30,95 @@ import traceback
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-  from orchestrator import Orchestrator
+  from base_agent import DEFAULT_MODEL, LITE_MODEL
+  from orchestrator import Orchestrator, LOCAL_ROUTER
   from calendar_agent import CalendarAgent
   from weather_agent import WeatherAgent
   from database_agent import DatabaseAgent
+  from token_usage import percentile
+  from rate_limit import TokenBucket
 except ImportError as e:
   print(f"Error importing modules: {e}")
   print("Make sure you're running this script from the project root directory")
   sys.exit(1)
 
 
+ROUTING_CASES = [
+    ("What's the weather tomorrow?", ["weather"]),
+    ("Do I have any appointments on June 6th?", ["calendar"]),
+    ("Find me easy hikes near Trento", ["database"]),
+    ("Plan a hike for this weekend considering weather and my schedule",
+     ["calendar", "weather", "database"]),
+    ("Show me cycling routes in the Alps", ["database"]),
+    ("What will the weather be like on Sunday?", ["weather"])
+]
+
+# candidate models per pipeline stage for the stage benchmark
+STAGE_BENCHMARK_MODELS = {
+    "routing": [LOCAL_ROUTER, LITE_MODEL, DEFAULT_MODEL],
+    "extraction": [LITE_MODEL, DEFAULT_MODEL],
+    "summary": [LITE_MODEL, DEFAULT_MODEL],
+}
+
+EXTRACTION_QUERIES = [
+    "Find hiking trails near Trento",
+    "Easy mountain bike routes in the Dolomites",
+    "A hard alpine tour of at least 6 hours"
+]
+
+SUMMARY_SAMPLE = (
+    "I'm a beginner looking for easy hikes near Trento this weekend",
+    '{"action": "return_activities", "data": [{"title": "Monte Bondone loop", "location": "Trentino", "length": "8000", "difficulty": "0"}]}\n\n'
+    '{"action": "return_weather", "data": {"date": "2025-06-07", "location": "Trento", "forecast": ["sunny, 24°C, 10% rain"]}}'
+)
+
+# vague requests that need clarification unless the user's preferences are known
+VAGUE_QUERIES = [
+    "Suggest something I could do tomorrow",
+    "Any tour ideas for the weekend?",
+    "I want to get outside, what do you recommend?"
+]
+CLARIFICATION_ANSWER = "Around Trento, moderate difficulty, about 3 hours of hiking"
+PREFERENCE_PROFILE = {
+    "name": "Eval",
+    "difficulty": 3,
+    "durationHours": 3,
+    "distanceKm": 30,
+    "location": "Trento",
+    "preferredActivities": ["Hiking"]
+}
+MAX_CONVERSATION_TURNS = 3
+
+
+def routing_metrics(outcomes: List[Tuple[Any, List[str]]]) -> Dict[str, float]:
+  """Exact-set accuracy and micro-averaged precision and recall (0-100) of (selected, expected) agent lists.
+  Selecting extra agents costs precision and accuracy, a selection that is not a list counts as empty."""
+  exact = true_positives = selected_total = expected_total = 0
+  for selected, expected in outcomes:
+    selected = set(selected) if isinstance(selected, list) else set()
+    exact += selected == set(expected)
+    true_positives += len(selected & set(expected))
+    selected_total += len(selected)
+    expected_total += len(expected)
+  return {
+      "accuracy": exact / len(outcomes) * 100 if outcomes else 0.0,
+      "precision": true_positives / selected_total * 100 if selected_total else 0.0,
+      "recall": true_positives / expected_total * 100 if expected_total else 0.0,
+  }
+
+
+def score_response_quality(response: str) -> float:
+  """Heuristic quality score (0-100) of a final response based on length, keywords and helpfulness."""
+  # Reward longer, more detailed responses
+  length_score = min(100, len(response) / 5)
+  keyword_relevance = sum(1 for word in ['hiking', 'outdoor', 'activity', 'weather', 'trail']
+                          if word in response.lower()) * 10
+  helpfulness_score = 50 if any(word in response.lower()
+                                for word in ['recommend', 'suggest', 'consider', 'try']) else 0
+
+  return min(100, (length_score + keyword_relevance + helpfulness_score) / 3)
+
+
 class TestCategory(Enum):
   FUNCTIONAL = "Functional"
   PERFORMANCE = "Performance"
@@ -65,27 +146,146 @@ class EvaluationReport:
   test_results: List[TestResult]
   summary: str
   recommendations: List[str]
+  latency_percentiles: Dict[str, float] = field(default_factory=dict)
+  llm_calls: int = 0
+
+
+@dataclass
+class LoadTestResult:
+  sessions: int
+  target_rps: float
+  duration: float
+  requests: int
+  errors: int
+  throughput: float  # completed requests per second
+  p50: float
+  p95: float
+  p99: float
+
+  @property
+  def error_rate(self) -> float:
+    return self.errors / self.requests if self.requests else 0.0
+
+  def __str__(self) -> str:
+    return (f"{self.sessions:>3} sessions @ {self.target_rps:>5.2f} rps -> {self.throughput:.2f} rps, "
+            f"p50 {self.p50:.2f}s, p95 {self.p95:.2f}s, p99 {self.p99:.2f}s, "
+            f"errors {self.errors}/{self.requests} ({self.error_rate:.0%})")
+
+
+class LoadGenerator:
+  """Drive concurrent sessions at a target request rate against query functions, e.g. Orchestrator.run.
+
+  A scheduler thread releases requests at the target rate and a fixed number of session threads execute them.
+  Every session gets its own query function from `new_session`, e.g. the `run` of its own orchestrator, so
+  sessions share no conversation memory or usage tracker. Latency is measured from the scheduled start, so time
+  spent waiting for a free session counts as well.
+  """
+
+  def __init__(self, new_session: Callable[[], Callable[[str], Any]], queries: List[str]):
+    self.new_session = new_session
+    self.queries = queries
+
+  def run(self, sessions: int, target_rps: float, duration: float) -> LoadTestResult:
+    """Run a single load step for `duration` seconds and wait for all issued requests to finish."""
+    slots = queue.Queue()
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def session(run_query: Callable[[str], Any]):
+      while True:
+        slot = slots.get()
+        if slot is None:
+          return
+        scheduled, query = slot
+        try:
+          run_query(query)
+          with lock:
+            latencies.append(time.time() - scheduled)
+        except Exception as e:
+          with lock:
+            errors.append(str(e))
+
+    # built before the clock starts, so setting up a session does not count as latency
+    workers = [threading.Thread(target=session, args=(self.new_session(),), daemon=True) for _ in range(sessions)]
+    for worker in workers:
+      worker.start()
+
+    start = time.time()
+    issued = 0
+    while time.time() - start < duration:
+      scheduled = start + issued / target_rps
+      if scheduled > time.time():
+        time.sleep(scheduled - time.time())
+      slots.put((scheduled, self.queries[issued % len(self.queries)]))
+      issued += 1
+
+    for _ in workers:
+      slots.put(None)
+    for worker in workers:
+      worker.join()
+    elapsed = time.time() - start
+
+    return LoadTestResult(
+        sessions=sessions,
+        target_rps=target_rps,
+        duration=elapsed,
+        requests=issued,
+        errors=len(errors),
+        throughput=len(latencies) / elapsed,
+        p50=percentile(latencies, 50),
+        p95=percentile(latencies, 95),
+        p99=percentile(latencies, 99),
+    )
+
+  def ramp(self, sessions: int, start_rps: float, step_rps: float, max_rps: float, step_duration: float,
+           max_error_rate: float = 0.05, max_p95: Optional[float] = None) -> Tuple[List[LoadTestResult], Optional[LoadTestResult]]:
+    """Increase the request rate step by step until the system saturates.
+
+    A step is saturated when throughput falls below 90% of the target rate, the error rate exceeds
+    `max_error_rate`, or p95 latency exceeds `max_p95`. Returns all steps and the last healthy one.
+    """
+    steps, last_healthy = [], None
+    rps = start_rps
+    while rps <= max_rps:
+      result = self.run(sessions, rps, step_duration)
+      steps.append(result)
+      logging.info(f"Load step: {result}")
+
+      saturated = (result.throughput < 0.9 * rps
+                   or result.error_rate > max_error_rate
+                   or (max_p95 is not None and result.p95 > max_p95))
+      if saturated:
+        break
+      last_healthy = result
+      rps += step_rps
+
+    return steps, last_healthy
 
 
 class AdventureAdvisorEvaluator:
-  def __init__(self, api_key: str):
-    """Initialize the evaluator with necessary components."""
+  def __init__(self, api_key: str, workers: int = 4, query_rps: float = 1.0):
+    """Initialize the evaluator with necessary components.
+
+    Args:
+      api_key: Gemini API key.
+      workers: Number of tests and of queries within a test that run in parallel.
+      query_rps: Rate limit for queries sent to the orchestrator, shared by all tests.
+    """
     self.api_key = api_key
     self.test_results: List[TestResult] = []
+    self.workers = workers
+    self.limiter = TokenBucket(query_rps)
+    # separate from the test pool, so tests waiting on their queries never starve them
+    self.query_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eval-query")
+    self.query_latencies: List[float] = []
+    # LLM calls of all orchestrators built during the evaluation
+    self.llm_calls = 0
+    self.usage_lock = threading.Lock()
     self.setup_logging()
 
-    # Initialize agents and orchestrator
+    # Initialize agents and orchestrator, tests build their own so they share no memory or usage tracker
     try:
-      self.calendar_agent = CalendarAgent(apiKey=api_key)
-      self.weather_agent = WeatherAgent(apiKey=api_key)
-      self.database_agent = DatabaseAgent(apiKey=api_key)
-
-      agents = {
-          "calendar": self.calendar_agent,
-          "weather": self.weather_agent,
-          "database": self.database_agent
-      }
-      self.orchestrator = Orchestrator(apiKey=api_key, agents=agents)
+      self.orchestrator = self.build_orchestrator()
 
     except Exception as e:
       logging.error(f"Failed to initialize agents: {e}")
@@ -133,33 +333,62 @@ class AdventureAdvisorEvaluator:
     self.test_results.append(result)
     return result
 
+  def run_query(self, query: str) -> str:
+    """Run a query through a fresh orchestrator under the shared rate limit and record its latency."""
+    orchestrator = self.build_orchestrator()
+    self.limiter.acquire()
+    start_time = time.time()
+    try:
+      response = orchestrator.run(query)
+      self.query_latencies.append(time.time() - start_time)
+      return response
+    finally:
+      self.record_usage(orchestrator)
+
+  def build_orchestrator(self, user: Optional[str] = None) -> Orchestrator:
+    """Fresh orchestrator and sub-agents without conversation history."""
+    agents = {
+        "calendar": CalendarAgent(apiKey=self.api_key),
+        "weather": WeatherAgent(apiKey=self.api_key),
+        "database": DatabaseAgent(apiKey=self.api_key)
+    }
+    return Orchestrator(apiKey=self.api_key, agents=agents, user=user)
+
+  def record_usage(self, orchestrator: Orchestrator):
+    """Add the LLM calls of an orchestrator (and its agents) a test is done with to the report."""
+    with self.usage_lock:
+      self.llm_calls += orchestrator.usage.calls()
+
+  def run_queries(self, queries: List[str]) -> List[Future]:
+    """Submit queries to run in parallel. Call `.result()` on the returned futures to get the response or error."""
+    return [self.query_pool.submit(self.run_query, query) for query in queries]
+
   # FUNCTIONAL TESTS
   def test_orchestrator_routing(self) -> Tuple[float, str]:
     """Test if orchestrator correctly routes queries to appropriate agents."""
-    test_cases = [
-        ("What's the weather tomorrow?", ["weather"]),
-        ("Do I have any appointments on June 6th?", ["calendar"]),
-        ("Find me easy hikes near Trento", ["database"]),
-        ("Plan a hike for this weekend considering weather and my schedule",
-         ["calendar", "weather", "database"]),
-        ("Show me cycling routes in the Alps", ["database"]),
-        ("What will the weather be like on Sunday?", ["weather"])
-    ]
+    test_cases = ROUTING_CASES
 
     correct_routings = 0
     total_cases = len(test_cases)
     details = []
 
-    for query, expected_agents in test_cases:
+    def route(query: str):
+      orchestrator = self.build_orchestrator()
+      self.limiter.acquire()
       try:
-        selected_agents = self.orchestrator.routing(query)
+        return orchestrator.routing(query)
+      finally:
+        self.record_usage(orchestrator)
 
-        # Check if all expected agents are selected
+    outcomes = [self.query_pool.submit(route, query) for query, _ in test_cases]
+    routed = []
+    for (query, expected_agents), outcome in zip(test_cases, outcomes):
+      try:
+        selected_agents = outcome.result()
+
+        # Exactly the expected agents: extra agents cost latency and tokens
         if isinstance(selected_agents, list):
-          # Allow for flexibility - if expected agents are subset of selected
-          has_required = all(
-              agent in selected_agents for agent in expected_agents)
-          if has_required:
+          if set(selected_agents) == set(expected_agents):
             correct_routings += 1
             details.append(f"✓ '{query}' -> {selected_agents}")
           else:
@@ -168,24 +397,29 @@ class AdventureAdvisorEvaluator:
         else:
           details.append(
               f"✗ '{query}' -> Invalid response type: {type(selected_agents)}")
+        routed.append((selected_agents, expected_agents))
 
       except Exception as e:
         details.append(f"✗ '{query}' -> Error: {str(e)}")
+        routed.append(([], expected_agents))
 
-    score = (correct_routings / total_cases) * 100
-    detail_text = f"Routing accuracy: {correct_routings}/{total_cases}\n" + "\n".join(
-        details)
+    metrics = routing_metrics(routed)
+    score = metrics["accuracy"]
+    detail_text = (f"Routing accuracy: {correct_routings}/{total_cases}, precision {metrics['precision']:.0f}%, "
+                   f"recall {metrics['recall']:.0f}%\n" + "\n".join(details))
 
     return score, detail_text
 
   def test_agent_responses(self) -> Tuple[float, str]:
     """Test individual agent response quality."""
     tests = []
+    orchestrator = self.build_orchestrator()
+    agents = orchestrator.agents
 
     # Test weather agent
     try:
       tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-      weather_result = self.weather_agent.run(
+      weather_result = agents["weather"].run(
           f"What's the weather in Trento on {tomorrow}?")
       weather_score = 100 if "output" in weather_result and weather_result["output"] else 0
       tests.append(("Weather Agent", weather_score, str(
@@ -195,7 +429,7 @@ class AdventureAdvisorEvaluator:
 
     # Test database agent
     try:
-      db_result = self.database_agent.run("Find hiking trails near Trento")
+      db_result = agents["database"].run("Find hiking trails near Trento")
       db_score = 100 if "output" in db_result and "hiking" in db_result["output"].lower(
       ) else 0
       tests.append(("Database Agent", db_score, str(
@@ -205,7 +439,7 @@ class AdventureAdvisorEvaluator:
 
     # Test calendar agent (may fail without proper setup)
     try:
-      cal_result = self.calendar_agent.run("Do I have any events today?")
+      cal_result = agents["calendar"].run("Do I have any events today?")
       cal_score = 100 if "output" in cal_result else 50  # Partial credit for attempting
       tests.append(("Calendar Agent", cal_score, str(
           cal_result.get("output", "No output"))))
@@ -213,6 +447,7 @@ class AdventureAdvisorEvaluator:
       tests.append(
           ("Calendar Agent", 25, f"Expected error (OAuth not configured): {str(e)}"))
 
+    self.record_usage(orchestrator)
     avg_score = sum(score for _, score, _ in tests) / len(tests)
     details = "\n".join(
         [f"{name}: {score}/100 - {detail[:100]}..." for name, score, detail in tests])
@@ -231,9 +466,10 @@ class AdventureAdvisorEvaluator:
     successful_responses = 0
     details = []
 
-    for query in test_queries:
+    outcomes = self.run_queries(test_queries)
+    for query, outcome in zip(test_queries, outcomes):
       try:
-        response = self.orchestrator.run(query)
+        response = outcome.result()
 
         # Check if response is meaningful
         if isinstance(response, str) and len(response) > 50:
@@ -254,7 +490,7 @@ class AdventureAdvisorEvaluator:
 
   # PERFORMANCE TESTS
   def test_response_times(self) -> Tuple[float, str]:
-    """Test response time performance."""
+    """Test response time performance. Runs alone, after all other tests."""
     test_cases = [
         ("Simple weather query", "Weather in Trento today", 5.0),
         ("Database query", "Find hiking trails", 8.0),
@@ -265,10 +501,11 @@ class AdventureAdvisorEvaluator:
     details = []
 
     for test_name, query, max_time in test_cases:
-      start_time = time.time()
+      # sequential on purpose: parallel queries would measure contention instead of response time
       try:
-        response = self.orchestrator.run(query)
-        execution_time = time.time() - start_time
+        self.run_query(query)
+        # latency of orchestrator.run alone, without building the orchestrator and waiting for the limiter
+        execution_time = self.query_latencies[-1]
 
         # Score based on response time (100 for instant, 0 for max_time or longer)
         time_score = max(0, 100 - (execution_time / max_time) * 100)
@@ -286,41 +523,28 @@ class AdventureAdvisorEvaluator:
 
     return avg_score, detail_text
 
-  async def test_concurrent_requests(self) -> Tuple[float, str]:
-    """Test system behavior under concurrent load."""
-    async def make_request(query: str, request_id: int):
-      try:
-        start_time = time.time()
-        response = self.orchestrator.run(f"{query} (request {request_id})")
-        end_time = time.time()
-        return True, end_time - start_time, len(str(response))
-      except Exception as e:
-        return False, 0, str(e)
-
-    async def run_concurrent_test():
-      queries = ["Find hiking trails"] * 5  # 5 concurrent requests
-      tasks = [make_request(query, i) for i, query in enumerate(queries)]
-      return await asyncio.gather(*tasks, return_exceptions=True)
+  def test_concurrent_requests(self, sessions: int = 5, target_rps: float = 0.5, duration: float = 10.0) -> Tuple[float, str]:
+    """Test system behavior under concurrent load, one orchestrator per session. Runs alone, after all other tests."""
+    orchestrators = list()
 
-    try:
-      # Note: This test might not work perfectly due to the synchronous nature of the agents
-      results = []
-      for i in range(3):  # Sequential requests to simulate load
-        success, exec_time, response_len = await make_request("Find hiking trails", i)
-        results.append((success, exec_time, response_len))
+    def new_session() -> Callable[[str], str]:
+      orchestrator = self.build_orchestrator()
+      orchestrators.append(orchestrator)
 
-      successful_requests = sum(1 for success, _, _ in results if success)
-      avg_response_time = sum(time for _, time, _ in results if isinstance(
-          time, (int, float))) / len(results)
+      def run(query: str) -> str:
+        self.limiter.acquire()
+        return orchestrator.run(query)
+      return run
 
-      score = (successful_requests / len(results)) * 100
-      details = f"Concurrent load test: {successful_requests}/{len(results)} requests successful\n"
-      details += f"Average response time: {avg_response_time:.2f}s"
+    generator = LoadGenerator(new_session, ["Find hiking trails", "Weather in Trento today"])
+    result = generator.run(sessions, target_rps, duration)
+    for orchestrator in orchestrators:
+      self.record_usage(orchestrator)
 
-      return score, details
+    score = (1 - result.error_rate) * 100
+    details = f"Concurrent load test: {result}"
 
-    except Exception as e:
-      return 0, f"Concurrent test failed: {str(e)}"
+    return score, details
 
   # ERROR HANDLING TESTS
   def test_error_handling(self) -> Tuple[float, str]:
@@ -335,9 +559,10 @@ class AdventureAdvisorEvaluator:
     handled_errors = 0
     details = []
 
-    for test_name, query in error_test_cases:
+    outcomes = self.run_queries([query for _, query in error_test_cases])
+    for (test_name, query), outcome in zip(error_test_cases, outcomes):
       try:
-        response = self.orchestrator.run(query)
+        response = outcome.result()
 
         # Check if system handled gracefully (didn't crash)
         if isinstance(response, str):
@@ -363,9 +588,10 @@ class AdventureAdvisorEvaluator:
     details = []
 
     # Test 1: Location consistency
+    orchestrator = self.build_orchestrator()
     try:
-      weather_response = self.weather_agent.run("Weather in Trento tomorrow")
-      db_response = self.database_agent.run("Find activities near Trento")
+      weather_response = orchestrator.agents["weather"].run("Weather in Trento tomorrow")
+      db_response = orchestrator.agents["database"].run("Find activities near Trento")
 
       # Basic check - both should mention Trento
       weather_mentions_location = "trento" in str(weather_response).lower()
@@ -381,14 +607,14 @@ class AdventureAdvisorEvaluator:
     except Exception as e:
       consistency_score -= 25
       details.append(f"✗ Location consistency test failed: {str(e)}")
+    finally:
+      self.record_usage(orchestrator)
 
     # Test 2: Response format consistency
     try:
-      responses = [
-          self.orchestrator.run("Find hiking trails"),
-          self.orchestrator.run("Weather forecast"),
-          self.orchestrator.run("My calendar for today")
-      ]
+      outcomes = self.run_queries(
+          ["Find hiking trails", "Weather forecast", "My calendar for today"])
+      responses = [outcome.result() for outcome in outcomes]
 
       # Check if all responses are strings of reasonable length
       all_valid = all(isinstance(r, str) and len(r) > 10 for r in responses)
@@ -419,20 +645,13 @@ class AdventureAdvisorEvaluator:
     quality_scores = []
     details = []
 
-    for query_type, query in quality_queries:
+    outcomes = self.run_queries([query for _, query in quality_queries])
+    for (query_type, query), outcome in zip(quality_queries, outcomes):
       try:
-        response = self.orchestrator.run(query)
+        response = outcome.result()
 
         # Quality metrics
-        # Reward longer, more detailed responses
-        length_score = min(100, len(response) / 5)
-        keyword_relevance = sum(1 for word in ['hiking', 'outdoor', 'activity', 'weather', 'trail']
-                                if word in response.lower()) * 10
-        helpfulness_score = 50 if any(word in response.lower()
-                                      for word in ['recommend', 'suggest', 'consider', 'try']) else 0
-
-        total_score = min(
-            100, (length_score + keyword_relevance + helpfulness_score) / 3)
+        total_score = score_response_quality(response)
         quality_scores.append(total_score)
         details.append(
             f"{query_type}: Score {total_score:.1f} (Length: {len(response)} chars)")
@@ -447,6 +666,40 @@ class AdventureAdvisorEvaluator:
 
     return avg_quality, detail_text
 
+  def test_preference_defaults(self) -> Tuple[float, str]:
+    """Turns per completed recommendation for vague requests, with and without stored user preferences.
+    Unanswered conversations are scripted to answer every clarifying question with CLARIFICATION_ANSWER.
+    The profile is given to the orchestrator directly rather than through the process-wide user store, which the
+    tests running in parallel share."""
+
+    def conversation(preferences: Optional[dict], query: str) -> int:
+      orchestrator = self.build_orchestrator()
+      # an orchestrator without user answers with these preferences, like an API session without one
+      orchestrator.context.userPreferences = dict(preferences or {})
+      message = query
+      try:
+        for turn in range(1, MAX_CONVERSATION_TURNS + 1):
+          self.limiter.acquire()
+          orchestrator.run(message)
+          if orchestrator.turnsSinceRecommendation == 0:
+            return turn
+          message = CLARIFICATION_ANSWER
+        return MAX_CONVERSATION_TURNS + 1  # no recommendation at all
+      finally:
+        self.record_usage(orchestrator)
+
+    profiles = {"without": None, "with": PREFERENCE_PROFILE}
+    outcomes = {name: [self.query_pool.submit(conversation, preferences, query) for query in VAGUE_QUERIES]
+                for name, preferences in profiles.items()}
+    turns = {name: [outcome.result() for outcome in futures] for name, futures in outcomes.items()}
+    without, withPreferences = (sum(turns[name]) / len(VAGUE_QUERIES) for name in profiles)
+
+    first_turn = sum(1 for t in turns["with"] if t == 1)
+    score = first_turn / len(VAGUE_QUERIES) * 100
+    details = (f"Turns per recommendation: {without:.2f} without preferences, {withPreferences:.2f} with preferences\n"
+               f"Recommended in the first turn with preferences: {first_turn}/{len(VAGUE_QUERIES)}")
+    return score, details
+
   def run_evaluation(self) -> EvaluationReport:
     """Run complete evaluation suite and generate report."""
     logging.info("Starting Adventure Advisor Evaluation")
@@ -475,6 +728,8 @@ class AdventureAdvisorEvaluator:
         # User Experience Tests (10% of total score)
         ("Response Quality", TestCategory.USER_EXPERIENCE,
          100, self.test_response_quality),
+        ("Preference Defaults", TestCategory.USER_EXPERIENCE,
+         100, self.test_preference_defaults),
     ]
 
     # Category weights
@@ -486,10 +741,19 @@ class AdventureAdvisorEvaluator:
         TestCategory.USER_EXPERIENCE: 0.10
     }
 
-    # Run all tests
+    # Run the tests in parallel, API rate limits are respected by the shared limiter in run_query. Timing and
+    # load tests run alone once the others are done, so they measure the system instead of the other tests.
+    exclusive = {"Response Times", "Concurrent Load"}
+    with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="eval-test") as pool:
+      futures = [pool.submit(self.run_test, test_name, category, max_score, test_func)
+                 for test_name, category, max_score, test_func in tests if test_name not in exclusive]
+      for future in futures:
+        future.result()
     for test_name, category, max_score, test_func in tests:
-      self.run_test(test_name, category, max_score, test_func)
-      time.sleep(2)  # Avoid hitting API rate limits
+      if test_name in exclusive:
+        self.run_test(test_name, category, max_score, test_func)
+    order = {test_name: i for i, (test_name, _, _, _) in enumerate(tests)}
+    self.test_results.sort(key=lambda t: order.get(t.name, len(order)))
 
     # Calculate scores by category
     category_scores = {}
@@ -518,7 +782,13 @@ class AdventureAdvisorEvaluator:
         category_scores=category_scores,
         test_results=self.test_results,
         summary=summary,
-        recommendations=recommendations
+        recommendations=recommendations,
+        latency_percentiles={
+            "p50": percentile(self.query_latencies, 50),
+            "p95": percentile(self.query_latencies, 95),
+            "p99": percentile(self.query_latencies, 99),
+        },
+        llm_calls=self.llm_calls
     )
 
   def generate_summary(self, final_score: float, category_scores: Dict[TestCategory, float]) -> str:
@@ -607,6 +877,11 @@ The Adventure Advisor system demonstrates {grade.lower()} overall performance.
             if len(test.details.split('\n')) > 3:
               print("    ...")
 
+    if report.latency_percentiles:
+      print(f"\nQUERY LATENCY: p50 {report.latency_percentiles['p50']:.2f}s, "
+            f"p95 {report.latency_percentiles['p95']:.2f}s, p99 {report.latency_percentiles['p99']:.2f}s "
+            f"({len(self.query_latencies)} queries, {report.llm_calls} LLM calls)")
+
     print(f"\nRECOMMENDATIONS:")
     print("-" * 20)
     for i, rec in enumerate(report.recommendations, 1):
@@ -617,6 +892,126 @@ The Adventure Advisor system demonstrates {grade.lower()} overall performance.
     print("="*80 + "\n")
 
 
+def report_to_dict(report: EvaluationReport) -> Dict[str, Any]:
+  """JSON-serializable form of an evaluation report."""
+  return {
+      'total_score': report.total_score,
+      'category_scores': {cat.value: score for cat, score in report.category_scores.items()},
+      'test_results': [{
+          'name': t.name,
+          'category': t.category.value,
+          'score': t.score,
+          'max_score': t.max_score,
+          'success': t.success,
+          'execution_time': t.execution_time,
+          'details': t.details
+      } for t in report.test_results],
+      'summary': report.summary,
+      'recommendations': report.recommendations,
+      'latency_percentiles': report.latency_percentiles,
+      'llm_calls': report.llm_calls,
+      'timestamp': datetime.now().isoformat()
+  }
+
+
+def check_regressions(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.2) -> List[str]:
+  """Compare a report with a stored baseline. Returns a message for every metric that regressed by more than `threshold`."""
+  regressions = []
+
+  current_p95 = current.get('latency_percentiles', {}).get('p95', 0)
+  baseline_p95 = baseline.get('latency_percentiles', {}).get('p95', 0)
+  if baseline_p95 and current_p95 > baseline_p95 * (1 + threshold):
+    regressions.append(
+        f"p95 latency regressed: {current_p95:.2f}s vs baseline {baseline_p95:.2f}s")
+
+  current_calls = current.get('llm_calls', 0)
+  baseline_calls = baseline.get('llm_calls', 0)
+  if baseline_calls and current_calls > baseline_calls * (1 + threshold):
+    regressions.append(
+        f"LLM call count regressed: {current_calls} vs baseline {baseline_calls}")
+
+  return regressions
+
+
+def benchmark_stage_models(api_key: str, stage_models: Dict[str, List[str]] = STAGE_BENCHMARK_MODELS) -> List[Dict[str, Any]]:
+  """Measure latency and quality of each candidate model per pipeline stage.
+
+  - routing: exact-set accuracy on ROUTING_CASES, with precision and recall
+  - extraction: share of database agent answers that contain activities
+  - summary: score_response_quality of the final response on a fixed agent output
+  """
+  rows = []
+
+  def timed(func):
+    start = time.time()
+    value = func()
+    return value, time.time() - start
+
+  for model in stage_models.get("routing", []):
+    orchestrator = Orchestrator(apiKey=api_key, agents={}, stageModels={"routing": model})
+    latencies, routed = [], []
+    for query, expected_agents in ROUTING_CASES:
+      selected, latency = timed(lambda: orchestrator.routing(query))
+      latencies.append(latency)
+      routed.append((selected, expected_agents))
+    metrics = routing_metrics(routed)
+    rows.append({"stage": "routing", "model": model, "latencies": latencies, "quality": metrics["accuracy"],
+                 "precision": metrics["precision"], "recall": metrics["recall"]})
+
+  for model in stage_models.get("extraction", []):
+    agent = DatabaseAgent(apiKey=api_key, model=model)
+    latencies, found = [], 0
+    for query in EXTRACTION_QUERIES:
+      try:
+        result, latency = timed(lambda: agent.run(query))
+        found += "return_activities" in str(result.get("output"))
+      except Exception as e:
+        logging.error(f"Extraction with {model} failed: {e}")
+        latency = float("nan")
+      latencies.append(latency)
+    rows.append({"stage": "extraction", "model": model, "latencies": latencies,
+                 "quality": found / len(EXTRACTION_QUERIES) * 100})
+
+  for model in stage_models.get("summary", []):
+    orchestrator = Orchestrator(apiKey=api_key, agents={}, stageModels={"routing": LOCAL_ROUTER, "summary": model})
+    response, latency = timed(lambda: orchestrator.summarize(*SUMMARY_SAMPLE))
+    rows.append({"stage": "summary", "model": model, "latencies": [latency],
+                 "quality": score_response_quality(response)})
+
+  print(f"\n{'Stage':<12}{'Model':<24}{'Mean latency':>14}{'Max latency':>14}{'Quality':>10}")
+  print("-" * 74)
+  for row in rows:
+    latencies = row["latencies"]
+    print(f"{row['stage']:<12}{row['model']:<24}{sum(latencies) / len(latencies):>13.2f}s"
+          f"{max(latencies):>13.2f}s{row['quality']:>9.1f}%"
+          + (f"  (precision {row['precision']:.0f}%, recall {row['recall']:.0f}%)" if "precision" in row else ""))
+
+  return rows
+
+
+def run_load_test(new_orchestrator: Callable[[], Orchestrator], args) -> List[LoadTestResult]:
+  """Run a single load step or a ramp against Orchestrator.run, one orchestrator per session, and print the results."""
+  queries = [query for query, _ in ROUTING_CASES]
+  generator = LoadGenerator(lambda: new_orchestrator().run, queries)
+
+  if args.ramp is None:
+    results = [generator.run(args.sessions, args.rps, args.duration)]
+    print(results[0])
+    return results
+
+  results, last_healthy = generator.ramp(
+      args.sessions, args.rps, args.ramp, args.max_rps, args.duration)
+  print("\nLOAD TEST RAMP")
+  print("-" * 50)
+  for result in results:
+    print(result)
+  if last_healthy is None:
+    print("Saturated at the first step, lower --rps")
+  else:
+    print(f"Saturation point: ~{last_healthy.throughput:.2f} rps with {last_healthy.sessions} sessions")
+  return results
+
+
 def main():
   """Main evaluation function."""
   import argparse
@@ -630,6 +1025,30 @@ def main():
       "--api-key", help="Gemini API Key (or set GEMINI_API_KEY env var)")
   parser.add_argument(
       "--output", help="Output file for detailed results (optional)")
+  parser.add_argument(
+      "--stage-benchmark", action="store_true",
+      help="Only compare latency and quality of the candidate models per pipeline stage")
+  parser.add_argument(
+      "--load-test", action="store_true",
+      help="Only run the load generator against Orchestrator.run")
+  parser.add_argument("--sessions", type=int, default=5,
+                      help="Concurrent sessions for --load-test")
+  parser.add_argument("--rps", type=float, default=0.5,
+                      help="Target request rate for --load-test (start rate with --ramp)")
+  parser.add_argument("--duration", type=float, default=30.0,
+                      help="Duration of a load step in seconds")
+  parser.add_argument("--ramp", type=float, default=None, metavar="STEP_RPS",
+                      help="Increase the rate by STEP_RPS per step until saturation")
+  parser.add_argument("--max-rps", type=float, default=10.0,
+                      help="Upper bound of the ramp")
+  parser.add_argument("--workers", type=int, default=4,
+                      help="Tests and queries run in parallel during the evaluation")
+  parser.add_argument("--query-rps", type=float, default=1.0,
+                      help="Shared rate limit for evaluation queries")
+  parser.add_argument("--baseline",
+                      help="Report JSON to compare against, exit non-zero on regression")
+  parser.add_argument("--threshold", type=float, default=0.2,
+                      help="Allowed relative regression of p95 latency and LLM calls (default 0.2)")
   args = parser.parse_args()
 
   # Get API key
@@ -638,9 +1057,18 @@ def main():
     print("Error: GEMINI_API_KEY must be provided via --api-key argument or environment variable")
     sys.exit(1)
 
+  if args.stage_benchmark:
+    benchmark_stage_models(api_key)
+    sys.exit(0)
+
+  if args.load_test:
+    run_load_test(AdventureAdvisorEvaluator(api_key).build_orchestrator, args)
+    sys.exit(0)
+
   try:
     # Initialize evaluator
-    evaluator = AdventureAdvisorEvaluator(api_key)
+    evaluator = AdventureAdvisorEvaluator(
+        api_key, workers=args.workers, query_rps=args.query_rps)
 
     # Run evaluation
     print("Starting Adventure Advisor Evaluation...")
@@ -652,26 +1080,22 @@ def main():
     evaluator.print_detailed_report(report)
 
     # Save results if output file specified
+    results = report_to_dict(report)
     if args.output:
       with open(args.output, 'w') as f:
-        json.dump({
-            'total_score': report.total_score,
-            'category_scores': {cat.value: score for cat, score in report.category_scores.items()},
-            'test_results': [{
-                'name': t.name,
-                'category': t.category.value,
-                'score': t.score,
-                'max_score': t.max_score,
-                'success': t.success,
-                'execution_time': t.execution_time,
-                'details': t.details
-            } for t in report.test_results],
-            'summary': report.summary,
-            'recommendations': report.recommendations,
-            'timestamp': datetime.now().isoformat()
-        }, f, indent=2)
+        json.dump(results, f, indent=2)
       print(f"Detailed results saved to: {args.output}")
 
+    # Performance regression gate
+    if args.baseline:
+      with open(args.baseline) as f:
+        baseline = json.load(f)
+      regressions = check_regressions(results, baseline, args.threshold)
+      for regression in regressions:
+        print(f"REGRESSION: {regression}")
+      if regressions:
+        sys.exit(1)
+
     # Exit with appropriate code
     sys.exit(0 if report.total_score >= 70 else 1)
 
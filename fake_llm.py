@@ -0,0 +1,74 @@
+import itertools
+import random
+import threading
+import time
+from typing import Callable
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from token_usage import estimateTokens
+
+
+class FakeChatModel(BaseChatModel):
+  """Local stand-in for ChatGoogleGenerativeAI, no network involved. Replies are taken from `responses` in turn,
+  each call sleeps for a latency drawn from `latency` (seconds), and token usage is estimated from the prompt.
+
+  Args:
+    responses (list): Replies, either strings or prepared AIMessages (e.g. with tool_calls). Cycled when exhausted.
+    responder (Callable | None): Computes the reply from the prompt messages instead of `responses`, for scripted agent runs.
+    latency (float): Base latency of every call.
+    stallProbability (float): Chance that a call stalls for `stallLatency` instead, to simulate tail latency.
+    stallLatency (float): Latency of a stalled call.
+    seed (int | None): Seed for reproducible stalls.
+  """
+  responses: list = ["ok"]
+  responder: Callable | None = None
+  latency: float = 0.0
+  stallProbability: float = 0.0
+  stallLatency: float = 10.0
+  seed: int | None = None
+
+  calls: int = 0
+
+  _cycle: itertools.cycle = PrivateAttr()
+  _random: random.Random = PrivateAttr()
+  _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+  def model_post_init(self, context):
+    self._cycle = itertools.cycle(self.responses)
+    self._random = random.Random(self.seed)
+
+  @property
+  def _llm_type(self) -> str:
+    return "fake-chat-model"
+
+  def sampleLatency(self) -> float:
+    with self._lock:
+      stalled = self._random.random() < self.stallProbability
+    return self.stallLatency if stalled else self.latency
+
+  def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+    time.sleep(self.sampleLatency())
+    with self._lock:
+      self.calls += 1
+      reply = self.responder(messages) if self.responder else next(self._cycle)
+
+    message = reply.model_copy() if isinstance(reply, AIMessage) else AIMessage(content=reply)
+    inputTokens = sum(estimateTokens(str(m.content)) for m in messages)
+    outputTokens = estimateTokens(str(message.content))
+    message.usage_metadata = {
+        "input_tokens": inputTokens,
+        "output_tokens": outputTokens,
+        "total_tokens": inputTokens + outputTokens,
+    }
+    return ChatResult(generations=[ChatGeneration(message=message)])
+
+  def bind_tools(self, tools, **kwargs):
+    # replies are scripted, so the tool schemas are not needed
+    return self
+
+  def get_num_tokens_from_messages(self, messages, tools=None) -> int:
+    return sum(estimateTokens(str(m.content)) for m in messages)
@@ -0,0 +1,70 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Callable
+
+
+class JobCancelled(Exception):
+  """Raised inside a job at its next status update after it was cancelled."""
+
+
+class Job:
+  """Handle of a background run: current status text, cooperative cancellation and the result future."""
+
+  def __init__(self):
+    self.status = "Waiting for a free worker..."
+    self.future: Future | None = None
+    self._cancelled = threading.Event()
+
+  @property
+  def cancelled(self) -> bool:
+    return self._cancelled.is_set()
+
+  def update(self, status: str):
+    """Report progress from the worker. Raises JobCancelled once the job was cancelled, so the run stops at
+    the next stage instead of spending further LLM calls on an answer nobody waits for."""
+    if self._cancelled.is_set():
+      raise JobCancelled()
+    self.status = status
+
+  def cancel(self):
+    self._cancelled.set()
+    self.future.cancel()
+
+  def done(self) -> bool:
+    return self.future.done()
+
+  def wait(self, timeout: float | None = None):
+    wait([self.future], timeout=timeout)
+
+  def result(self, timeout: float | None = None):
+    return self.future.result(timeout=timeout)
+
+
+class JobPool:
+  """Bounded worker pool for pipeline runs, shared by all sessions of the process. Requests beyond `maxWorkers`
+  queue instead of adding threads.
+
+  Args:
+    maxWorkers (int): Number of concurrent runs.
+  """
+
+  def __init__(self, maxWorkers: int):
+    self._pool = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="job")
+
+  def submit(self, func: Callable[[Job], object], after: Job | None = None) -> Job:
+    """Run `func(job)` in the pool. With `after`, the run starts once that job has stopped, e.g. a cancelled
+    previous run of the same session that still finishes its current stage."""
+    job = Job()
+
+    def run():
+      if after is not None:
+        after.wait()
+      job.update("Starting...")
+      return func(job)
+
+    job.future = self._pool.submit(run)
+    return job
+
+
+JOBS = JobPool(int(os.environ.get("ORCHESTRATOR_WORKERS", 8)))
@@ -0,0 +1,248 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import messages_to_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from rate_limit import COALESCER, ModelRateLimiter
+from token_usage import estimateTokens, percentile
+from tracing import setSpanAttribute
+
+# output tokens reserved per call before the actual usage is known
+EXPECTED_OUTPUT_TOKENS = 256
+
+# shared by all agents, hedged requests and abandoned slow attempts run here
+_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm")
+
+
+def estimateRequestTokens(messages) -> int:
+  """Tokens a request is expected to use, reserved on the rate limiter before it is sent."""
+  return sum(estimateTokens(str(m.content)) for m in messages) + EXPECTED_OUTPUT_TOKENS
+
+
+@dataclass
+class LLMPolicy:
+  """Timeout, retry, hedging and fallback settings for the LLM calls of one agent.
+
+  Args:
+    timeout (float): Deadline in seconds for a single attempt, including a hedged request.
+    maxRetries (int): Number of retries after a failed attempt.
+    backoffBase (float): Base delay in seconds of the exponential backoff, full jitter is applied.
+    backoffMax (float): Upper bound of a single backoff delay.
+    hedgeQuantile (float): Send a second request once the first one runs longer than this percentile of observed latencies.
+    hedgeMinSamples (int): Number of observed calls required before the percentile is used. Set to 0 to always use `hedgeDelay`.
+    hedgeDelay (float | None): Fixed hedge delay used until enough samples are observed. None disables hedging until then.
+    fallbackModel (str | None): Cheaper/faster model used when the primary times out or all retries fail.
+    coalesce (bool): Share one upstream call between identical prompts that are in flight at the same time.
+  """
+  timeout: float = 30.0
+  maxRetries: int = 2
+  backoffBase: float = 0.5
+  backoffMax: float = 8.0
+  hedgeQuantile: float = 95
+  hedgeMinSamples: int = 20
+  hedgeDelay: float | None = None
+  fallbackModel: str | None = None
+  coalesce: bool = True
+
+
+class ResilientChatModel(BaseChatModel):
+  """Chat model wrapper that applies an LLMPolicy around a primary model: per-attempt deadline, a hedged second
+  request after a latency-percentile delay, jittered exponential backoff between retries and an optional fallback model.
+  Every upstream request waits for its model's rate limiter, and identical concurrent prompts (same `coalesceKey`)
+  share a single upstream call.
+  Tool binding is delegated to the primary model, so the wrapper can be used by AgentExecutor like the model itself.
+  """
+  primary: BaseChatModel
+  fallback: BaseChatModel | None = None
+  policy: LLMPolicy = LLMPolicy()
+  limiter: ModelRateLimiter | None = None
+  fallbackLimiter: ModelRateLimiter | None = None
+  coalesceKey: str | None = None
+
+  model_config = {"arbitrary_types_allowed": True}
+
+  _latencies: list = PrivateAttr(default_factory=list)
+  _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+  @property
+  def _llm_type(self) -> str:
+    return f"resilient-{self.primary._llm_type}"
+
+  def bind_tools(self, tools, **kwargs):
+    bound = self.primary.bind_tools(tools, **kwargs)
+    return self.bind(**getattr(bound, "kwargs", {}))
+
+  def get_num_tokens_from_messages(self, messages, tools=None) -> int:
+    return self.primary.get_num_tokens_from_messages(messages)
+
+  def hedgeDelay(self) -> float | None:
+    with self._lock:
+      samples = list(self._latencies)
+    if self.policy.hedgeMinSamples and len(samples) >= self.policy.hedgeMinSamples:
+      return percentile(samples, self.policy.hedgeQuantile)
+    return self.policy.hedgeDelay
+
+  def _observe(self, latency: float):
+    with self._lock:
+      self._latencies.append(latency)
+      # keep a sliding window so the percentile follows current conditions
+      del self._latencies[:-200]
+
+  def _attempt(self, model: BaseChatModel, messages, stop, **kwargs) -> ChatResult:
+    """Run one attempt with deadline, hedging once if the first request is slower than the hedge delay. The wait
+    for the rate limiter comes first, so it counts neither towards the deadline and the hedge delay nor the
+    latency samples, and a hedge is only sent with spare capacity."""
+    estimated = estimateRequestTokens(messages)
+    if self.limiter is not None:
+      self.limiter.acquire(estimated)
+    start = time.monotonic()
+    deadline = start + self.policy.timeout
+
+    def call():
+      callStart = time.monotonic()
+      result = self._request(model, self.limiter, estimated, messages, stop, **kwargs)
+      self._observe(time.monotonic() - callStart)
+      return result
+
+    pending = {_POOL.submit(call)}
+    hedgeDelay = self.hedgeDelay()
+    hedged = False
+    lastError = None
+
+    while pending:
+      remaining = deadline - time.monotonic()
+      if remaining <= 0:
+        break
+      waitFor = remaining
+      if not hedged and hedgeDelay is not None:
+        waitFor = min(remaining, max(0.0, start + hedgeDelay - time.monotonic()))
+
+      done, pending = wait(pending, timeout=waitFor, return_when=FIRST_COMPLETED)
+      for future in done:
+        if future.exception() is None:
+          setSpanAttribute("hedged", hedged)
+          return future.result()
+        lastError = future.exception()
+
+      if not hedged and hedgeDelay is not None and time.monotonic() - start >= hedgeDelay:
+        hedged = True
+        # under throttling a second request would only add to the load the limiter caps
+        if self.limiter is None or self.limiter.tryAcquire(estimated):
+          pending.add(_POOL.submit(call))
+
+    if lastError is not None and not pending:
+      raise lastError
+    raise TimeoutError(f"LLM call exceeded {self.policy.timeout}s deadline")
+
+  def _limitedCall(self, model: BaseChatModel, limiter: ModelRateLimiter | None, messages, stop, **kwargs) -> ChatResult:
+    """Single upstream request, after waiting for capacity on the model's rate limiter."""
+    estimated = estimateRequestTokens(messages)
+    if limiter is not None:
+      limiter.acquire(estimated)
+    return self._request(model, limiter, estimated, messages, stop, **kwargs)
+
+  @staticmethod
+  def _request(model: BaseChatModel, limiter: ModelRateLimiter | None, estimated: int, messages, stop, **kwargs) -> ChatResult:
+    """Single upstream request whose capacity was already taken from `limiter`, corrected by the actual usage."""
+    result = model._generate(messages, stop=stop, **kwargs)
+    usage = getattr(result.generations[0].message, "usage_metadata", None) if result.generations else None
+    if limiter is not None and usage:
+      limiter.settle(estimated, usage.get("total_tokens", estimated))
+    return result
+
+  def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+    if self.coalesceKey is None:
+      return self._generateWithPolicy(messages, stop, **kwargs)
+
+    key = json.dumps([self.coalesceKey, messages_to_dict(messages), stop, kwargs], sort_keys=True, default=str)
+    result, leader = COALESCER.run(key, lambda: self._generateWithPolicy(messages, stop, **kwargs))
+    if leader:
+      return result
+
+    # the tokens were spent once by the leading call, don't account them again
+    setSpanAttribute("coalesced", True)
+    generations = list()
+    for generation in result.generations:
+      message = generation.message.model_copy()
+      message.usage_metadata = None
+      generations.append(ChatGeneration(message=message))
+    return ChatResult(generations=generations)
+
+  def _generateWithPolicy(self, messages, stop=None, **kwargs) -> ChatResult:
+    lastError = None
+    for attempt in range(self.policy.maxRetries + 1):
+      try:
+        return self._attempt(self.primary, messages, stop, **kwargs)
+      except TimeoutError as e:
+        lastError = e
+        if self.fallback is not None:
+          # the primary is slow right now, retrying it would only add another full deadline
+          break
+      except Exception as e:
+        lastError = e
+
+      if attempt < self.policy.maxRetries:
+        delay = min(self.policy.backoffMax, self.policy.backoffBase * 2 ** attempt)
+        time.sleep(random.uniform(0, delay))
+
+    if self.fallback is None:
+      raise lastError
+
+    setSpanAttribute("fallback", True)
+    future = _POOL.submit(self._limitedCall, self.fallback, self.fallbackLimiter, messages, stop, **kwargs)
+    return future.result(timeout=self.policy.timeout)
+
+
+def demo(calls: int = 40):
+  """Compare a plain model with a hedged one on a fake LLM where 10% of the calls stall."""
+  from fake_llm import FakeChatModel
+
+  def run(model) -> list:
+    latencies = list()
+    for _ in range(calls):
+      start = time.monotonic()
+      model.invoke("ping")
+      latencies.append(time.monotonic() - start)
+    return latencies
+
+  fake = dict(latency=0.1, stallProbability=0.1, stallLatency=3.0, seed=7)
+  plain = run(FakeChatModel(**fake))
+  resilient = run(ResilientChatModel(
+      primary=FakeChatModel(**fake),
+      fallback=FakeChatModel(latency=0.05),
+      policy=LLMPolicy(timeout=1.0, hedgeMinSamples=0, hedgeDelay=0.2, fallbackModel="fake-lite"),
+  ))
+
+  for name, latencies in [("plain", plain), ("hedged", resilient)]:
+    print(f"{name:>8}: p50 {percentile(latencies, 50):.2f}s  p95 {percentile(latencies, 95):.2f}s  "
+          f"max {max(latencies):.2f}s  total {sum(latencies):.1f}s")
+
+
+def demoThrottling(users: int = 20):
+  """Burst of concurrent users on a fake LLM limited to 300 RPM: identical prompts share one upstream call,
+  the rest queue on the limiter instead of failing."""
+  from fake_llm import FakeChatModel
+
+  fake = FakeChatModel(latency=0.2)
+  model = ResilientChatModel(primary=fake, limiter=ModelRateLimiter(rpm=300, tpm=1_000_000), coalesceKey="fake")
+  model.limiter.requests.debit(model.limiter.requests.capacity)  # start with an empty bucket
+
+  prompts = ["Which agents for: hikes near Trento?"] * (users // 2) + [f"Which agents for query {i}?" for i in range(users // 2)]
+  start = time.monotonic()
+  with ThreadPoolExecutor(max_workers=users) as pool:
+    futures = [pool.submit(model.invoke, prompt) for prompt in prompts]
+    errors = sum(1 for future in futures if future.exception() is not None)
+  print(f"{users} concurrent calls ({users // 2} identical): {fake.calls} upstream calls, "
+        f"{errors} errors, {time.monotonic() - start:.1f}s at 5 requests/s")
+
+
+if __name__ == "__main__":
+  demo()
+  demoThrottling()
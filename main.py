@@ -1,12 +1,9 @@
 import os
 from dotenv import load_dotenv
-import requests
 import argparse
-from base_agent import BaseAgent
-from calendar_agent import CalendarAgent
-from weather_agent import WeatherAgent
-from database_agent import DatabaseAgent
-from orchestrator import Orchestrator
+import streamlit as st
+from api_client import ApiClient
+from server import buildOrchestrator
 from app import StreamlitApp
 
 if __name__ == "__main__":
@@ -16,20 +13,21 @@ if __name__ == "__main__":
       "-u", "--user", type=str, default="User",
       help="Username for the session"
   )
+  parser.add_argument(
+      "--api", type=str, default=os.environ.get("ADVISOR_API_URL"),
+      help="URL of a server.py API to send queries to instead of running the agents in this process"
+  )
   args = parser.parse_args()
 
   load_dotenv()
-  GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 
-  calendarAgent = CalendarAgent(apiKey=GEMINI_API_KEY)
-  weatherAgent = WeatherAgent(apiKey=GEMINI_API_KEY)
-  databaseAgent = DatabaseAgent(apiKey=GEMINI_API_KEY)
-  agents = {
-      "calendar": calendarAgent,
-      "weather": weatherAgent,
-      "database": databaseAgent
-  }
-  orchestrator = Orchestrator(apiKey=GEMINI_API_KEY, agents=agents)
+  if args.api:
+    # one API session per browser session, kept across reruns of this script
+    if "advisor" not in st.session_state:
+      st.session_state.advisor = ApiClient(args.api, user=args.user)
+    orchestrator = st.session_state.advisor
+  else:
+    orchestrator = buildOrchestrator(os.environ.get("GEMINI_API_KEY"), user=args.user)
 
   app = StreamlitApp(orchestrator, user=args.user)
   app.run()
@@ -1,13 +1,34 @@
-from base_agent import BaseAgent
-from typing import Dict, Any, List
-from dataclasses import dataclass
 import ast
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
+from contextvars import copy_context
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
 from langchain.prompts import ChatPromptTemplate
+from langchain_core.callbacks import BaseCallbackHandler
+
+from base_agent import BaseAgent, DEFAULT_MODEL, LITE_MODEL
+from database_agent import queryDefaults, preferenceFilters
+from enrichment import ForecastCache, FORECAST_CACHE, enrichActivities
+from llm_policy import LLMPolicy
+from recommendations import RecommendationStore, getRecommendationStore, isGenericRecommendation, activitiesOutput
+from recorder import RECORDER
+from token_usage import TokenBudget, UsageTracker, currentQuery, trimToTokens
+from tracing import span, traced, setSpanAttribute
+from user_store import getUserStore
 
 ROUTING_PROMPT = (
     "You are an intelligent router for an Adventure Advisor system. Your goal is to help users find suitable outdoor activities."
     " You will analyze the user's input and decide which specialized sub-agents to call based on the input provided."
     "Current input: {input}\n\n"
+    "USER PREFERENCES: {preferences}\n\n"
     "AVAILABLE AGENTS:"
     "- calendar: Check user's schedule, availability for specific dates"
     "- weather: Get weather forecasts for locations and dates"
@@ -17,6 +38,7 @@ ROUTING_PROMPT = (
     "2. If user mentions weather concerns or outdoor activities → include 'weather' "
     "3. If user asks for activity recommendations → always include 'database'"
     "4. If you have incomplete info for good recommendations → ask clarifying questions"
+    "5. The user preferences are defaults for everything the input leaves open (location, difficulty, activity), they are not missing info"
     "Return your decision as a Python list with only the names of the agents to call, e.g. ['calendar', 'weather']."
     "If no agents are needed, return an empty list."
 )
@@ -25,6 +47,7 @@ SUMMARY_PROMPT = (
 
     "USER QUERY: {input}"
     "AGENT DATA: {agentOutput}"
+    "USER PREFERENCES: {preferences}"
 
     "RESPONSE GUIDELINES:"
     "1. Be conversational and helpful"
@@ -32,9 +55,273 @@ SUMMARY_PROMPT = (
     "3. Include relevant weather/calendar considerations"
     "4. If info is missing, ask specific follow-up questions"
     "5. Acknowledge previous conversation context"
+    "6. Treat the user preferences as answers to questions the user did not repeat, only ask about what they don't cover"
+    "7. Activities are ranked by weather_score (0-100), best first: prefer the top ones and mention their weather"
 
     "Create a natural response that helps the user plan their outdoor adventure."
 )
+# summarisation falls back to this model when gemini-2.0-flash is slow or failing. Routing already runs on it and
+# falls back to the KeywordRouter instead
+FALLBACK_MODEL = LITE_MODEL
+# routing has the KeywordRouter to fall back on, so a slow or failing routing call gives up after one short attempt
+ROUTING_POLICY = LLMPolicy(timeout=5.0, maxRetries=0)
+# routes with the offline KeywordRouter instead of an LLM call
+LOCAL_ROUTER = "local"
+# model per pipeline stage, argument extraction is configured on the sub-agents themselves
+STAGE_MODELS = {
+    "routing": LITE_MODEL,
+    "summary": DEFAULT_MODEL,
+}
+# progress messages reported to `onStatus` when a stage starts
+STAGE_STATUS = {
+    "routing": "Understanding your request...",
+    "calendar": "Checking your calendar...",
+    "weather": "Fetching the weather...",
+    "database": "Searching routes...",
+    "enrich": "Checking the weather at each route...",
+    "summary": "Writing the answer...",
+}
+# sidebar preference keys and how they are described to the models
+PREFERENCE_LABELS = {
+    "location": "location: {}",
+    "difficulty": "difficulty: {} of 5",
+    "durationHours": "max duration: {} h",
+    "distanceKm": "max travel distance: {} km",
+    "preferredActivities": "preferred activities: {}",
+}
+
+
+def describePreferences(preferences: dict) -> str:
+  """One line of the user's preferences for prompts, "none" without preferences."""
+  parts = list()
+  for key, label in PREFERENCE_LABELS.items():
+    value = preferences.get(key)
+    if value:
+      parts.append(label.format(", ".join(value) if isinstance(value, list) else value))
+  return "; ".join(parts) or "none"
+
+# part of the day in which free time counts towards an activity, and the shortest window worth planning for
+DAY_START, DAY_END = "07:00", "20:00"
+MIN_FREE_HOURS = 2
+# agents that get the calendar's free windows when it is selected (see planTasks), never run speculatively with it
+CALENDAR_DEPENDENT = ("weather", "database")
+
+# speculative agent runs, separate from the LLM pool their calls wait on
+_SPECULATION_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="speculative")
+# TaskGraph nodes, separate from the speculative runs they may wait on
+_TASK_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="task")
+# LangChain logs every exception raised by a callback, a cancelled speculation is expected and not an error
+logging.getLogger("langchain_core.callbacks.manager").addFilter(
+    lambda record: "SpeculationCancelled" not in record.getMessage())
+
+
+def parseScheduledEvents(output: str) -> dict | None:
+  """Events per date from the calendar agent's `return_scheduled_events` JSON as (start, end) "HH:MM" pairs,
+  None if the output can't be parsed."""
+  match = re.search(r"\{.*\}", output, re.DOTALL)
+  if match is None:
+    return None
+  try:
+    parsed = json.loads(match.group(0))
+  except json.JSONDecodeError:
+    return None
+  if not isinstance(parsed, dict) or parsed.get("action") != "return_scheduled_events":
+    return None
+
+  days = parsed.get("data")
+  events = dict()
+  for day in days if isinstance(days, list) else [days]:
+    if not isinstance(day, dict) or not day.get("date"):
+      continue
+    slots = events.setdefault(day["date"], [])
+    for event in day.get("events") or []:
+      # "HH:MM" or an ISO datetime
+      times = [re.search(r"\d{2}:\d{2}", str(event.get(key, ""))) for key in ("start", "end")]
+      start, end = (t.group(0) if t else default for t, default in zip(times, ("00:00", "23:59")))
+      slots.append((start, end))
+  return events or None
+
+
+def freeWindows(events: dict | None) -> dict:
+  """Longest free window in hours between DAY_START and DAY_END per date."""
+  def hours(time: str) -> float:
+    h, m = time.split(":")
+    return int(h) + int(m) / 60
+
+  windows = dict()
+  for date, slots in (events or {}).items():
+    longest, free = 0.0, hours(DAY_START)
+    for start, end in sorted(slots):
+      longest = max(longest, min(hours(start), hours(DAY_END)) - free)
+      free = max(free, hours(end))
+    windows[date] = round(max(longest, hours(DAY_END) - free), 1)
+  return windows
+
+
+@dataclass
+class Task:
+  """Node of a TaskGraph. `func` receives the outputs of the tasks named in `after`, keyed by task name."""
+  name: str
+  func: Callable[[dict], Any]
+  after: tuple = ()
+
+
+class TaskGraph:
+  """Small DAG of agent and tool tasks. A task starts as soon as all tasks it depends on have finished,
+  independent tasks run in parallel, and every task gets the structured outputs of its dependencies."""
+
+  def __init__(self, tasks: list[Task]):
+    self.tasks = {task.name: task for task in tasks}
+    for task in tasks:
+      unknown = set(task.after) - set(self.tasks)
+      if unknown:
+        raise ValueError(f"Task {task.name} depends on unknown tasks {sorted(unknown)}")
+
+    # reject cycles up front, they would never become ready
+    resolved = set()
+    while len(resolved) < len(self.tasks):
+      ready = {name for name, task in self.tasks.items() if name not in resolved and set(task.after) <= resolved}
+      if not ready:
+        raise ValueError(f"Cyclic task dependencies between {sorted(set(self.tasks) - resolved)}")
+      resolved |= ready
+
+  @staticmethod
+  def _execute(task: Task, inputs: dict):
+    with span(f"task.{task.name}"):
+      return task.func(inputs)
+
+  def run(self) -> dict:
+    """Run all tasks and return their outputs by name. The first failing task's exception is raised."""
+    outputs, running = dict(), dict()
+    pending = dict(self.tasks)
+    while pending or running:
+      for name, task in list(pending.items()):
+        if all(dependency in outputs for dependency in task.after):
+          inputs = {dependency: outputs[dependency] for dependency in task.after}
+          # every task gets its own copy: same trace, query id and queryDatabase defaults
+          running[_TASK_POOL.submit(copy_context().run, self._execute, task, inputs)] = name
+          del pending[name]
+
+      done, _ = wait(running, return_when=FIRST_COMPLETED)
+      for future in done:
+        outputs[running.pop(future)] = future.result()
+    return outputs
+
+
+class KeywordRouter:
+  """Offline routing classifier following the rules of ROUTING_PROMPT with keyword patterns. No LLM call, no network."""
+
+  PATTERNS = {
+      "calendar": (
+          r"\b(today|tonight|tomorrow|weekend|week|month|monday|tuesday|wednesday|thursday|friday|saturday|sunday"
+          r"|january|february|march|april|may|june|july|august|september|october|november|december"
+          r"|\d{1,2}(st|nd|rd|th)|\d{4}-\d{2}-\d{2}|calendar|schedule|appointments?|events?|free|available|availability|busy)\b"
+      ),
+      "weather": (
+          r"\b(weather|forecast|rain\w*|sun\w*|snow\w*|wind\w*|storm\w*|temperature|cold|hot|warm"
+          r"|hik\w*|bik\w*|cycl\w*|climb\w*|run\w*|outdoor|tour|trail\w*)\b"
+      ),
+      "database": (
+          r"\b(hik\w*|bik\w*|cycl\w*|climb\w*|run\w*|trail\w*|routes?|tours?|activit\w*|walks?|ferrata"
+          r"|recommend\w*|suggest\w*|find|plan\w*|ideas?|what (should|can) i do)\b"
+      ),
+  }
+
+  def __init__(self):
+    self.patterns = {agent: re.compile(pattern, re.IGNORECASE) for agent, pattern in self.PATTERNS.items()}
+
+  def route(self, query: str) -> list:
+    return [agent for agent, pattern in self.patterns.items() if pattern.search(query)]
+
+
+@dataclass
+class SpeculationStats:
+  """Outcome of the speculative agent runs of one session: latency saved by kept runs (their time overlapping
+  the routing call) and the work of discarded ones."""
+  started: int = 0
+  kept: int = 0
+  discarded: int = 0
+  savedSeconds: float = 0.0
+  wastedSeconds: float = 0.0
+  wastedLlmCalls: int = 0
+
+
+class SpeculationCancelled(Exception):
+  """Raised inside a speculative run at its next LLM or tool call once routing discarded it."""
+
+
+class _CancelDiscarded(BaseCallbackHandler):
+  """Stops a speculative run before its next LLM or tool call once it was discarded."""
+  raise_error = True
+
+  def __init__(self, speculation: "Speculation"):
+    self.speculation = speculation
+
+  def _check(self):
+    if self.speculation.discarded:
+      raise SpeculationCancelled(self.speculation.name)
+
+  def on_chat_model_start(self, serialized, messages, **kwargs):
+    self._check()
+
+  def on_llm_start(self, serialized, prompts, **kwargs):
+    self._check()
+
+  def on_tool_start(self, serialized, input_str, **kwargs):
+    self._check()
+
+
+class Speculation:
+  """Agent run started while the routing call is still in flight. The run holds the agent's runLock until
+  routing decided: a kept run stays in the agent's memory, a discarded one stops at its next LLM or tool call
+  and is rolled back."""
+
+  def __init__(self, name: str, agent: BaseAgent, query: str):
+    self.name = name
+    self.agent = agent
+    self.keep = False
+    self.started = time.monotonic()
+    self.finished = None
+    self.decidedAt = None
+    # LLM calls made by this run, the agent's later calls of the same query are not counted
+    self.llmCalls = 0
+    self._decided = threading.Event()
+    # copied context: same trace, query id and queryDatabase defaults as the orchestrator run
+    self.future = _SPECULATION_POOL.submit(copy_context().run, self._run, query)
+
+  @property
+  def discarded(self) -> bool:
+    return self._decided.is_set() and not self.keep
+
+  def _run(self, query: str) -> dict:
+    with self.agent.runLock:
+      queryId = currentQuery.get()
+      callsBefore = self.agent.usage.calls(queryId, self.agent.name)
+      snapshot = self.agent.memorySnapshot()
+      try:
+        if self.discarded:
+          raise SpeculationCancelled(self.name)
+        return self.agent.run(query, callbacks=[_CancelDiscarded(self)])
+      finally:
+        self.finished = time.monotonic()
+        self.llmCalls = self.agent.usage.calls(queryId, self.agent.name) - callsBefore
+        self._decided.wait()
+        if not self.keep:
+          self.agent.restoreMemory(snapshot)
+
+  def decide(self, keep: bool):
+    if not self._decided.is_set():
+      self.keep = keep
+      self.decidedAt = time.monotonic()
+      self._decided.set()
+      if not keep:
+        # not started yet: drop it from the pool queue, otherwise it stops at its next LLM or tool call
+        self.future.cancel()
+
+  @property
+  def overlap(self) -> float:
+    """Seconds of the run that happened before routing decided, i.e. latency saved if the run is kept."""
+    return max(0.0, min(self.decidedAt, self.finished) - self.started)
 
 
 @dataclass
@@ -47,29 +334,71 @@ class ConversationContext:
 
 class Orchestrator(BaseAgent):
 
-  def __init__(self, apiKey: str, tools: list = list(), promptTemplate: str = None, agents: None | dict = None):
+  def __init__(self, apiKey: str, tools: list = list(), promptTemplate: str = None, agents: None | dict = None, budget: TokenBudget | None = None, policy: LLMPolicy | None = None, stageModels: dict | None = None, user: str | None = None, forecasts: ForecastCache | None = None, speculative: bool = False, recommendations: RecommendationStore | None = None):
     """Initialize the Orchestrator agent with the provided API key, tools, and prompt template.
 
     Args:
       apiKey (str): The API key for the Gemini API.
       tools (list, optional): A list of tools to be used by the agent. Defaults to None.
       promptTemplate (str, optional): The prompt template for the agent. Defaults to None.
+      agents (dict, optional): Sub-agents by routing name, e.g. {"weather": WeatherAgent(...)}.
+      budget (TokenBudget, optional): Token limits applied to history and agent output. Defaults to TokenBudget().
+      policy (LLMPolicy, optional): Timeout, retry, hedging and fallback settings. Defaults to falling back to FALLBACK_MODEL.
+      stageModels (dict, optional): Overrides of STAGE_MODELS, e.g. {"routing": LOCAL_ROUTER} for offline routing.
+      user (str, optional): User whose preferences are read from the user store before every query.
+      forecasts (ForecastCache, optional): Forecasts used to rank route candidates. Defaults to the process-wide FORECAST_CACHE.
+      speculative (bool, optional): Start the agents the KeywordRouter predicts while the routing LLM call is in flight.
+      recommendations (RecommendationStore, optional): Precomputed route lists answering generic recommendation queries.
+        Defaults to the store of the nightly job, if it has run.
     """
-    super().__init__(apiKey=apiKey, tools=tools, promptTemplate=promptTemplate)
+    self.stageModels = {**STAGE_MODELS, **(stageModels or {})}
+    super().__init__(apiKey=apiKey, tools=tools, promptTemplate=promptTemplate, budget=budget,
+                     policy=policy or LLMPolicy(fallbackModel=FALLBACK_MODEL), model=self.stageModels["summary"])
 
     self.agents = agents
+    self.user = user
+    self.forecasts = forecasts or FORECAST_CACHE
+    self.speculative = speculative
+    self.recommendations = recommendations or getRecommendationStore()
+    self.predictor = KeywordRouter()
+    self.speculation = SpeculationStats()
+    self._speculationLock = threading.Lock()
+    # one tracker per session: all sub-agents report their token usage to the orchestrator
+    self.attachUsage(self.usage, "orchestrator")
+    for name, agent in (agents or {}).items():
+      agent.attachUsage(self.usage, name)
+
+    self.router = None
+    self.routingLlm = None
+    if self.stageModels["routing"] == LOCAL_ROUTER:
+      self.router = KeywordRouter()
+    else:
+      self.routingLlm = self._loadModel(apiKey, self.stageModels["routing"], ROUTING_POLICY)
+      self.routingLlm.callbacks = self._buildCallbacks("orchestrator.routing")
     self.context = ConversationContext({}, {}, [], [])
+    # chat turns needed per completed recommendation, clarification rounds included
+    self.turnsSinceRecommendation = 0
+    self.recommendationTurns = list()
 
     # self.routingPrompt = self._buildPrompt(ROUTING_PROMPT)
     # self.reasoningPrompt = self._buildPrompt()
     # self.summaryPrompt = self._buildPrompt(SUMMARY_PROMPT)
 
+  @traced("orchestrator.routing")
   def routing(self, query: str) -> list:
-    """Route the query to the appropriate agent(s) based on the input text."""
+    """Route the query to the appropriate agent(s) based on the input text. If the routing model times out or
+    fails, the offline KeywordRouter routes instead."""
+    if self.router is not None:
+      return self.router.route(query)
 
     prompt = ChatPromptTemplate.from_template(ROUTING_PROMPT)
-    prompt = prompt.format_messages(input=query)
-    response = self.llm.invoke(prompt)
+    prompt = prompt.format_messages(
+        input=query, preferences=describePreferences(self.context.userPreferences))
+    try:
+      response = self.routingLlm.invoke(prompt)
+    except Exception:
+      setSpanAttribute("fallback", LOCAL_ROUTER)
+      return self.predictor.route(query)
     # Expecting something like: '["calendar"]' or '["calendar", "weather"]'
 
     try:
@@ -81,17 +410,139 @@ class Orchestrator(BaseAgent):
     except (SyntaxError, ValueError) as e:
       return []
 
-  def callAgents(self, query: str, selectedAgents: list) -> str:
-    """Handle the query by routing it to the appropriate agent(s) and returning the result."""
-    results = list()
+  def agentQuery(self, query: str) -> str:
+    """Query as passed to the sub-agents."""
+    preferences = describePreferences(self.context.userPreferences)
+    if preferences == "none":
+      return query
+    # sub-agents use them e.g. as location of a weather forecast the query didn't name
+    return f"{query}\n\nUser preferences, defaults for anything not stated above: {preferences}"
+
+  def speculate(self, query: str) -> dict:
+    """Start the agents the KeywordRouter predicts for `query`, to overlap their runs with the routing LLM call.
+    With the calendar predicted, only the calendar starts: the others need its free windows."""
+    if not self.speculative or self.routingLlm is None:
+      return {}
+    speculations = dict()
+    predicted = self.predictor.route(query)
+    for name in predicted:
+      if "calendar" in predicted and name in CALENDAR_DEPENDENT:
+        continue
+      if name in (self.agents or {}):
+        speculation = Speculation(name, self.agents[name], self.agentQuery(query))
+        speculation.future.add_done_callback(lambda _, s=speculation: self._settle(s))
+        speculations[name] = speculation
+    with self._speculationLock:
+      self.speculation.started += len(speculations)
+    return speculations
+
+  def _settle(self, speculation: Speculation):
+    with self._speculationLock:
+      if speculation.keep:
+        self.speculation.kept += 1
+        self.speculation.savedSeconds += speculation.overlap
+      else:
+        self.speculation.discarded += 1
+        if speculation.finished is not None:
+          self.speculation.wastedSeconds += speculation.finished - speculation.started
+        self.speculation.wastedLlmCalls += speculation.llmCalls
+
+  def agentTask(self, name: str, query: str, onStatus: Callable[[str], None], speculations: dict,
+                context: Callable[[dict], str] | None = None) -> Callable[[dict], str]:
+    """Task function running sub-agent `name`. `context` turns the outputs of upstream tasks into an addition
+    to the query, e.g. the dates to fetch the weather for. Speculatively started agents only deliver their result."""
+    def run(inputs: dict) -> str:
+      onStatus(STAGE_STATUS.get(name, f"Asking the {name} agent..."))
+      if name in speculations:
+        return str(speculations[name].future.result().get("output"))
+      agentQuery = query + (context(inputs) if context else "")
+      # a discarded speculative run of this agent may still be rolling back
+      with self.agents[name].runLock if self.speculative else nullcontext():
+        return str(self.agents[name].run(agentQuery).get("output"))
+    return run
+
+  def planTasks(self, query: str, selectedAgents: list, onStatus: Callable[[str], None], speculations: dict,
+                precomputed: dict | None = None) -> TaskGraph:
+    """Task graph of the selected agents. With the calendar selected, its events are turned into free windows
+    first: the weather agent gets the free days to fetch instead of re-extracting dates, busy days are skipped,
+    and the database agent gets the free window to fit. Without the calendar, all agents run in parallel.
+    The database output is enriched with forecasts once the date is known. `precomputed` holds task functions
+    that replace agents, e.g. the user's precomputed recommendations instead of the database agent."""
+    precomputed = precomputed or {}
+    query = self.agentQuery(query)
+    tasks = list()
+    windows = tuple()
+    if "calendar" in selectedAgents:
+      windows = ("freeWindows",)
+      tasks.append(Task("calendar", self.agentTask("calendar", query, onStatus, speculations)))
+      tasks.append(Task("freeWindows", lambda inputs: freeWindows(parseScheduledEvents(inputs["calendar"])), ("calendar",)))
+
+    def freeDays(inputs: dict) -> list:
+      return sorted(date for date, hours in inputs.get("freeWindows", {}).items() if hours >= MIN_FREE_HOURS)
+
+    def weatherContext(inputs: dict) -> str:
+      if not inputs.get("freeWindows"):
+        return ""
+      days = freeDays(inputs)
+      if not days:
+        return "\n\nThe user has no free time on the requested days, no forecast is needed."
+      return f"\n\nOnly fetch the weather for the days the user is free: {', '.join(days)}."
+
+    def databaseContext(inputs: dict) -> str:
+      free = {date: hours for date, hours in inputs.get("freeWindows", {}).items() if hours >= MIN_FREE_HOURS}
+      if not free:
+        return ""
+      return "\n\nThe user is free for at most " + ", ".join(f"{hours:g} h on {date}" for date, hours in sorted(free.items())) + \
+          ", prefer activities that fit into that time."
+
+    def enrich(inputs: dict) -> str:
+      onStatus(STAGE_STATUS["enrich"])
+      # forecast of the first free day or the day the weather agent talked about, today otherwise
+      dates = freeDays(inputs) or re.findall(r"\d{4}-\d{2}-\d{2}", inputs.get("weather", ""))
+      return self.enrichActivities(inputs["database"], dates[0] if dates else None)
 
     for agent in selectedAgents:
-      if agent in self.agents:
-        result = self.agents[agent].run(query)
-        results.append(result.get("output"))
+      if agent == "weather":
+        tasks.append(Task("weather", self.agentTask("weather", query, onStatus, speculations, weatherContext), windows))
+      elif agent == "database":
+        database = precomputed.get("database") or self.agentTask("database", query, onStatus, speculations, databaseContext)
+        tasks.append(Task("database", database, windows))
+        tasks.append(Task("enrich", enrich, ("database", *windows, *(("weather",) if "weather" in selectedAgents else ()))))
+      elif agent != "calendar":
+        tasks.append(Task(agent, self.agentTask(agent, query, onStatus, speculations)))
+    return TaskGraph(tasks)
 
-    return "\n\n".join(results)
+  @traced("orchestrator.callAgents")
+  def callAgents(self, query: str, selectedAgents: list, onStatus: Callable[[str], None] | None = None, speculations: dict | None = None,
+                 precomputed: dict | None = None) -> str:
+    """Handle the query by running the selected agent(s) as a task graph (see `planTasks`) and returning their outputs
+    in routing order. Agents in `speculations` were already started before routing and only their results are collected."""
+    selected = list(dict.fromkeys(agent for agent in selectedAgents if agent in self.agents))
+    outputs = self.planTasks(query, selected, onStatus or (lambda status: None), speculations or {}, precomputed).run()
+    results = [outputs["enrich" if agent == "database" else agent] for agent in selected]
+    return "\n\n".join(trimToTokens(output, self.budget.maxAgentOutputTokens) for output in results)
 
+  def precomputedRecommendations(self, query: str) -> Callable[[dict], str] | None:
+    """Task function serving the user's precomputed route list for a generic recommendation query, None if the
+    query sets its own filters or there is no current list. Routes longer than the free window are dropped."""
+    if self.user is None or self.recommendations is None or not isGenericRecommendation(query, self.context.userPreferences):
+      return None
+    routes = self.recommendations.get(self.user, self.context.userPreferences)
+    if routes is None:
+      return None
+
+    def serve(inputs: dict) -> str:
+      free = [hours for hours in inputs.get("freeWindows", {}).values() if hours >= MIN_FREE_HOURS]
+      return activitiesOutput(routes, max(free) if free else None)
+    return serve
+
+  @traced("orchestrator.enrich")
+  def enrichActivities(self, output: str, date: str | None = None) -> str:
+    """Attach a forecast to every route candidate of the database agent and rank them by weather suitability.
+    Candidates in the same region share one cached forecast."""
+    return enrichActivities(output, date or datetime.now().strftime("%Y-%m-%d"), self.forecasts)
+
+  @traced("orchestrator.summarize")
   def summarize(self, userQuery: str, result: str) -> str:
     """Aggregate the results from the selected agents into a single natural language response."""
 
@@ -100,23 +551,108 @@ class Orchestrator(BaseAgent):
     )
     instructions = instructions.format_messages(
         input=userQuery,
-        agentOutput=result
+        agentOutput=trimToTokens(result, self.budget.maxSummaryInputTokens),
+        preferences=describePreferences(self.context.userPreferences)
     )
 
     finalResponse = self.llm.invoke(instructions)
     return finalResponse.content if isinstance(finalResponse.content, str) else str(finalResponse.content)
 
-  def run(self, query: str) -> str:
+  def run(self, query: str, onStatus: Callable[[str], None] | None = None) -> str:
     """Run the orchestrator agent with a user query. The query is passed to the LLM, which decides which specialized agents to call.
     The results from the selected agents are aggregated and summarized into a single response.
     The final response is returned as a string.
+
+    `onStatus` receives a STAGE_STATUS message before every stage. It may raise to abort the run, e.g. JobCancelled.
     """
+    queryId = self.usage.startQuery()
+    start = time.monotonic()
+    onStatus = onStatus or (lambda status: None)
+    defaults = queryDefaults.set(preferenceFilters(self.loadPreferences()))
 
-    selectedAgents = self.routing(query)
-    if not isinstance(selectedAgents, list) or not selectedAgents:
-      results = ""
-    else:
-      results = self.callAgents(query, selectedAgents)
-    summary = self.summarize(query, results)
+    try:
+      with span("orchestrator.run", queryId=queryId) as root:
+        onStatus(STAGE_STATUS["routing"])
+        precomputed = self.precomputedRecommendations(query)
+        if precomputed is not None:
+          # no routing, no database agent: the calendar and the forecasts only re-rank the precomputed list
+          selectedAgents = ["calendar", "database"] if self.predictor.patterns["calendar"].search(query) else ["database"]
+          root.setAttribute("agents", str(selectedAgents))
+          root.setAttribute("precomputed", True)
+          results = self.callAgents(query, selectedAgents, onStatus, precomputed={"database": precomputed})
+        else:
+          speculations = self.speculate(query)
+          try:
+            selectedAgents = self.routing(query)
+            root.setAttribute("agents", str(selectedAgents))
+            if not isinstance(selectedAgents, list):
+              selectedAgents = []
+            for name, speculation in speculations.items():
+              # runs without the calendar's free windows are discarded when routing selected the calendar
+              speculation.decide(name in selectedAgents and not ("calendar" in selectedAgents and name in CALENDAR_DEPENDENT))
+            if speculations:
+              root.setAttribute("speculated", str(list(speculations)))
+            if not selectedAgents:
+              results = ""
+            else:
+              results = self.callAgents(query, selectedAgents, onStatus,
+                                        {name: s for name, s in speculations.items() if s.keep})
+          finally:
+            # also when routing fails or the run is cancelled, so no speculative run waits forever
+            for speculation in speculations.values():
+              speculation.decide(False)
+        onStatus(STAGE_STATUS["summary"])
+        summary = self.summarize(query, results)
+        root.setAttribute("recommendation", self.countTurn(results))
+    finally:
+      queryDefaults.reset(defaults)
+
+    if RECORDER.enabled:
+      RECORDER.log("query", "orchestrator.run", query, summary, time.monotonic() - start)
 
     return summary
+
+  def loadPreferences(self) -> dict:
+    """Refresh the user's preferences from the store, cheap while the stored profile is unchanged."""
+    if self.user is not None:
+      self.context.userPreferences = getUserStore().get(self.user)
+    return self.context.userPreferences
+
+  @staticmethod
+  def isRecommendation(agentOutput: str) -> bool:
+    """Whether the database agent returned at least one activity in this turn."""
+    return '"return_activities"' in agentOutput and '"title"' in agentOutput
+
+  def countTurn(self, agentOutput: str) -> bool:
+    """Count a chat turn towards the next recommendation. Returns whether this turn completed one."""
+    self.turnsSinceRecommendation += 1
+    recommended = self.isRecommendation(agentOutput)
+    if recommended:
+      self.recommendationTurns.append(self.turnsSinceRecommendation)
+      self.turnsSinceRecommendation = 0
+    return recommended
+
+  def startSession(self):
+    """Forget the usage, turn counts and speculation stats of the previous session, e.g. when a pool hands this
+    orchestrator to another session. Conversation memories are restored separately."""
+    self.usage = UsageTracker()
+    self.attachUsage(self.usage, "orchestrator")
+    for name, agent in (self.agents or {}).items():
+      agent.attachUsage(self.usage, name)
+    if self.routingLlm is not None:
+      self.routingLlm.callbacks = self._buildCallbacks("orchestrator.routing")
+    self.turnsSinceRecommendation = 0
+    self.recommendationTurns = list()
+    with self._speculationLock:
+      self.speculation = SpeculationStats()
+
+  def usageReport(self) -> dict:
+    """Token usage of this session: totals, per-agent breakdown and p50/p95 tokens per query,
+    the average number of turns per completed recommendation and the outcome of speculative agent runs."""
+    report = self.usage.report()
+    turns = self.recommendationTurns
+    report["recommendations"] = len(turns)
+    report["turnsPerRecommendation"] = sum(turns) / len(turns) if turns else None
+    with self._speculationLock:
+      report["speculation"] = asdict(self.speculation)
+    return report
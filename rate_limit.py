@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+
+class TokenBucket:
+  """Thread-safe token bucket. `acquire` blocks until enough tokens are available.
+
+  Args:
+    rate (float): Tokens added per second.
+    capacity (float | None): Maximum burst size. Defaults to one second worth of tokens (at least 1).
+  """
+
+  def __init__(self, rate: float, capacity: float | None = None):
+    self.rate = rate
+    self.capacity = capacity if capacity is not None else max(1.0, rate)
+    self._tokens = self.capacity
+    self._updated = time.monotonic()
+    self._lock = threading.Lock()
+
+  def _refill(self):
+    now = time.monotonic()
+    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+    self._updated = now
+
+  def tryAcquire(self, tokens: float = 1) -> float:
+    """Take `tokens` if available and return 0, otherwise return the seconds to wait before they are."""
+    with self._lock:
+      self._refill()
+      if self._tokens >= tokens:
+        self._tokens -= tokens
+        return 0.0
+      return (tokens - self._tokens) / self.rate
+
+  def acquire(self, tokens: float = 1) -> float:
+    """Block until `tokens` are taken. Requests larger than the capacity are capped to it. Returns the time waited."""
+    tokens = min(tokens, self.capacity)
+    waited = 0.0
+    while True:
+      delay = self.tryAcquire(tokens)
+      if delay == 0:
+        return waited
+      time.sleep(delay)
+      waited += delay
+
+  def debit(self, tokens: float):
+    """Take `tokens` without waiting, the balance may go negative. Negative values refund tokens."""
+    with self._lock:
+      self._refill()
+      self._tokens = min(self.capacity, self._tokens - tokens)
+
+
+class ModelRateLimiter:
+  """Requests-per-minute and tokens-per-minute limits of one model. Calls wait for capacity instead of failing with 429.
+
+  Args:
+    rpm (float): Requests per minute.
+    tpm (float): Input and output tokens per minute.
+  """
+
+  def __init__(self, rpm: float, tpm: float):
+    self.requests = TokenBucket(rpm / 60, capacity=rpm)
+    self.tokens = TokenBucket(tpm / 60, capacity=tpm)
+
+  def acquire(self, estimatedTokens: int) -> float:
+    """Block until a request with `estimatedTokens` fits both limits. Returns the time waited."""
+    return self.requests.acquire() + self.tokens.acquire(estimatedTokens)
+
+  def tryAcquire(self, estimatedTokens: int) -> bool:
+    """Take capacity for a request with `estimatedTokens` if both limits allow it right now, without waiting."""
+    if self.requests.tryAcquire() > 0:
+      return False
+    if self.tokens.tryAcquire(min(estimatedTokens, self.tokens.capacity)) > 0:
+      self.requests.debit(-1)
+      return False
+    return True
+
+  def settle(self, estimatedTokens: int, actualTokens: int):
+    """Correct the token balance once the actual usage of a request is known."""
+    self.tokens.debit(actualTokens - estimatedTokens)
+
+
+# (requests per minute, tokens per minute) per model, Gemini API tier 1. GEMINI_RPM / GEMINI_TPM override all models.
+MODEL_LIMITS = {
+    "gemini-2.0-flash": (2000, 4_000_000),
+    "gemini-2.0-flash-lite": (4000, 4_000_000),
+}
+DEFAULT_LIMITS = (1000, 1_000_000)
+
+_limiters: dict[str, ModelRateLimiter] = dict()
+_limitersLock = threading.Lock()
+
+
+def getLimiter(model: str) -> ModelRateLimiter:
+  """Process-wide limiter of a model, shared by all agents and sessions using it."""
+  with _limitersLock:
+    if model not in _limiters:
+      rpm, tpm = MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+      rpm = float(os.environ.get("GEMINI_RPM", rpm))
+      tpm = float(os.environ.get("GEMINI_TPM", tpm))
+      _limiters[model] = ModelRateLimiter(rpm, tpm)
+    return _limiters[model]
+
+
+class Coalescer:
+  """Collapses identical concurrent calls into one: the first caller runs it, callers arriving while it is
+  in flight wait for and share its result."""
+
+  def __init__(self):
+    self._inflight: dict[str, Future] = dict()
+    self._lock = threading.Lock()
+
+  def run(self, key: str, func) -> tuple:
+    """Run `func` once per in-flight `key`. Returns the result and whether this caller made the call."""
+    with self._lock:
+      future = self._inflight.get(key)
+      leader = future is None
+      if leader:
+        future = Future()
+        self._inflight[key] = future
+
+    if not leader:
+      return future.result(), False
+
+    try:
+      result = func()
+      future.set_result(result)
+      return result, True
+    except BaseException as e:
+      future.set_exception(e)
+      raise
+    finally:
+      with self._lock:
+        del self._inflight[key]
+
+
+COALESCER = Coalescer()
@@ -0,0 +1,204 @@
+"""Precomputed recommendations: a ranked top-k route list per user, computed offline from the user's profile and
+the route catalogue. The orchestrator answers generic recommendation queries ("what should I do this weekend?")
+from it without routing or the database agent, and only re-ranks the list with fresh calendar and weather data.
+
+Lists live in one SQLite table (RECOMMENDATIONS_DB, default `recommendations.db`) as compact '|' tables. A list
+is served only while it is younger than MAX_AGE and the user's profile has not changed since it was computed.
+Run nightly, e.g. from cron:
+
+  python recommendations.py [--k 10] [--users dennis anna]
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from database_agent import Route, ROUTE_COLUMNS, fetchRoutes, preferenceFilters, serializeRoutes
+from user_store import getUserStore
+
+RECOMMENDATIONS_DB = "recommendations.db"
+RECOMMENDATION_K = 10
+# routes scored per distinct set of profile filters
+CANDIDATES = 500
+# nightly job plus slack, older lists are ignored
+MAX_AGE = 36 * 3600
+STORED_COLUMNS = ("title", "category", "region", "length_m", "duration_min", "difficulty")
+
+# explicit requests for activity recommendations that set no filters of their own
+GENERIC_QUERY = re.compile(
+    r"\b(what (should|can|could) (i|we) do|where (should|can|could) (i|we) go|anything (good|nice|fun) to do"
+    r"|(recommend|suggest)\w*( me| us)? (something|some|an? (activity|route|tour|trip|outing)|activities|routes|tours)"
+    r"|(recommendations?|suggestions?|ideas?) for (an? |some )?(activity|activities|routes?|tours?|trips?|outings?|something to do"
+    r"|the weekend|this weekend|today|tomorrow))\b", re.IGNORECASE)
+# questions about the weather, the calendar or anything but routes, answered through routing even if phrased as above
+OTHER_INTENT = re.compile(
+    r"\b(weather|forecasts?|rain\w*|snow\w*|sunny|temperatures?|wind\w*|storm\w*|pack\w*|wear\w*|schedule\w*|calendar"
+    r"|meetings?|appointments?|events?|busy|plans?)\b", re.IGNORECASE)
+# filters stated in the query: numbers other than dates and ordinals, difficulty, length and duration words
+SPECIFIC_QUERY = re.compile(
+    r"(?<![-\d:/])\d+(?![-\d:/]|st\b|nd\b|rd\b|th\b)"
+    r"|\b(easy|moderate|medium|hard|difficult|challenging|long|short|steep|flat|km|kilometers?|miles?|hours?|minutes?"
+    r"|altitude|ascent|elevation|kids|children)\b", re.IGNORECASE)
+# places: "in the Dolomites", "near Bolzano"
+PLACE = re.compile(r"\b(in|near|around|at|to)( the)? [A-Z]")
+# activities of the sidebar as they appear in queries
+ACTIVITY_WORDS = {
+    "Hiking": re.compile(r"\b(hik\w*|walk\w*|trek\w*)\b", re.IGNORECASE),
+    "Cycling": re.compile(r"\b(bik\w*|cycl\w*|mtb)\b", re.IGNORECASE),
+    "Running": re.compile(r"\b(run\w*|jog\w*)\b", re.IGNORECASE),
+    "Climbing": re.compile(r"\b(climb\w*|ferrata)\b", re.IGNORECASE),
+}
+
+
+def isGenericRecommendation(query: str, preferences: dict | None = None) -> bool:
+  """Whether `query` asks for recommendations without constraints beyond the user's profile and dates. Naming an
+  activity is fine as long as it is one of the preferred activities. Queries that also ask about the weather or the
+  calendar are not, they need the agents selected by routing."""
+  if not GENERIC_QUERY.search(query) or OTHER_INTENT.search(query) or SPECIFIC_QUERY.search(query) or PLACE.search(query):
+    return False
+  preferred = set((preferences or {}).get("preferredActivities") or [])
+  return not any(pattern.search(query) for activity, pattern in ACTIVITY_WORDS.items() if activity not in preferred)
+
+
+def profileKey(preferences: dict) -> str:
+  """Fingerprint of the profile a list was computed from."""
+  return hashlib.sha1(json.dumps(preferences, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def profileScore(route: Route, preferences: dict) -> float:
+  """Fit of a route to a profile, 0 at best. Penalizes difficulty steps and relative deviation from the preferred
+  distance and duration, rewards routes in the home region."""
+  score = 0.0
+  difficulty = preferenceFilters(preferences).get("difficulty")
+  if difficulty is not None and route.difficulty is not None:
+    score -= 20 * abs(int(route.difficulty) - difficulty)
+  if preferences.get("distanceKm") and route.length_m:
+    km = preferences["distanceKm"]
+    score -= min(30.0, 10 * abs(route.length_m / 1000 - km) / km)
+  if preferences.get("durationHours") and route.duration_min:
+    hours = preferences["durationHours"]
+    score -= min(30.0, 10 * abs(route.duration_min / 60 - hours) / hours)
+  location = str(preferences.get("location") or "").lower()
+  if location and any(location in str(region or "").lower() for region in (route.region, route.primary_region)):
+    score += 15
+  return score
+
+
+def rankRoutes(candidates: list[Route], preferences: dict, k: int = RECOMMENDATION_K) -> list[Route]:
+  return sorted(candidates, key=lambda route: profileScore(route, preferences), reverse=True)[:k]
+
+
+def parseRoutes(table: str) -> list[Route]:
+  """Inverse of `serializeRoutes`, numeric columns are converted back to int."""
+  rows = list(csv.reader(io.StringIO(table), delimiter="|"))
+  if len(rows) < 2:
+    return []
+  columns = rows[0]
+  routes = list()
+  for row in rows[1:]:
+    values = dict()
+    for column, value in zip(columns, row):
+      if value == "":
+        value = None
+      elif column not in ("title", "category", "region", "primary_region"):
+        value = int(float(value))
+      values[column] = value
+    routes.append(Route(**values))
+  return routes
+
+
+def activitiesOutput(routes: list[Route], maxHours: float | None = None) -> str:
+  """Routes in the `return_activities` format of the database agent. With `maxHours`, routes longer than the
+  user's free time are dropped, unless none would be left."""
+  if maxHours is not None:
+    fitting = [route for route in routes if route.duration_min is None or route.duration_min <= maxHours * 60]
+    routes = fitting or routes
+  return json.dumps({"action": "return_activities", "data": [
+      {"title": route.title, "location": route.region, "length": str(route.length_m), "difficulty": str(route.difficulty)}
+      for route in routes]}, ensure_ascii=False)
+
+
+class RecommendationStore:
+  """Ranked route lists per user in a SQLite table, one '|' table per user."""
+
+  def __init__(self, path: str = RECOMMENDATIONS_DB, maxAge: float = MAX_AGE):
+    self.maxAge = maxAge
+    self._lock = threading.Lock()
+    self._conn = sqlite3.connect(path, check_same_thread=False)
+    with self._conn:
+      self._conn.execute(
+          "create table if not exists user_recommendations (user text primary key, profile text not null, computed real not null, routes text not null)")
+
+  def put(self, user: str, preferences: dict, routes: list[Route]):
+    with self._lock, self._conn:
+      self._conn.execute(
+          "insert into user_recommendations values (?, ?, ?, ?) on conflict(user) do update set "
+          "profile = excluded.profile, computed = excluded.computed, routes = excluded.routes",
+          (user, profileKey(preferences), time.time(), serializeRoutes(routes, STORED_COLUMNS) if routes else ""))
+
+  def get(self, user: str, preferences: dict) -> list[Route] | None:
+    """The list of `user`, or None if there is none, it is outdated or was computed for another profile."""
+    with self._lock:
+      row = self._conn.execute(
+          "select profile, computed, routes from user_recommendations where user = ?", (user,)).fetchone()
+    if row is None or row[0] != profileKey(preferences) or row[1] < time.time() - self.maxAge:
+      return None
+    return parseRoutes(row[2]) or None
+
+
+def precompute(store: RecommendationStore, users: list[str] | None = None, k: int = RECOMMENDATION_K) -> int:
+  """Compute and store the top-k list of every user (all users of the user store by default). Profiles with the
+  same filters share one candidate fetch. Returns the number of lists written."""
+  userStore = getUserStore()
+  candidates = dict()
+  written = 0
+  for user in users if users is not None else userStore.users():
+    preferences = userStore.get(user)
+    if not preferences:
+      continue
+    # difficulty is scored rather than filtered, so neighbouring levels remain candidates
+    filters = {field: value for field, value in preferenceFilters(preferences).items() if field != "difficulty"}
+    key = tuple(sorted(filters.items()))
+    if key not in candidates:
+      candidates[key] = fetchRoutes(columns=ROUTE_COLUMNS, limit=CANDIDATES, **filters)
+    store.put(user, preferences, rankRoutes(candidates[key], preferences, k))
+    written += 1
+  return written
+
+
+_recommendationStore = None
+
+
+def setRecommendationStore(store):
+  global _recommendationStore
+  _recommendationStore = store
+
+
+def getRecommendationStore() -> RecommendationStore | None:
+  """Process-wide store at RECOMMENDATIONS_DB, None until the precompute job has created it."""
+  global _recommendationStore
+  if _recommendationStore is None:
+    path = os.environ.get("RECOMMENDATIONS_DB", RECOMMENDATIONS_DB)
+    if os.path.exists(path):
+      _recommendationStore = RecommendationStore(path)
+  return _recommendationStore
+
+
+if __name__ == "__main__":
+  import argparse
+  from dotenv import load_dotenv
+
+  parser = argparse.ArgumentParser(description="Precompute the recommendation list of every user")
+  parser.add_argument("--k", type=int, default=RECOMMENDATION_K, help="Routes per user")
+  parser.add_argument("--users", nargs="*", help="Users to compute, all users of the user store by default")
+  args = parser.parse_args()
+
+  load_dotenv()
+  start = time.monotonic()
+  count = precompute(RecommendationStore(os.environ.get("RECOMMENDATIONS_DB", RECOMMENDATIONS_DB)), args.users, args.k)
+  print(f"Computed {count} recommendation lists in {time.monotonic() - start:.1f}s")
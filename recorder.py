@@ -0,0 +1,261 @@
+"""Record/replay of external calls for latency regression testing.
+
+RECORD_MODE=record captures every Gemini call and every tool call (Supabase, wttr.in, Google Calendar) made while
+serving queries, together with the queries themselves and all latencies, as JSON lines in RECORD_FILE.
+RECORD_MODE=replay serves those responses again with their original latencies (scaled by RECORD_LATENCY_SCALE)
+without touching the network.
+
+  python recorder.py replay recordings.jsonl --output replayed.jsonl [--scale 1.0]
+  python recorder.py compare recordings.jsonl replayed.jsonl
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from functools import wraps
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import messages_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+
+from token_usage import estimateTokens, percentile
+
+OFF, RECORD, REPLAY = "off", "record", "replay"
+
+
+class ReplayMiss(LookupError):
+  """Raised in replay mode when a call has no recorded counterpart."""
+
+
+def requestKey(kind: str, name: str, request) -> str:
+  payload = json.dumps(request, sort_keys=True, default=str)
+  return hashlib.sha256(f"{kind}|{name}|{payload}".encode()).hexdigest()[:24]
+
+
+class Recorder:
+  """Writes call entries to a JSONL file in record mode and serves them back in replay mode.
+
+  Args:
+    mode (str): OFF, RECORD or REPLAY.
+    path (str): Recording file, read in replay mode and appended to in record mode.
+    output (str | None): In replay mode, entries with the observed latencies are written here for `compare`.
+    latencyScale (float): Factor applied to recorded latencies in replay mode, 0 replays as fast as possible.
+  """
+
+  def __init__(self, mode: str = OFF, path: str = "recordings.jsonl", output: str | None = None, latencyScale: float = 1.0):
+    self._lock = threading.Lock()
+    self.configure(mode, path, output, latencyScale)
+
+  def configure(self, mode: str, path: str, output: str | None = None, latencyScale: float = 1.0):
+    """Switch mode and files, e.g. to replay in-process after the module-level RECORDER was created."""
+    self.mode = mode
+    self.path = path
+    self.output = output
+    self.latencyScale = latencyScale
+    self._byKey: dict[str, deque] = defaultdict(deque)
+    self._byName: dict[tuple, deque] = defaultdict(deque)
+    if mode == REPLAY:
+      self._load()
+
+  @classmethod
+  def fromEnv(cls) -> "Recorder":
+    return cls(
+        mode=os.environ.get("RECORD_MODE", OFF),
+        path=os.environ.get("RECORD_FILE", "recordings.jsonl"),
+        output=os.environ.get("RECORD_OUTPUT"),
+        latencyScale=float(os.environ.get("RECORD_LATENCY_SCALE", "1.0")),
+    )
+
+  @property
+  def enabled(self) -> bool:
+    return self.mode in (RECORD, REPLAY)
+
+  def _load(self):
+    with open(self.path) as f:
+      for line in f:
+        if line.strip():
+          entry = json.loads(line)
+          if entry["kind"] != "query":
+            self._byKey[entry["key"]].append(entry)
+            self._byName[(entry["kind"], entry["name"])].append(entry)
+
+  def queries(self) -> list[str]:
+    """User queries in the recording, in their original order."""
+    with open(self.path) as f:
+      entries = [json.loads(line) for line in f if line.strip()]
+    return [e["request"] for e in sorted(entries, key=lambda e: e["timestamp"]) if e["kind"] == "query"]
+
+  def _write(self, path: str, entry: dict):
+    with self._lock, open(path, "a") as f:
+      f.write(json.dumps(entry, default=str) + "\n")
+
+  def log(self, kind: str, name: str, request, response, latency: float):
+    """Store an entry: in record mode to the recording, in replay mode to the output file."""
+    path = self.path if self.mode == RECORD else self.output
+    if not path:
+      return
+    self._write(path, {
+        "kind": kind,
+        "name": name,
+        "key": requestKey(kind, name, request),
+        "request": request,
+        "response": response,
+        "latency": latency,
+        "timestamp": time.time(),
+    })
+
+  def lookup(self, kind: str, name: str, request) -> dict:
+    """Next recorded entry for this exact request. Falls back to the next entry of the same kind and name,
+    since prompts contain the current date and rarely match byte for byte across days."""
+    key = requestKey(kind, name, request)
+    with self._lock:
+      for queue in (self._byKey.get(key), self._byName.get((kind, name))):
+        while queue:
+          entry = queue.popleft()
+          if not entry.get("served"):
+            entry["served"] = True
+            return entry
+    raise ReplayMiss(f"No recorded {kind} call for {name}")
+
+  def call(self, kind: str, name: str, request, func):
+    """Run `func` according to the mode: pass through, record it, or serve the recorded response."""
+    if self.mode == REPLAY:
+      start = time.monotonic()
+      entry = self.lookup(kind, name, request)
+      time.sleep(entry["latency"] * self.latencyScale)
+      self.log(kind, name, request, entry["response"], time.monotonic() - start)
+      return entry["response"]
+
+    start = time.monotonic()
+    response = func()
+    if self.mode == RECORD:
+      self.log(kind, name, request, response, time.monotonic() - start)
+    return response
+
+  def recorded(self, service: str):
+    """Decorator for tool functions calling an external service. Arguments and result must be JSON serializable."""
+    def decorator(func):
+      @wraps(func)
+      def wrapper(*args, **kwargs):
+        if not self.enabled:
+          return func(*args, **kwargs)
+        request = {"args": list(args), "kwargs": kwargs}
+        return self.call("tool", service, request, lambda: func(*args, **kwargs))
+      return wrapper
+    return decorator
+
+
+RECORDER = Recorder.fromEnv()
+recorded = RECORDER.recorded
+
+
+class RecordingChatModel(BaseChatModel):
+  """Chat model wrapper that records or replays every upstream call of `inner` through a Recorder."""
+  inner: BaseChatModel
+  service: str
+  recorder: Recorder = Field(default_factory=lambda: RECORDER)
+
+  model_config = {"arbitrary_types_allowed": True}
+
+  @property
+  def _llm_type(self) -> str:
+    return f"recording-{self.inner._llm_type}"
+
+  def bind_tools(self, tools, **kwargs):
+    bound = self.inner.bind_tools(tools, **kwargs)
+    return self.bind(**getattr(bound, "kwargs", {}))
+
+  def get_num_tokens_from_messages(self, messages, tools=None) -> int:
+    if self.recorder.mode == REPLAY:
+      return sum(estimateTokens(str(m.content)) for m in messages)
+    return self.inner.get_num_tokens_from_messages(messages)
+
+  def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+    request = {"messages": messages_to_dict(messages), "stop": stop, "bound": sorted(kwargs)}
+
+    def call():
+      result = self.inner._generate(messages, stop=stop, **kwargs)
+      return messages_to_dict([g.message for g in result.generations])
+
+    response = self.recorder.call("llm", self.service, request, call)
+    return ChatResult(generations=[ChatGeneration(message=m) for m in messages_from_dict(response)])
+
+
+def summarize(path: str) -> dict:
+  """Call count, p50 and p95 latency per (kind, name) of a recording or replay output file."""
+  latencies = defaultdict(list)
+  if not os.path.exists(path):
+    # a replay that diverged on every query writes no output
+    return {}
+  with open(path) as f:
+    for line in f:
+      if line.strip():
+        entry = json.loads(line)
+        latencies[(entry["kind"], entry["name"])].append(entry["latency"])
+  return {key: {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95)}
+          for key, values in latencies.items()}
+
+
+def compare(baseline: str, candidate: str):
+  """Print call counts and latency percentiles per stage of two files side by side."""
+  before, after = summarize(baseline), summarize(candidate)
+  print(f"{'Stage':<36}{'Calls':>13}{'p50 (s)':>17}{'p95 (s)':>17}")
+  print("-" * 83)
+  for kind, name in sorted(set(before) | set(after)):
+    b = before.get((kind, name), {"count": 0, "p50": 0, "p95": 0})
+    a = after.get((kind, name), {"count": 0, "p50": 0, "p95": 0})
+    print(f"{kind + ':' + name:<36}{b['count']:>6} → {a['count']:<5}"
+          f"{b['p50']:>8.3f} → {a['p50']:<6.3f}{b['p95']:>8.3f} → {a['p95']:<6.3f}")
+
+
+def replay(path: str, output: str, latencyScale: float = 1.0):
+  """Replay all recorded queries against a freshly built pipeline, serving external calls from the recording."""
+  # run as a script this module is `__main__`, the agents use the RECORDER of the imported `recorder` module
+  import recorder
+  recorder.RECORDER.configure(REPLAY, path, output, latencyScale)
+
+  import base_agent
+  from calendar_agent import CalendarAgent
+  from weather_agent import WeatherAgent
+  from database_agent import DatabaseAgent
+  from orchestrator import Orchestrator
+
+  apiKey = os.environ.get("GEMINI_API_KEY") or "replay"
+  agents = {
+      "calendar": CalendarAgent(apiKey=apiKey),
+      "weather": WeatherAgent(apiKey=apiKey),
+      "database": DatabaseAgent(apiKey=apiKey),
+  }
+  orchestrator = Orchestrator(apiKey=apiKey, agents=agents)
+  if base_agent.RECORDER.mode != REPLAY or not isinstance(agents["database"].llm.primary, recorder.RecordingChatModel):
+    raise RuntimeError("Agents are not in replay mode, replaying would call the live services")
+
+  for query in recorder.RECORDER.queries():
+    try:
+      orchestrator.run(query)
+    except recorder.ReplayMiss as e:
+      print(f"Replay diverged for '{query}': {e}")
+
+
+if __name__ == "__main__":
+  import argparse
+
+  parser = argparse.ArgumentParser(description="Replay recorded traffic and compare latency distributions")
+  subparsers = parser.add_subparsers(dest="command", required=True)
+  replayParser = subparsers.add_parser("replay", help="Replay the queries of a recording offline")
+  replayParser.add_argument("recording")
+  replayParser.add_argument("--output", default="replayed.jsonl", help="File for the observed calls and latencies")
+  replayParser.add_argument("--scale", type=float, default=1.0, help="Factor applied to recorded latencies")
+  compareParser = subparsers.add_parser("compare", help="Compare two recordings stage by stage")
+  compareParser.add_argument("baseline")
+  compareParser.add_argument("candidate")
+  args = parser.parse_args()
+
+  if args.command == "replay":
+    replay(args.recording, args.output, args.scale)
+    compare(args.recording, args.output)
+  else:
+    compare(args.baseline, args.candidate)
@@ -0,0 +1,158 @@
+"""Route geometries for the map view, stored as encoded polylines in several levels of detail.
+
+Every track is simplified (shapely, Douglas-Peucker) to the tolerance of each level in LEVELS and stored per level
+as a Google encoded polyline. The map asks for the coarsest level whose error stays below a screen pixel at its
+zoom, and only for the routes inside its viewport, so 50 routes cost kilobytes instead of their full tracks.
+
+Geometries are written by `python route_ingest.py tracks.gpx --geometries geometries.db`. Set ROUTE_GEOMETRY_DB to
+show the map in the chat (default `geometries.db`, if present).
+"""
+import math
+import os
+import sqlite3
+import threading
+
+from shapely.geometry import LineString
+
+# simplification tolerance per level in degrees: full track, ~5 m, ~20 m, ~100 m, ~500 m
+LEVELS = (0.0, 0.00005, 0.0002, 0.001, 0.005)
+METERS_PER_DEGREE = 111_320
+GEOMETRY_DB = "geometries.db"
+
+
+def encodePolyline(points: list[tuple[float, float]], precision: int = 5) -> str:
+  """Google encoded polyline of (lat, lon) points, the format Leaflet's PolylineFromEncoded draws."""
+  factor = 10 ** precision
+  encoded, previousLat, previousLon = list(), 0, 0
+  for lat, lon in points:
+    lat, lon = round(lat * factor), round(lon * factor)
+    for delta in (lat - previousLat, lon - previousLon):
+      value = ~(delta << 1) if delta < 0 else delta << 1
+      while value >= 0x20:
+        encoded.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+      encoded.append(chr(value + 63))
+    previousLat, previousLon = lat, lon
+  return "".join(encoded)
+
+
+def decodePolyline(encoded: str, precision: int = 5) -> list[tuple[float, float]]:
+  factor = 10 ** precision
+  points, coordinates, index = list(), [0, 0], 0
+  while index < len(encoded):
+    for axis in range(2):
+      shift = result = 0
+      while True:
+        byte = ord(encoded[index]) - 63
+        index += 1
+        result |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+          break
+      coordinates[axis] += ~(result >> 1) if result & 1 else result >> 1
+    points.append((coordinates[0] / factor, coordinates[1] / factor))
+  return points
+
+
+def simplifyLevels(coordinates: list[tuple]) -> list[str]:
+  """Encoded polyline of a (lon, lat[, ele]) track for every level of LEVELS, finest first."""
+  line = LineString([(point[0], point[1]) for point in coordinates])
+  levels = list()
+  for tolerance in LEVELS:
+    simplified = line.simplify(tolerance, preserve_topology=False) if tolerance else line
+    levels.append(encodePolyline([(lat, lon) for lon, lat in simplified.coords]))
+  return levels
+
+
+def levelForZoom(zoom: float, latitude: float = 46.0) -> int:
+  """Coarsest level whose tolerance is below the size of a pixel at web map `zoom`."""
+  metersPerPixel = 156_543.03 * math.cos(math.radians(latitude)) / 2 ** zoom
+  return max(level for level, tolerance in enumerate(LEVELS) if tolerance * METERS_PER_DEGREE <= metersPerPixel)
+
+
+def zoomForBounds(bounds: tuple[float, float, float, float], pixels: int = 600) -> int:
+  """Web map zoom at which (min_lon, min_lat, max_lon, max_lat) fits into `pixels`."""
+  extent = max(bounds[2] - bounds[0], bounds[3] - bounds[1], 1e-4)
+  return max(1, min(18, math.floor(math.log2(360 * pixels / 256 / extent))))
+
+
+class GeometryStore:
+  """Encoded polylines per route title and level, with the bounding box of each route for viewport queries."""
+
+  def __init__(self, path: str = GEOMETRY_DB):
+    self._lock = threading.Lock()
+    self._conn = sqlite3.connect(path, check_same_thread=False)
+    with self._conn:
+      self._conn.execute(
+          "create table if not exists route_geometries (title text not null, level integer not null, "
+          "min_lon real, min_lat real, max_lon real, max_lat real, polyline text not null, primary key (title, level))")
+
+  def putMany(self, tracks: dict[str, list[tuple]], commit: bool = True):
+    """Store all levels of every (lon, lat[, ele]) track, keyed by route title. Without `commit` the rows stay in
+    an open transaction until `commit()` or `rollback()`, e.g. until the routes they belong to are loaded."""
+    rows = list()
+    for title, coordinates in tracks.items():
+      if len(coordinates) < 2:
+        continue
+      lons, lats = [point[0] for point in coordinates], [point[1] for point in coordinates]
+      box = (min(lons), min(lats), max(lons), max(lats))
+      rows.extend((title, level, *box, polyline) for level, polyline in enumerate(simplifyLevels(coordinates)))
+    with self._lock:
+      self._conn.executemany("insert or replace into route_geometries values (?, ?, ?, ?, ?, ?, ?)", rows)
+      if commit:
+        self._conn.commit()
+
+  def commit(self):
+    with self._lock:
+      self._conn.commit()
+
+  def rollback(self):
+    with self._lock:
+      self._conn.rollback()
+
+  def get(self, titles: list[str], level: int, viewport: tuple | None = None) -> dict[str, str]:
+    """Polylines of `titles` at `level`, only of the routes intersecting `viewport` (min_lon, min_lat, max_lon, max_lat) if given."""
+    if not titles:
+      return {}
+    sql = f"select title, polyline from route_geometries where level = ? and title in ({', '.join('?' for _ in titles)})"
+    params = [level, *titles]
+    if viewport is not None:
+      sql += " and max_lon >= ? and min_lon <= ? and max_lat >= ? and min_lat <= ?"
+      params += [viewport[0], viewport[2], viewport[1], viewport[3]]
+    with self._lock:
+      return dict(self._conn.execute(sql, params).fetchall())
+
+  def bounds(self, titles: list[str]) -> tuple | None:
+    """Bounding box of all `titles`, None if none has a geometry."""
+    if not titles:
+      return None
+    with self._lock:
+      row = self._conn.execute(
+          f"select min(min_lon), min(min_lat), max(max_lon), max(max_lat) from route_geometries "
+          f"where level = 0 and title in ({', '.join('?' for _ in titles)})", titles).fetchone()
+    return row if row[0] is not None else None
+
+  def mentioned(self, text: str, limit: int = 50) -> list[str]:
+    """Titles of the routes with a geometry that `text` mentions, e.g. the ones an answer recommends."""
+    with self._lock:
+      rows = self._conn.execute(
+          "select title from route_geometries where level = 0 and instr(?, title) > 0 limit ?", (text, limit)).fetchall()
+    return [row[0] for row in rows]
+
+
+_geometryStore = None
+
+
+def setGeometryStore(store):
+  global _geometryStore
+  _geometryStore = store
+
+
+def getGeometryStore() -> GeometryStore | None:
+  """Process-wide store at ROUTE_GEOMETRY_DB, None while no geometries were loaded."""
+  global _geometryStore
+  if _geometryStore is None:
+    path = os.environ.get("ROUTE_GEOMETRY_DB", GEOMETRY_DB)
+    if os.path.exists(path):
+      _geometryStore = GeometryStore(path)
+  return _geometryStore
@@ -0,0 +1,319 @@
+"""Bulk load of route data into the `hiking_routes` table from CSV, GeoJSON or GPX files.
+
+Files are read as a stream of chunks, every route is validated and normalised (category from the list of
+`queryDatabase`, difficulty 0-3, experience 0-6, non-negative metrics), and the valid routes are written with
+Postgres COPY in a single transaction. The table's secondary indexes are dropped before the load and rebuilt
+once afterwards, so COPY does not maintain them row by row. This locks the table, reads wait for the load to
+commit; `--keep-indexes` appends without blocking reads. Rejected routes are written to a JSONL file with
+the reason. With `--geometries`, the tracks of GPX and GeoJSON routes are stored for the map view (route_geometry.py).
+
+  python route_ingest.py routes.csv tracks.gpx [--dsn postgresql://...] [--truncate] [--keep-indexes] [--dry-run] [--geometries geometries.db]
+
+The connection string defaults to DATABASE_URL (Supabase: Project Settings > Database > Connection string).
+"""
+import csv
+import io
+import json
+import math
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from typing import Iterable, Iterator
+
+from database_agent import Route, ROUTE_COLUMNS, ROUTE_CATEGORIES
+
+CHUNK_SIZE = 10_000
+INT_COLUMNS = ("difficulty", "duration_min", "length_m", "ascent_m", "descent_m", "min_altitude", "max_altitude", "experience")
+# valid range per column, other columns must not be negative
+BOUNDS = {"difficulty": (0, 3), "experience": (0, 6), "min_altitude": (-500, 9000), "max_altitude": (-500, 9000)}
+EARTH_RADIUS_M = 6_371_000
+
+_CATEGORIES = {re.sub(r"[\s_-]+", " ", category).lower(): category for category in ROUTE_CATEGORIES}
+
+
+def normalizeCategory(value) -> str:
+  """Category spelled as in ROUTE_CATEGORIES, ignoring case and separators ("hiking_trail" -> "Hiking trail")."""
+  category = _CATEGORIES.get(re.sub(r"[\s_-]+", " ", str(value or "")).strip().lower())
+  if category is None:
+    raise ValueError(f"unknown category {value!r}")
+  return category
+
+
+def normalizeRoute(raw: dict) -> Route:
+  """Validate a raw record and convert it into a Route. Raises ValueError naming the first invalid field."""
+  title = str(raw.get("title") or "").strip()
+  if not title:
+    raise ValueError("missing title")
+  values = {"title": title, "category": normalizeCategory(raw.get("category"))}
+  for column in INT_COLUMNS:
+    value = raw.get(column)
+    if value is None or value == "":
+      values[column] = None
+      continue
+    try:
+      number = float(value)
+    except (TypeError, ValueError):
+      raise ValueError(f"{column} is not a number: {value!r}")
+    if not math.isfinite(number):
+      raise ValueError(f"{column} is not a number: {value!r}")
+    low, high = BOUNDS.get(column, (0, math.inf))
+    if not low <= number <= high:
+      raise ValueError(f"{column} out of range: {value!r}")
+    values[column] = round(number)
+  if values["min_altitude"] is not None and values["max_altitude"] is not None and values["min_altitude"] > values["max_altitude"]:
+    raise ValueError("min_altitude above max_altitude")
+  for column in ("region", "primary_region"):
+    values[column] = str(raw.get(column) or "").strip() or None
+  return Route(**values)
+
+
+def parseTrack(coordinates: list) -> list[tuple]:
+  """(lon, lat, ele) floats of the raw points of a track, ele None if unknown. Raises ValueError for invalid points."""
+  points = list()
+  for point in coordinates:
+    try:
+      lon, lat = float(point[0]), float(point[1])
+      ele = float(point[2]) if len(point) > 2 and point[2] not in (None, "") else None
+    except (TypeError, ValueError, IndexError):
+      raise ValueError(f"invalid track point {point!r}")
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90) or (ele is not None and not math.isfinite(ele)):
+      raise ValueError(f"invalid track point {point!r}")
+    points.append((lon, lat, ele))
+  return points
+
+
+def trackMetrics(points: list[tuple]) -> dict:
+  """Length, ascent, descent and altitude range of a track of (lon, lat[, ele]) points."""
+  length = ascent = descent = 0.0
+  for (lon1, lat1, *_), (lon2, lat2, *_) in zip(points, points[1:]):
+    # haversine distance
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    length += 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+  metrics = {"length_m": round(length)}
+  elevations = [point[2] for point in points if len(point) > 2 and point[2] is not None]
+  if elevations:
+    for previous, current in zip(elevations, elevations[1:]):
+      ascent += max(0.0, current - previous)
+      descent += max(0.0, previous - current)
+    metrics.update(ascent_m=round(ascent), descent_m=round(descent),
+                   min_altitude=round(min(elevations)), max_altitude=round(max(elevations)))
+  return metrics
+
+
+def readCsv(path: str) -> Iterator[dict]:
+  with open(path, newline="", encoding="utf-8") as f:
+    yield from csv.DictReader(f)
+
+
+def _geojsonRecord(feature: dict) -> dict:
+  record = dict(feature.get("properties") or {})
+  geometry = feature.get("geometry") or {}
+  lines = {"LineString": [geometry.get("coordinates")], "MultiLineString": geometry.get("coordinates")}.get(geometry.get("type"))
+  if lines:
+    # raw points, parsed and measured per record in validChunks
+    record["coordinates"] = [point for line in lines for point in line or []]
+  return record
+
+
+def readGeojson(path: str) -> Iterator[dict]:
+  """Features of a GeoJSON FeatureCollection, or of newline-delimited GeoJSON (one feature per line), which is
+  read line by line instead of at once."""
+  with open(path, encoding="utf-8") as f:
+    first = f.readline()
+    try:
+      feature = json.loads(first)
+    except json.JSONDecodeError:
+      feature = None
+    if feature is not None and feature.get("type") == "Feature":
+      yield _geojsonRecord(feature)
+      for line in f:
+        if line.strip():
+          yield _geojsonRecord(json.loads(line))
+      return
+    collection = json.loads(first + f.read())
+  for feature in collection.get("features", []):
+    yield _geojsonRecord(feature)
+
+
+def _gpxPoint(element) -> tuple:
+  ele = next((child.text for child in element if child.tag.rsplit("}", 1)[-1] == "ele"), None)
+  try:
+    return float(element.get("lon")), float(element.get("lat")), float(ele) if ele else None
+  except (TypeError, ValueError):
+    # kept as is, parseTrack rejects the record
+    return element.get("lon"), element.get("lat"), ele
+
+
+def readGpx(path: str) -> Iterator[dict]:
+  """One record per track or route of a GPX file, parsed incrementally. `name` and `type` become title and category.
+  Points are validated and measured per record in validChunks."""
+  points, parents = list(), list()
+  for event, element in ET.iterparse(path, events=("start", "end")):
+    if event == "start":
+      parents.append(element)
+      continue
+    parents.pop()
+    tag = element.tag.rsplit("}", 1)[-1]
+    if tag in ("trkpt", "rtept"):
+      points.append(_gpxPoint(element))
+    elif tag in ("trk", "rte"):
+      fields = {child.tag.rsplit("}", 1)[-1]: (child.text or "").strip() for child in element}
+      yield {"title": fields.get("name"), "category": fields.get("type"), "coordinates": points}
+      points = list()
+    else:
+      continue
+    # detach processed elements, so the tree does not grow with the file
+    if parents:
+      parents[-1].remove(element)
+
+
+READERS = {".csv": readCsv, ".geojson": readGeojson, ".json": readGeojson, ".geojsonl": readGeojson, ".gpx": readGpx}
+
+
+def readRecords(path: str) -> Iterator[dict]:
+  extension = os.path.splitext(path)[1].lower()
+  if extension not in READERS:
+    raise ValueError(f"Unsupported file type {extension!r}, expected one of {sorted(READERS)}")
+  return READERS[extension](path)
+
+
+def readFiles(paths: list[str]) -> Iterator[tuple[str, int, dict]]:
+  """Records of all files as (file, record number within the file, record)."""
+  for path in paths:
+    for number, raw in enumerate(readRecords(path), start=1):
+      yield path, number, raw
+
+
+def validChunks(records: Iterable[tuple[str, int, dict]], rejects: list, defaults: dict | None = None,
+                chunkSize: int = CHUNK_SIZE, geometries=None) -> Iterator[list[Route]]:
+  """Normalised routes in chunks of `chunkSize` from the records of `readFiles`. Invalid records, bad track points
+  included, are appended to `rejects` with their file, number and the reason. `defaults` fill fields a record
+  leaves empty, e.g. the category of a GPX export. The tracks of valid routes are written to `geometries`
+  (a GeometryStore) chunk by chunk, uncommitted: the caller commits them once the routes are loaded."""
+  chunk, tracks = list(), dict()
+  for source, number, raw in records:
+    raw = {**(defaults or {}), **{key: value for key, value in raw.items() if value not in (None, "")}}
+    coordinates = raw.pop("coordinates", None)
+    try:
+      points = parseTrack(coordinates) if coordinates else None
+      # metrics stated in the record take precedence over the ones measured on the track
+      route = normalizeRoute({**trackMetrics(points), **raw} if points else raw)
+    except ValueError as e:
+      rejects.append({"source": source, "record": number, "error": str(e), "data": raw})
+      continue
+    chunk.append(route)
+    if points:
+      tracks[route.title] = points
+    if len(chunk) >= chunkSize:
+      if geometries is not None:
+        geometries.putMany(tracks, commit=False)
+      yield chunk
+      chunk, tracks = list(), dict()
+  if chunk:
+    if geometries is not None:
+      geometries.putMany(tracks, commit=False)
+    yield chunk
+
+
+def copyBuffer(routes: list[Route]) -> io.StringIO:
+  """Routes as CSV for COPY, empty fields are NULL."""
+  buffer = io.StringIO()
+  writer = csv.writer(buffer, lineterminator="\n")
+  writer.writerows(["" if value is None else value for value in route] for route in routes)
+  buffer.seek(0)
+  return buffer
+
+
+def secondaryIndexes(cursor, table: str) -> list[tuple[str, str]]:
+  """Name and definition of the indexes of `table` that back no constraint, i.e. the ones safe to drop and recreate."""
+  cursor.execute(
+      "select i.relname, pg_get_indexdef(i.oid) from pg_index x "
+      "join pg_class i on i.oid = x.indexrelid "
+      "where x.indrelid = %s::regclass "
+      "and not exists (select 1 from pg_constraint c where c.conindid = x.indexrelid)", (table,))
+  return cursor.fetchall()
+
+
+def load(chunks: Iterable[list[Route]], dsn: str, table: str = "hiking_routes", truncate: bool = False,
+         keepIndexes: bool = False) -> int:
+  """COPY all chunks into `table` in one transaction, dropping its secondary indexes for the duration of the load.
+  Dropping indexes and truncating lock the table exclusively: reads of `table`, and so `queryDatabase`, block until
+  the commit. With `keepIndexes` and without `truncate`, COPY maintains the indexes row by row instead and readers
+  keep seeing the previous content until the commit. Returns the number of rows loaded."""
+  import psycopg2
+
+  connection = psycopg2.connect(dsn)
+  loaded = 0
+  try:
+    with connection, connection.cursor() as cursor:
+      indexes = list() if keepIndexes else secondaryIndexes(cursor, table)
+      for name, _ in indexes:
+        cursor.execute(f'drop index "{name}"')
+      if truncate:
+        cursor.execute(f"truncate {table}")
+      for chunk in chunks:
+        cursor.copy_expert(f"copy {table} ({', '.join(ROUTE_COLUMNS)}) from stdin with (format csv)", copyBuffer(chunk))
+        loaded += len(chunk)
+      for _, definition in indexes:
+        cursor.execute(definition)
+      cursor.execute(f"analyze {table}")
+  finally:
+    connection.close()
+  return loaded
+
+
+if __name__ == "__main__":
+  import argparse
+  from dotenv import load_dotenv
+
+  parser = argparse.ArgumentParser(description="Load routes from CSV, GeoJSON or GPX files into hiking_routes")
+  parser.add_argument("files", nargs="+")
+  parser.add_argument("--dsn", help="Postgres connection string, DATABASE_URL by default")
+  parser.add_argument("--table", default="hiking_routes")
+  parser.add_argument("--truncate", action="store_true", help="Replace the table's content instead of appending")
+  parser.add_argument("--keep-indexes", action="store_true",
+                      help="Do not drop the secondary indexes, slower but reads of the table do not block while appending")
+  parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+  parser.add_argument("--category", help="Category of records without one, e.g. for GPX tracks")
+  parser.add_argument("--region", help="Region of records without one")
+  parser.add_argument("--rejects", default="rejects.jsonl", help="JSONL file for the rejected records")
+  parser.add_argument("--dry-run", action="store_true", help="Only validate, do not connect to the database")
+  parser.add_argument("--geometries", help="SQLite file to store the route tracks in for the map view, e.g. geometries.db")
+  args = parser.parse_args()
+
+  load_dotenv()
+  defaults = {key: value for key, value in {"category": args.category, "region": args.region}.items() if value}
+  rejects = list()
+  records = readFiles(args.files)
+  geometries = None
+  if args.geometries and not args.dry_run:
+    from route_geometry import GeometryStore
+    geometries = GeometryStore(args.geometries)
+  chunks = validChunks(records, rejects, defaults, args.chunk_size, geometries)
+
+  start = time.monotonic()
+  if args.dry_run:
+    loaded = sum(len(chunk) for chunk in chunks)
+  else:
+    dsn = args.dsn or os.environ.get("DATABASE_URL")
+    if not dsn:
+      parser.error("no connection string, set DATABASE_URL or pass --dsn")
+    try:
+      loaded = load(chunks, dsn, args.table, args.truncate, args.keep_indexes)
+    except BaseException:
+      # no map tracks for routes that were never inserted
+      if geometries is not None:
+        geometries.rollback()
+      raise
+    if geometries is not None:
+      geometries.commit()
+  seconds = time.monotonic() - start
+
+  if rejects:
+    with open(args.rejects, "w") as f:
+      for reject in rejects:
+        f.write(json.dumps(reject, ensure_ascii=False) + "\n")
+  print(f"{'Validated' if args.dry_run else 'Loaded'} {loaded} routes in {seconds:.1f}s ({loaded / max(seconds, 1e-9):.0f}/s), "
+        f"{len(rejects)} rejected" + (f", see {args.rejects}" if rejects else ""))
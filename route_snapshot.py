@@ -0,0 +1,200 @@
+"""Columnar snapshot of the route catalogue: `hiking_routes` as an Arrow IPC file, used as a local read replica.
+
+The file is memory-mapped, so opening it costs no parsing and all processes of a host share its pages through the
+page cache instead of each holding a copy. Set ROUTE_SNAPSHOT to the file to serve `queryDatabase` from it.
+
+Write a full snapshot, or apply the rows changed since the last sync (by `updated_at`) and drop deleted ones (by `id`):
+
+  python route_snapshot.py sync routes.arrow [--full]
+"""
+import os
+import random
+import tempfile
+import threading
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from database_agent import Route, URL, KEY, STRING_FIELDS, LTE_FIELDS, GTE_FIELDS, EQ_FIELDS
+from supabase import create_client
+
+# few distinct categories and regions: dictionary-encoded, filters match each distinct value once
+LABEL_TYPE = pa.dictionary(pa.int32(), pa.string())
+SNAPSHOT_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("title", pa.string()),
+    ("category", LABEL_TYPE),
+    ("difficulty", pa.int8()),
+    ("duration_min", pa.int32()),
+    ("length_m", pa.int32()),
+    ("ascent_m", pa.int32()),
+    ("descent_m", pa.int32()),
+    ("min_altitude", pa.int32()),
+    ("max_altitude", pa.int32()),
+    ("experience", pa.int8()),
+    ("region", LABEL_TYPE),
+    ("primary_region", LABEL_TYPE),
+    ("updated_at", pa.string()),
+])
+# rows per Supabase request of a sync
+SYNC_PAGE_SIZE = 1000
+
+
+def routesTable(rows: list[dict]) -> pa.Table:
+  """Rows of `hiking_routes` (dicts with `id`, the route columns and `updated_at`) as a snapshot table."""
+  return pa.Table.from_pylist([{field: row.get(field) for field in SNAPSHOT_SCHEMA.names} for row in rows], schema=SNAPSHOT_SCHEMA)
+
+
+def writeSnapshot(table: pa.Table, path: str):
+  """Write `table` to `path` atomically. Processes that mapped the previous file keep reading it until they reopen."""
+  directory = os.path.dirname(os.path.abspath(path))
+  fd, tmp = tempfile.mkstemp(dir=directory, prefix=".routes.", suffix=".tmp")
+  os.close(fd)
+  try:
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, SNAPSHOT_SCHEMA) as writer:
+      # the IPC file format allows one dictionary per column
+      writer.write_table(table.cast(SNAPSHOT_SCHEMA).unify_dictionaries())
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+  except BaseException:
+    os.unlink(tmp)
+    raise
+
+
+def readSnapshot(path: str) -> pa.Table:
+  """Memory-map the snapshot at `path`. Columns reference the mapped pages, nothing is copied."""
+  return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def fetchChanged(since: str | None, url: str | None = URL, key: str | None = KEY, table: str = "hiking_routes") -> list[dict]:
+  """All rows of `table` updated at or after `since` (all rows without), paged by `updated_at`. Rows at `since`
+  itself are included, since a row committed after the last sync can carry the same timestamp."""
+  client = create_client(url, key)
+  rows = list()
+  while True:
+    query = client.from_(table).select(", ".join(SNAPSHOT_SCHEMA.names))
+    if since is not None:
+      query = query.gte("updated_at", since)
+    page = query.order("updated_at").order("id").range(len(rows), len(rows) + SYNC_PAGE_SIZE - 1).execute().data
+    rows.extend(page)
+    if len(page) < SYNC_PAGE_SIZE:
+      return rows
+
+
+def fetchIds(url: str | None = URL, key: str | None = KEY, table: str = "hiking_routes") -> list[int]:
+  """Ids of all rows of `table`, paged by id. A sync drops the snapshot rows whose id is missing."""
+  client = create_client(url, key)
+  ids = list()
+  while True:
+    query = client.from_(table).select("id")
+    if ids:
+      query = query.gt("id", ids[-1])
+    page = query.order("id").limit(SYNC_PAGE_SIZE).execute().data
+    ids.extend(row["id"] for row in page)
+    if len(page) < SYNC_PAGE_SIZE:
+      return ids
+
+
+def syncSnapshot(path: str, full: bool = False, fetch=fetchChanged, fetchIds=fetchIds) -> int:
+  """Bring the snapshot at `path` up to date: rows changed since its newest `updated_at` replace their previous
+  version, and rows deleted from the table (e.g. by `route_ingest.py --truncate`) are dropped, found by comparing
+  the ids. A missing snapshot (or `full`) is written from scratch. Returns the number of changed and deleted rows."""
+  current = None if full or not os.path.exists(path) else readSnapshot(path)
+  since = pc.max(current["updated_at"]).as_py() if current is not None and current.num_rows else None
+  changed = routesTable(fetch(since))
+  if current is None:
+    writeSnapshot(changed, path)
+    return changed.num_rows
+  if since is not None:
+    # the fetch repeats the rows at the watermark, those already in the snapshot are not a change
+    atWatermark = current.filter(pc.equal(current["updated_at"], since))["id"]
+    changed = changed.filter(pc.invert(pc.and_(pc.equal(changed["updated_at"], since),
+                                               pc.is_in(changed["id"], value_set=atWatermark))))
+  # fetched after the changes, so a row deleted in between is dropped as well
+  ids = pa.array(fetchIds(), type=pa.int64())
+  existing = current.filter(pc.is_in(current["id"], value_set=ids))
+  deleted = current.num_rows - existing.num_rows
+  changed = changed.filter(pc.is_in(changed["id"], value_set=ids))
+  if not changed.num_rows and not deleted:
+    return 0
+  kept = existing.filter(pc.invert(pc.is_in(existing["id"], value_set=changed["id"])))
+  writeSnapshot(pa.concat_tables([kept, changed]), path)
+  return changed.num_rows + deleted
+
+
+def containsIgnoreCase(column: pa.ChunkedArray, value: str) -> pa.ChunkedArray:
+  """ILIKE '%value%' on a dictionary-encoded column."""
+  return pa.chunked_array(
+      [pc.take(pc.match_substring(chunk.dictionary, value, ignore_case=True), chunk.indices) for chunk in column.chunks],
+      type=pa.bool_())
+
+
+class ArrowRouteSource:
+  """Routes from a memory-mapped snapshot with the filter semantics of SupabaseRouteSource. The file is mapped
+  again when a sync replaced it. Matches are returned in file order, or a random sample of them with `shuffle`,
+  like the `random_hiking_routes` view."""
+
+  def __init__(self, path: str, shuffle: bool = False):
+    self.path = path
+    self.shuffle = shuffle
+    self._lock = threading.Lock()
+    self._mtime = None
+    self._table = None
+
+  @property
+  def table(self) -> pa.Table:
+    mtime = os.stat(self.path).st_mtime_ns
+    with self._lock:
+      if mtime != self._mtime:
+        self._table, self._mtime = readSnapshot(self.path), mtime
+      return self._table
+
+  def fetch(self, columns: tuple, limit: int, filters: dict) -> list[Route]:
+    table = self.table
+    mask = None
+    for field, value in filters.items():
+      if value is None:
+        continue
+
+      if field in STRING_FIELDS and isinstance(value, str):
+        condition = containsIgnoreCase(table[field], value)
+      elif field in LTE_FIELDS and isinstance(value, int):
+        condition = pc.less_equal(table[field], value)
+      elif field in GTE_FIELDS and isinstance(value, int):
+        condition = pc.greater_equal(table[field], value)
+      elif field in EQ_FIELDS:
+        condition = pc.equal(table[field], value)
+      else:
+        continue
+      mask = condition if mask is None else pc.and_kleene(mask, condition)
+
+    if mask is None:
+      indices = np.arange(table.num_rows)
+    else:
+      indices = pc.indices_nonzero(pc.fill_null(mask, False)).to_numpy()
+    if self.shuffle:
+      indices = indices[random.sample(range(len(indices)), min(limit, len(indices)))]
+    else:
+      indices = indices[:limit]
+    # only the selected rows of the projected columns are materialized
+    rows = table.select(list(columns)).take(pa.array(indices, type=pa.int64())).to_pylist()
+    return [Route(**row) for row in rows]
+
+
+if __name__ == "__main__":
+  import argparse
+  import time
+  from dotenv import load_dotenv
+
+  parser = argparse.ArgumentParser(description="Route catalogue snapshot")
+  subparsers = parser.add_subparsers(dest="command", required=True)
+  syncParser = subparsers.add_parser("sync", help="Write or update the snapshot from Supabase")
+  syncParser.add_argument("path")
+  syncParser.add_argument("--full", action="store_true", help="Rewrite the snapshot instead of applying changes")
+  args = parser.parse_args()
+
+  load_dotenv()
+  start = time.monotonic()
+  changed = syncSnapshot(args.path, full=args.full)
+  print(f"Synced {changed} changed or deleted routes to {args.path} in {time.monotonic() - start:.1f}s")
@@ -0,0 +1,284 @@
+"""Headless HTTP/JSON API around the Orchestrator.
+
+  POST /sessions                          {"user": "dennis"}  -> {"sessionId": "..."}
+  GET  /sessions/<id>                                         -> {"user": ..., "history": [...]}
+  POST /sessions/<id>/messages            {"query": "..."}    -> {"response": "...", "seconds": ...}
+  POST /sessions/<id>/messages?stream=1   {"query": "..."}    -> text/event-stream of `status` events, then `message`
+  GET  /health
+
+Server processes keep no session state: chat history and agent memories are loaded from the session store
+(SESSION_STORE, see session_store.py) for every message and written back afterwards, so any process behind a
+load balancer can answer the next message of a session. Queries run in the bounded JOBS worker pool
+(ORCHESTRATOR_WORKERS). Closing an event stream cancels its query.
+
+  python server.py [--host 127.0.0.1] [--port 8000]
+"""
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import urlparse, parse_qs
+
+from langchain_core.messages import messages_to_dict, messages_from_dict
+
+from base_agent import LITE_MODEL
+from jobs import JOBS, Job, JobPool
+from orchestrator import Orchestrator
+from session_store import getSessionStore
+from user_store import validUser
+
+# seconds between checks for status changes of a streamed query, and between keep-alive comments
+STREAM_POLL_INTERVAL = 0.2
+KEEPALIVE_INTERVAL = 5.0
+
+
+def buildOrchestrator(apiKey: str | None = None, user: str | None = None) -> Orchestrator:
+  """Production pipeline: Gemini sub-agents on the lite model and speculative agent execution."""
+  from calendar_agent import CalendarAgent
+  from weather_agent import WeatherAgent
+  from database_agent import DatabaseAgent
+
+  apiKey = apiKey or os.environ.get("GEMINI_API_KEY")
+  # sub-agents only extract tool arguments, the smaller model is sufficient
+  agents = {
+      "calendar": CalendarAgent(apiKey=apiKey, model=LITE_MODEL),
+      "weather": WeatherAgent(apiKey=apiKey, model=LITE_MODEL),
+      "database": DatabaseAgent(apiKey=apiKey, model=LITE_MODEL),
+  }
+  return Orchestrator(apiKey=apiKey, agents=agents, user=user, speculative=True)
+
+
+class OrchestratorPool:
+  """Orchestrators built by this process, reused across sessions. Each message replaces the orchestrator's
+  conversation state with the session's, so building agents is paid once per worker instead of per request."""
+
+  def __init__(self, factory: Callable[[], Orchestrator] = buildOrchestrator):
+    self.factory = factory
+    self._idle = queue.SimpleQueue()
+
+  @contextmanager
+  def acquire(self):
+    try:
+      orchestrator = self._idle.get_nowait()
+    except queue.Empty:
+      orchestrator = self.factory()
+    try:
+      yield orchestrator
+    finally:
+      self._idle.put(orchestrator)
+
+
+def loadState(orchestrator: Orchestrator, state: dict):
+  """Put a session's user, agent memories and recommendation counter into `orchestrator`. A session without a
+  user is answered with its `preferences`, if any. Usage and stats of the previous session are reset, so a pooled
+  orchestrator does not accumulate them over the server's lifetime."""
+  for name, agent in orchestrator.agents.items():
+    memory = state.get("memories", {}).get(name, {"messages": [], "summary": ""})
+    # waits for a discarded speculative run of the previous session to roll back first
+    with agent.runLock:
+      agent.restoreMemory((messages_from_dict(memory["messages"]), memory["summary"]))
+  orchestrator.startSession()
+  orchestrator.user = state.get("user")
+  orchestrator.context.userPreferences = state.get("preferences", {})
+  orchestrator.turnsSinceRecommendation = state.get("turnsSinceRecommendation", 0)
+
+
+def saveState(orchestrator: Orchestrator, state: dict):
+  memories = dict()
+  for name, agent in orchestrator.agents.items():
+    with agent.runLock:
+      messages, summary = agent.memorySnapshot()
+    memories[name] = {"messages": messages_to_dict(messages), "summary": summary}
+  state["memories"] = memories
+  state["turnsSinceRecommendation"] = orchestrator.turnsSinceRecommendation
+
+
+class AdvisorService:
+  """Sessions and queries of the API, independent of HTTP.
+
+  Args:
+    pool (OrchestratorPool): Orchestrators that answer the queries.
+    store: Session store, defaults to the one configured by SESSION_STORE.
+    jobs (JobPool): Worker pool the queries run in.
+  """
+
+  def __init__(self, pool: OrchestratorPool | None = None, store=None, jobs: JobPool = JOBS):
+    self.pool = pool or OrchestratorPool()
+    self.store = store or getSessionStore()
+    self.jobs = jobs
+    # latest queued query per session, the next query of the session starts after it
+    self._lastJobs: dict[str, Job] = dict()
+    self._lastJobsLock = threading.Lock()
+
+  def createSession(self, user: str | None = None) -> str:
+    """New session of `user`. Raises ValueError for user ids that are not valid (see user_store.USER_ID)."""
+    if user is not None:
+      validUser(user)
+    sessionId = uuid.uuid4().hex
+    self.store.put(sessionId, {"user": user, "history": [], "memories": {}})
+    return sessionId
+
+  def session(self, sessionId: str) -> dict | None:
+    state = self.store.get(sessionId)
+    if state is None:
+      return None
+    return {"sessionId": sessionId, "user": state.get("user"), "history": state.get("history", [])}
+
+  def submit(self, sessionId: str, query: str) -> Job:
+    """Queue a query of an existing session. Raises KeyError for unknown or expired sessions.
+
+    Queries of the same session run one after the other, each loads the state the one before it saved. This
+    holds within one process: concurrent messages of a session must reach the same server process.
+    """
+    if self.store.get(sessionId) is None:
+      raise KeyError(sessionId)
+
+    def run(job: Job) -> str:
+      # loaded when the query starts, a queued query sees the answer of the one before it
+      state = self.store.get(sessionId)
+      if state is None:
+        raise KeyError(sessionId)
+      with self.pool.acquire() as orchestrator:
+        loadState(orchestrator, state)
+        response = orchestrator.run(query, onStatus=job.update)
+        saveState(orchestrator, state)
+      state.setdefault("history", []).extend([
+          {"role": "user", "content": query},
+          {"role": "assistant", "content": response},
+      ])
+      self.store.put(sessionId, state)
+      return response
+
+    with self._lastJobsLock:
+      job = self.jobs.submit(run, after=self._lastJobs.get(sessionId))
+      self._lastJobs[sessionId] = job
+    job.future.add_done_callback(lambda _: self._forget(sessionId, job))
+    return job
+
+  def _forget(self, sessionId: str, job: Job):
+    with self._lastJobsLock:
+      if self._lastJobs.get(sessionId) is job:
+        del self._lastJobs[sessionId]
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+  MESSAGES = re.compile(r"^/sessions/(?P<id>[0-9a-f]+)/messages$")
+  SESSION = re.compile(r"^/sessions/(?P<id>[0-9a-f]+)$")
+
+  @property
+  def service(self) -> AdvisorService:
+    return self.server.service
+
+  def sendJson(self, status: int, body: dict):
+    payload = json.dumps(body).encode()
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(payload)))
+    self.end_headers()
+    self.wfile.write(payload)
+
+  def readJson(self) -> dict:
+    length = int(self.headers.get("Content-Length") or 0)
+    return json.loads(self.rfile.read(length) or b"{}")
+
+  def do_GET(self):
+    path = urlparse(self.path).path
+    if path == "/health":
+      return self.sendJson(200, {"status": "ok"})
+    match = self.SESSION.match(path)
+    session = self.service.session(match["id"]) if match else None
+    if session is None:
+      return self.sendJson(404, {"error": "Not found"})
+    self.sendJson(200, session)
+
+  def do_POST(self):
+    url = urlparse(self.path)
+    try:
+      body = self.readJson()
+    except json.JSONDecodeError:
+      return self.sendJson(400, {"error": "Invalid JSON"})
+
+    if url.path == "/sessions":
+      try:
+        sessionId = self.service.createSession(body.get("user"))
+      except ValueError as e:
+        return self.sendJson(400, {"error": str(e)})
+      return self.sendJson(201, {"sessionId": sessionId})
+
+    match = self.MESSAGES.match(url.path)
+    if match is None:
+      return self.sendJson(404, {"error": "Not found"})
+    if not isinstance(body.get("query"), str):
+      return self.sendJson(400, {"error": "Missing query"})
+    start = time.monotonic()
+    try:
+      job = self.service.submit(match["id"], body["query"])
+    except KeyError:
+      return self.sendJson(404, {"error": "Unknown session"})
+
+    if parse_qs(url.query).get("stream", ["0"])[0] not in ("0", "false"):
+      return self.streamJob(job, start)
+    try:
+      response = job.result()
+    except Exception as e:
+      return self.sendJson(500, {"error": str(e)})
+    self.sendJson(200, {"response": response, "seconds": time.monotonic() - start})
+
+  def sendEvent(self, event: str, data: dict):
+    self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+    self.wfile.flush()
+
+  def streamJob(self, job: Job, start: float):
+    """Server-sent events: a `status` event per pipeline stage, then `message` with the answer or `error`."""
+    self.send_response(200)
+    self.send_header("Content-Type", "text/event-stream")
+    self.send_header("Cache-Control", "no-cache")
+    self.end_headers()
+    status, lastWrite = None, time.monotonic()
+    try:
+      while not job.done():
+        if job.status != status:
+          status = job.status
+          self.sendEvent("status", {"status": status})
+          lastWrite = time.monotonic()
+        elif time.monotonic() - lastWrite >= KEEPALIVE_INTERVAL:
+          # also notices a client that went away
+          self.wfile.write(b": keep-alive\n\n")
+          self.wfile.flush()
+          lastWrite = time.monotonic()
+        time.sleep(STREAM_POLL_INTERVAL)
+
+      try:
+        self.sendEvent("message", {"response": job.result(), "seconds": time.monotonic() - start})
+      except Exception as e:
+        self.sendEvent("error", {"error": str(e)})
+    except (BrokenPipeError, ConnectionResetError):
+      job.cancel()
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, service: AdvisorService | None = None) -> ThreadingHTTPServer:
+  server = ThreadingHTTPServer((host, port), ApiHandler)
+  server.daemon_threads = True
+  server.service = service or AdvisorService()
+  return server
+
+
+if __name__ == "__main__":
+  import argparse
+  from dotenv import load_dotenv
+
+  parser = argparse.ArgumentParser(description="Adventure Advisor HTTP API")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8000)
+  args = parser.parse_args()
+
+  load_dotenv()
+  server = serve(args.host, args.port)
+  print(f"Serving on http://{args.host}:{args.port}")
+  server.serve_forever()
@@ -0,0 +1,91 @@
+"""Session state of the HTTP API: chat history and agent memories per session id, stored outside the worker
+process so any process behind a load balancer can serve the next message of a session.
+
+SESSION_STORE selects the backend:
+- memory (default): a dict in this process, for a single server process
+- sqlite:<path>: a SQLite file shared by all processes of a node, a local stand-in for Redis
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# sessions without a message for this long are dropped
+SESSION_TTL = 24 * 3600
+
+
+class MemorySessionStore:
+  """Sessions in a dict of this process."""
+
+  def __init__(self, ttl: float = SESSION_TTL):
+    self.ttl = ttl
+    self._sessions: dict[str, tuple[float, str]] = dict()
+    self._lock = threading.Lock()
+
+  def get(self, sessionId: str) -> dict | None:
+    with self._lock:
+      entry = self._sessions.get(sessionId)
+      if entry is None or entry[0] <= time.time():
+        self._sessions.pop(sessionId, None)
+        return None
+    # stored serialized, so callers never share mutable state with the store
+    return json.loads(entry[1])
+
+  def put(self, sessionId: str, state: dict):
+    with self._lock:
+      self._sessions[sessionId] = (time.time() + self.ttl, json.dumps(state))
+
+  def delete(self, sessionId: str):
+    with self._lock:
+      self._sessions.pop(sessionId, None)
+
+
+class SqliteSessionStore:
+  """Sessions in a SQLite file with expiry, usable by several processes at once like a Redis instance would be."""
+
+  def __init__(self, path: str = "sessions.db", ttl: float = SESSION_TTL):
+    self.ttl = ttl
+    self._lock = threading.Lock()
+    self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    with self._conn:
+      self._conn.execute("pragma journal_mode=wal")
+      self._conn.execute("create table if not exists sessions (id text primary key, state text not null, expires real not null)")
+
+  def get(self, sessionId: str) -> dict | None:
+    with self._lock:
+      row = self._conn.execute("select state from sessions where id = ? and expires > ?", (sessionId, time.time())).fetchone()
+    return json.loads(row[0]) if row else None
+
+  def put(self, sessionId: str, state: dict):
+    with self._lock, self._conn:
+      self._conn.execute(
+          "insert into sessions values (?, ?, ?) on conflict(id) do update set state = excluded.state, expires = excluded.expires",
+          (sessionId, json.dumps(state), time.time() + self.ttl))
+      self._conn.execute("delete from sessions where expires <= ?", (time.time(),))
+
+  def delete(self, sessionId: str):
+    with self._lock, self._conn:
+      self._conn.execute("delete from sessions where id = ?", (sessionId,))
+
+
+_sessionStore = None
+
+
+def setSessionStore(store):
+  global _sessionStore
+  _sessionStore = store
+
+
+def getSessionStore():
+  """Process-wide session store configured by SESSION_STORE."""
+  global _sessionStore
+  if _sessionStore is None:
+    config = os.environ.get("SESSION_STORE", "memory")
+    if config.startswith("sqlite:"):
+      _sessionStore = SqliteSessionStore(config[len("sqlite:"):])
+    elif config == "memory":
+      _sessionStore = MemorySessionStore()
+    else:
+      raise ValueError(f"Unknown SESSION_STORE: {config}")
+  return _sessionStore
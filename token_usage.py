@@ -0,0 +1,136 @@
+import math
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# id of the query currently handled by Orchestrator.run, set per thread/task
+currentQuery: ContextVar[str | None] = ContextVar("currentQuery", default=None)
+
+
+@dataclass
+class TokenBudget:
+  """Upper bounds for prompt parts that grow with usage. Token counts are estimated with `estimateTokens`.
+
+  Args:
+    maxHistoryTokens (int): Token limit of each agent's conversation memory before older turns are summarized.
+    maxAgentOutputTokens (int): Token limit of a single sub-agent output passed on to the summary.
+    maxSummaryInputTokens (int): Token limit of all agent outputs combined in the summary prompt.
+  """
+  maxHistoryTokens: int = 1000
+  maxAgentOutputTokens: int = 800
+  maxSummaryInputTokens: int = 2000
+
+
+@dataclass
+class UsageRecord:
+  agent: str
+  inputTokens: int
+  outputTokens: int
+  queryId: str | None = None
+  timestamp: float = field(default_factory=time.time)
+
+  @property
+  def totalTokens(self) -> int:
+    return self.inputTokens + self.outputTokens
+
+
+def estimateTokens(text: str) -> int:
+  """Rough token estimate (~4 characters per token), good enough for budgeting without an API round trip."""
+  return math.ceil(len(text) / 4) if text else 0
+
+
+def trimToTokens(text: str, maxTokens: int, marker: str = "\n[...truncated]") -> str:
+  """Cut `text` so that its estimated token count stays within `maxTokens`."""
+  if maxTokens is None or estimateTokens(text) <= maxTokens:
+    return text
+  return text[:max(0, maxTokens * 4 - len(marker))] + marker
+
+
+def percentile(values: list, q: float) -> float:
+  """Nearest-rank percentile of `values`, q in [0, 100]. Returns 0 for an empty list."""
+  if not values:
+    return 0
+  ordered = sorted(values)
+  rank = max(1, math.ceil(q / 100 * len(ordered)))
+  return ordered[rank - 1]
+
+
+class UsageTracker:
+  """Collects input/output tokens of every LLM call, grouped by agent and by query. One tracker covers one session."""
+
+  def __init__(self):
+    self.records: list[UsageRecord] = []
+    self.sessionId = uuid.uuid4().hex
+    self._lock = threading.Lock()
+
+  def record(self, agent: str, inputTokens: int, outputTokens: int):
+    with self._lock:
+      self.records.append(UsageRecord(agent, inputTokens, outputTokens, currentQuery.get()))
+
+  def startQuery(self) -> str:
+    """Mark the start of a user query. LLM calls recorded in the same context are attributed to it."""
+    queryId = uuid.uuid4().hex
+    currentQuery.set(queryId)
+    return queryId
+
+  def calls(self, queryId: str | None = None, agent: str | None = None) -> int:
+    """Number of LLM calls, optionally only those of one query and/or one agent."""
+    with self._lock:
+      return sum(1 for rec in self.records
+                 if (queryId is None or rec.queryId == queryId) and (agent is None or rec.agent == agent))
+
+  def byAgent(self) -> dict:
+    totals = dict()
+    with self._lock:
+      for rec in self.records:
+        agent = totals.setdefault(rec.agent, {"calls": 0, "inputTokens": 0, "outputTokens": 0})
+        agent["calls"] += 1
+        agent["inputTokens"] += rec.inputTokens
+        agent["outputTokens"] += rec.outputTokens
+    return totals
+
+  def byQuery(self) -> dict:
+    totals = dict()
+    with self._lock:
+      for rec in self.records:
+        if rec.queryId is not None:
+          totals[rec.queryId] = totals.get(rec.queryId, 0) + rec.totalTokens
+    return totals
+
+  def report(self) -> dict:
+    """Summary of the session: totals, per-agent breakdown and p50/p95 tokens per query."""
+    perQuery = list(self.byQuery().values())
+    with self._lock:
+      inputTokens = sum(rec.inputTokens for rec in self.records)
+      outputTokens = sum(rec.outputTokens for rec in self.records)
+      calls = len(self.records)
+    return {
+        "sessionId": self.sessionId,
+        "calls": calls,
+        "inputTokens": inputTokens,
+        "outputTokens": outputTokens,
+        "queries": len(perQuery),
+        "p50TokensPerQuery": percentile(perQuery, 50),
+        "p95TokensPerQuery": percentile(perQuery, 95),
+        "agents": self.byAgent(),
+    }
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+  """LangChain callback that forwards the token usage reported by the model to a UsageTracker."""
+
+  def __init__(self, tracker: UsageTracker, agent: str):
+    self.tracker = tracker
+    self.agent = agent
+
+  def on_llm_end(self, response: LLMResult, **kwargs):
+    for generations in response.generations:
+      for generation in generations:
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+        if usage:
+          self.tracker.record(self.agent, usage.get("input_tokens", 0), usage.get("output_tokens", 0))
@@ -0,0 +1,263 @@
+"""Lightweight request tracing for the Adventure Advisor pipeline.
+
+Spans are nested through a context variable, timed with wall clock, and handed to exporters when they end.
+Exporters are configured from the environment:
+- TRACE_FILE: append finished spans as JSON lines to this file
+- OTEL_EXPORTER_OTLP_ENDPOINT: send finished traces to an OpenTelemetry collector (OTLP/HTTP JSON)
+
+Print a flame-style breakdown of a recorded request with `python tracing.py trace.jsonl [--trace <traceId>]`.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from functools import wraps
+
+import requests
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+
+@dataclass
+class Span:
+  name: str
+  traceId: str
+  spanId: str
+  parentId: str | None = None
+  start: float = field(default_factory=time.time)
+  end: float | None = None
+  attributes: dict = field(default_factory=dict)
+
+  @property
+  def duration(self) -> float:
+    return (self.end or time.time()) - self.start
+
+  def setAttribute(self, key: str, value):
+    self.attributes[key] = value
+
+  def addCount(self, key: str, value: int = 1):
+    self.attributes[key] = self.attributes.get(key, 0) + value
+
+
+currentSpan: ContextVar[Span | None] = ContextVar("currentSpan", default=None)
+
+
+class JsonlExporter:
+  """Append every finished span as one JSON line to a local file."""
+
+  def __init__(self, path: str):
+    self.path = path
+    self._lock = threading.Lock()
+
+  def export(self, span: Span):
+    line = json.dumps(asdict(span), default=str)
+    with self._lock, open(self.path, "a") as f:
+      f.write(line + "\n")
+
+
+class OtlpExporter:
+  """Send finished traces to an OpenTelemetry collector using the OTLP/HTTP JSON encoding.
+  Spans are buffered per trace and posted once the root span ends."""
+
+  def __init__(self, endpoint: str, serviceName: str = "adventure-advisor", timeout: float = 2.0):
+    self.endpoint = endpoint.rstrip("/")
+    if not self.endpoint.endswith("/v1/traces"):
+      self.endpoint += "/v1/traces"
+    self.serviceName = serviceName
+    self.timeout = timeout
+    self._pending: dict[str, list[Span]] = dict()
+    self._lock = threading.Lock()
+
+  def export(self, span: Span):
+    with self._lock:
+      spans = self._pending.setdefault(span.traceId, [])
+      spans.append(span)
+      if span.parentId is not None:
+        return
+      del self._pending[span.traceId]
+
+    try:
+      requests.post(self.endpoint, json=self._payload(spans), timeout=self.timeout)
+    except requests.RequestException as e:
+      print(f"Could not export trace {span.traceId}: {e}")
+
+  def _payload(self, spans: list[Span]) -> dict:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_otlpAttribute("service.name", self.serviceName)]},
+        "scopeSpans": [{
+            "scope": {"name": "adventure-advisor"},
+            "spans": [{
+                "traceId": span.traceId,
+                "spanId": span.spanId,
+                "parentSpanId": span.parentId or "",
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(int(span.start * 1e9)),
+                "endTimeUnixNano": str(int(span.end * 1e9)),
+                "attributes": [_otlpAttribute(k, v) for k, v in span.attributes.items()],
+            } for span in spans],
+        }],
+    }]}
+
+
+def _otlpAttribute(key: str, value) -> dict:
+  if isinstance(value, bool):
+    return {"key": key, "value": {"boolValue": value}}
+  if isinstance(value, int):
+    return {"key": key, "value": {"intValue": str(value)}}
+  if isinstance(value, float):
+    return {"key": key, "value": {"doubleValue": value}}
+  return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Tracer:
+
+  def __init__(self, exporters: list | None = None):
+    self.exporters = exporters if exporters is not None else list()
+
+  @classmethod
+  def fromEnv(cls) -> "Tracer":
+    exporters = list()
+    if os.environ.get("TRACE_FILE"):
+      exporters.append(JsonlExporter(os.environ["TRACE_FILE"]))
+    if os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+      exporters.append(OtlpExporter(os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"]))
+    return cls(exporters)
+
+  def startSpan(self, name: str, parent: Span | None = None, **attributes) -> Span:
+    """Create a span without making it current, for work that starts and ends in different callbacks."""
+    parent = parent if parent is not None else currentSpan.get()
+    return Span(
+        name=name,
+        traceId=parent.traceId if parent else uuid.uuid4().hex,
+        spanId=uuid.uuid4().hex[:16],
+        parentId=parent.spanId if parent else None,
+        attributes=dict(attributes),
+    )
+
+  def endSpan(self, span: Span):
+    span.end = time.time()
+    for exporter in self.exporters:
+      exporter.export(span)
+
+  @contextmanager
+  def span(self, name: str, **attributes):
+    """Time the enclosed block as a child of the current span."""
+    span = self.startSpan(name, **attributes)
+    token = currentSpan.set(span)
+    try:
+      yield span
+    except Exception as e:
+      span.setAttribute("error", repr(e))
+      raise
+    finally:
+      currentSpan.reset(token)
+      self.endSpan(span)
+
+  def traced(self, name: str):
+    """Decorator version of `span`."""
+    def decorator(func):
+      @wraps(func)
+      def wrapper(*args, **kwargs):
+        with self.span(name):
+          return func(*args, **kwargs)
+      return wrapper
+    return decorator
+
+
+TRACER = Tracer.fromEnv()
+span = TRACER.span
+traced = TRACER.traced
+
+
+def setSpanAttribute(key: str, value):
+  """Set an attribute (e.g. cache_hit) on the current span, if any."""
+  current = currentSpan.get()
+  if current is not None:
+    current.setAttribute(key, value)
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+  """LangChain callback that records each LLM call as a span with its token counts."""
+
+  def __init__(self, agent: str, tracer: Tracer = TRACER):
+    self.agent = agent
+    self.tracer = tracer
+    self._spans: dict = dict()
+
+  def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+    self._spans[run_id] = self.tracer.startSpan(f"llm.{self.agent}")
+
+  def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+    span = self._spans.pop(run_id, None)
+    if span is None:
+      return
+    for generations in response.generations:
+      for generation in generations:
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+        if usage:
+          span.addCount("input_tokens", usage.get("input_tokens", 0))
+          span.addCount("output_tokens", usage.get("output_tokens", 0))
+    self.tracer.endSpan(span)
+
+  def on_llm_error(self, error, *, run_id, **kwargs):
+    span = self._spans.pop(run_id, None)
+    if span is not None:
+      span.setAttribute("error", repr(error))
+      self.tracer.endSpan(span)
+
+
+def loadTrace(path: str, traceId: str | None = None) -> list[dict]:
+  """Load the spans of one trace from a JSONL file. Defaults to the most recent trace."""
+  with open(path) as f:
+    spans = [json.loads(line) for line in f if line.strip()]
+  if not spans:
+    return []
+  if traceId is None:
+    traceId = max(spans, key=lambda s: s["start"])["traceId"]
+  return [s for s in spans if s["traceId"] == traceId]
+
+
+def printFlame(spans: list[dict], width: int = 40):
+  """Print spans as an indented tree with a bar showing offset and duration relative to the root span."""
+  if not spans:
+    print("No spans found.")
+    return
+
+  children = dict()
+  for s in spans:
+    children.setdefault(s["parentId"], []).append(s)
+  roots = children.get(None) or [min(spans, key=lambda s: s["start"])]
+  origin = min(s["start"] for s in spans)
+  total = max(s["end"] for s in spans) - origin or 1e-9
+
+  print(f"trace {spans[0]['traceId']}  total {total:.3f}s")
+
+  def walk(s, depth):
+    offset = int((s["start"] - origin) / total * width)
+    length = max(1, int((s["end"] - s["start"]) / total * width))
+    bar = " " * offset + "█" * min(length, width - offset)
+    extras = ", ".join(f"{k}={v}" for k, v in s["attributes"].items())
+    label = ("  " * depth + s["name"])[:40]
+    print(f"{label:<40} {s['end'] - s['start']:>8.3f}s |{bar:<{width}}| {extras}")
+    for child in sorted(children.get(s["spanId"], []), key=lambda c: c["start"]):
+      walk(child, depth + 1)
+
+  for root in roots:
+    walk(root, 0)
+
+
+if __name__ == "__main__":
+  import argparse
+
+  parser = argparse.ArgumentParser(description="Print a flame-style breakdown of one traced request")
+  parser.add_argument("file", help="JSONL trace file written via TRACE_FILE")
+  parser.add_argument("--trace", default=None, help="Trace id (default: most recent trace)")
+  parser.add_argument("--width", type=int, default=40, help="Width of the timeline bars")
+  args = parser.parse_args()
+
+  printFlame(loadTrace(args.file, args.trace), args.width)
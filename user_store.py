@@ -0,0 +1,195 @@
+"""User profile store: the sidebar preferences of every user.
+
+Profiles live in `user_config/<user>.json` by default. Set USER_STORE_DB to a SQLite file to keep them in one
+table instead, which scales to thousands of users. Export all profiles as JSON lines, or copy the JSON files
+into SQLite:
+
+  python user_store.py export [--output profiles.jsonl]
+  python user_store.py migrate users.db
+"""
+import copy
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+
+CONFIG_DIR = "user_config"
+# user ids become file names, so no separators or dots
+USER_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def validUser(user) -> str:
+  """`user` if it is a valid user id, raises ValueError otherwise."""
+  if not isinstance(user, str) or not USER_ID.match(user):
+    raise ValueError(f"Invalid user id {user!r}")
+  return user
+
+
+def defaultPreferences(user: str) -> dict:
+  return {
+      "name": f"{user}".capitalize(),
+      "age": None,
+      "distanceKm": 1,
+      "durationHours": 1,
+      "difficulty": 1,
+      "preferredActivities": ["Hiking"],
+      "location": "Trento"
+  }
+
+
+class FileUserStore:
+  """One JSON file per user. Reads are served from memory as long as the file's mtime is unchanged, writes go to
+  a temporary file that is renamed over the profile, so concurrent readers never see a partially written file."""
+
+  def __init__(self, directory: str = CONFIG_DIR):
+    self.directory = directory
+    self._cache: dict[str, tuple[int, dict]] = dict()
+    self._lock = threading.Lock()
+
+  def _path(self, user: str) -> str:
+    return os.path.join(self.directory, f"{validUser(user)}.json")
+
+  def get(self, user: str) -> dict:
+    """Profile of `user`, or an empty dict if there is none. Returns a copy that may be modified freely."""
+    path = self._path(user)
+    try:
+      mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+      return {}
+
+    cached = self._cache.get(user)
+    if cached is None or cached[0] != mtime:
+      with open(path, "r") as f:
+        cached = (mtime, json.load(f))
+      self._cache[user] = cached
+    return copy.deepcopy(cached[1])
+
+  def put(self, user: str, preferences: dict):
+    path = self._path(user)
+    os.makedirs(self.directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f".{user}.", suffix=".tmp")
+    try:
+      os.fchmod(fd, 0o644)  # mkstemp creates owner-only files
+      with os.fdopen(fd, "w") as f:
+        json.dump(preferences, f, indent=2)
+      os.replace(tmp, path)
+    except BaseException:
+      os.unlink(tmp)
+      raise
+    self._cache[user] = (os.stat(path).st_mtime_ns, copy.deepcopy(preferences))
+
+  def update(self, user: str, changes: dict) -> dict:
+    """Merge `changes` into the stored profile and return the result. Updates from concurrent sessions of this
+    process are serialized, so none of them is lost."""
+    with self._lock:
+      preferences = self.get(user)
+      preferences.update(changes)
+      self.put(user, preferences)
+      return preferences
+
+  def users(self) -> list[str]:
+    if not os.path.isdir(self.directory):
+      return []
+    return sorted(f[:-len(".json")] for f in os.listdir(self.directory) if f.endswith(".json") and not f.startswith("."))
+
+  def export(self, users: list[str] | None = None) -> dict[str, dict]:
+    """Profiles of `users` (all by default) keyed by user name, users without a profile are skipped."""
+    profiles = {user: self.get(user) for user in (self.users() if users is None else users)}
+    return {user: preferences for user, preferences in profiles.items() if preferences}
+
+
+class SqliteUserStore:
+  """All profiles in one SQLite table, one JSON document per user. Updates run in a transaction."""
+
+  def __init__(self, path: str = "users.db"):
+    self._lock = threading.Lock()
+    self._conn = sqlite3.connect(path, check_same_thread=False)
+    self._conn.execute(
+        "create table if not exists user_profiles (user text primary key, preferences text not null, updated real)")
+    self._conn.commit()
+
+  def get(self, user: str) -> dict:
+    with self._lock:
+      row = self._conn.execute("select preferences from user_profiles where user = ?", (user,)).fetchone()
+    return json.loads(row[0]) if row else {}
+
+  def _put(self, user: str, preferences: dict):
+    self._conn.execute(
+        "insert into user_profiles values (?, ?, ?) "
+        "on conflict(user) do update set preferences = excluded.preferences, updated = excluded.updated",
+        (user, json.dumps(preferences), time.time()))
+
+  def put(self, user: str, preferences: dict):
+    with self._lock, self._conn:
+      self._put(user, preferences)
+
+  def update(self, user: str, changes: dict) -> dict:
+    with self._lock, self._conn:
+      row = self._conn.execute("select preferences from user_profiles where user = ?", (user,)).fetchone()
+      preferences = {**(json.loads(row[0]) if row else {}), **changes}
+      self._put(user, preferences)
+    return preferences
+
+  def putMany(self, profiles: dict[str, dict]):
+    """Write many profiles in a single transaction."""
+    with self._lock, self._conn:
+      for user, preferences in profiles.items():
+        self._put(user, preferences)
+
+  def users(self) -> list[str]:
+    with self._lock:
+      return [row[0] for row in self._conn.execute("select user from user_profiles order by user")]
+
+  def export(self, users: list[str] | None = None) -> dict[str, dict]:
+    sql, params = "select user, preferences from user_profiles", ()
+    if users is not None:
+      sql += f" where user in ({', '.join('?' for _ in users)})"
+      params = tuple(users)
+    with self._lock:
+      rows = self._conn.execute(sql + " order by user", params).fetchall()
+    return {user: json.loads(preferences) for user, preferences in rows}
+
+
+_userStore = None
+
+
+def setUserStore(store):
+  """Replace the store returned by `getUserStore`, e.g. with an in-memory SqliteUserStore(":memory:") in tests."""
+  global _userStore
+  _userStore = store
+
+
+def getUserStore():
+  """Process-wide store shared by all sessions: SqliteUserStore if USER_STORE_DB is set, JSON files otherwise."""
+  global _userStore
+  if _userStore is None:
+    path = os.environ.get("USER_STORE_DB")
+    _userStore = SqliteUserStore(path) if path else FileUserStore()
+  return _userStore
+
+
+if __name__ == "__main__":
+  import argparse
+  import sys
+
+  parser = argparse.ArgumentParser(description="Export or migrate user profiles")
+  subparsers = parser.add_subparsers(dest="command", required=True)
+  exportParser = subparsers.add_parser("export", help="Write all profiles of the configured store as JSON lines")
+  exportParser.add_argument("--output", help="Output file, stdout by default")
+  migrateParser = subparsers.add_parser("migrate", help="Copy the JSON profiles of user_config/ into a SQLite store")
+  migrateParser.add_argument("database")
+  args = parser.parse_args()
+
+  if args.command == "export":
+    out = open(args.output, "w") if args.output else sys.stdout
+    for user, preferences in getUserStore().export().items():
+      out.write(json.dumps({"user": user, "preferences": preferences}) + "\n")
+    if out is not sys.stdout:
+      out.close()
+  else:
+    profiles = FileUserStore().export()
+    SqliteUserStore(args.database).putMany(profiles)
+    print(f"Migrated {len(profiles)} profiles to {args.database}")
@@ -7,10 +7,13 @@ from langchain_core.tools import tool
 from langchain_community.utilities import OpenWeatherMapAPIWrapper
 
 from base_agent import BaseAgent
+from tracing import traced
+from recorder import recorded
 
 
 WEATHER_PROMPT_TEMPLATE = (
     "Extract the date and location from the input and convert the date to string YYYY-MM-DD format, then call the `getWeather` tool with the extracted date and location."
+    "If the input involves several dates (e.g. a weekend) or several locations, call `getWeatherBatch` once with all of them instead of calling `getWeather` repeatedly."
     "If no specific date is provided, assume the request is for today."
     "Today is {today}."
     "Example:"
@@ -30,10 +33,75 @@ WEATHER_PROMPT_TEMPLATE = (
         "forecast": [<returned weather information>]
       }}
     }}"""
+    "When the weather of several dates or locations was fetched, return \"data\" as a list with one such object per location and date."
 )
 
 
+# upper bound of concurrent wttr.in requests of one getWeatherBatch call
+MAX_CONCURRENT_FETCHES = 4
+BATCH_COLUMNS = ("location", "date", "avg_temp", "high", "low", "snowfall", "max_rain_chance", "sunrise", "sunset")
+
+
+def dailyForecast(daily, location: str) -> dict:
+  rainChance = dict()
+  for hourly in daily.hourly_forecasts:
+    rainChance.update(
+        {hourly.time.isoformat(): hourly.chances_of_rain}
+    )
+
+  return {
+      "date": str(daily.date),
+      "location": location,
+      "sunrise": daily.sunrise,
+      "sunset": daily.sunset,
+      "sunlight": daily.sunlight,
+      "avg_temperature": daily.temperature,
+      "highest_temperature": daily.highest_temperature,
+      "lowest_temperature": daily.lowest_temperature,
+      "snowfall": daily.snowfall,
+      "rain_chance": rainChance,
+  }
+
+
+async def fetchForecasts(client, location: str) -> dict[str, dict]:
+  """All days wttr.in forecasts for `location` with one request, keyed by YYYY-MM-DD."""
+  forecasts = await client.get(location)
+  return {str(daily.date): dailyForecast(daily, location) for daily in forecasts}
+
+
+@traced("weather.fetchForecastsBatch")
+# own name: replay falls back to the next entry of the same name, which must have this function's result shape
+@recorded("wttr.in.batch")
+def fetchForecastsBatch(locations: list[str]) -> dict[str, dict[str, dict]]:
+  """Forecasts of all days for each location, keyed by location and YYYY-MM-DD. Locations are fetched concurrently,
+  at most MAX_CONCURRENT_FETCHES at a time, locations that fail are missing from the result."""
+
+  async def fetchAll() -> list:
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    async with python_weather.Client(unit=python_weather.METRIC) as client:
+
+      async def fetch(location: str):
+        async with semaphore:
+          return await fetchForecasts(client, location)
+
+      return await asyncio.gather(*(fetch(location) for location in locations), return_exceptions=True)
+
+  results = asyncio.run(fetchAll())
+  return {location: forecasts for location, forecasts in zip(locations, results) if not isinstance(forecasts, BaseException)}
+
+
+def forecastRow(location: str, date: str, forecast: dict | None) -> list:
+  if forecast is None:
+    return [location, date] + ["n/a"] * (len(BATCH_COLUMNS) - 2)
+  return [
+      location, date, forecast["avg_temperature"], forecast["highest_temperature"], forecast["lowest_temperature"],
+      forecast["snowfall"], max(forecast["rain_chance"].values(), default=0), forecast["sunrise"], forecast["sunset"],
+  ]
+
+
 @tool
+@traced("tool.getWeather")
+@recorded("wttr.in")
 def getWeather(location: str, date: str) -> dict:
   """
   Get the weather forecast for a specific location and date using the python-weather library.
@@ -53,25 +121,7 @@ def getWeather(location: str, date: str) -> dict:
 
       for daily in forecasts:
         if daily.date == targetDay:
-
-          rainChance = dict()
-          for hourly in daily.hourly_forecasts:
-            rainChance.update(
-                {hourly.time.isoformat(): hourly.chances_of_rain}
-            )
-
-          return {
-              "date": str(daily.date),
-              "location": location,
-              "sunrise": daily.sunrise,
-              "sunset": daily.sunset,
-              "sunlight": daily.sunlight,
-              "avg_temperature": daily.temperature,
-              "highest_temperature": daily.highest_temperature,
-              "lowest_temperature": daily.lowest_temperature,
-              "snowfall": daily.snowfall,
-              "rain_chance": rainChance,
-          }
+          return dailyForecast(daily, location)
 
       return {"error": "No forecast found for this date."}
 
@@ -80,7 +130,37 @@ def getWeather(location: str, date: str) -> dict:
   return result
 
 
-TOOLS = [getWeather]
+@tool
+@traced("tool.getWeatherBatch")
+def getWeatherBatch(locations: list[str], dates: list[str]) -> str:
+  """
+  Get the weather forecast for several locations and dates in one call, e.g. to compare places over a weekend.
+  Prefer this tool over repeated getWeather calls whenever more than one location or date is involved.
+
+  Args:
+    locations (list[str]): The locations for which to fetch the weather.
+    dates (list[str]): The dates for which to fetch the weather, in YYYY-MM-DD format.
+  Returns:
+    str: table with a header line and one row per location and date, fields separated by '|'.
+      Temperatures in °C, max_rain_chance in %. Dates without a forecast are marked n/a.
+  """
+  # each location is fetched once for all dates, "Trento" and "trento " count as the same location
+  unique, seen = list(), set()
+  for location in locations:
+    if location.strip().lower() not in seen:
+      seen.add(location.strip().lower())
+      unique.append(location.strip())
+
+  forecasts = fetchForecastsBatch(unique)
+  lines = ["|".join(BATCH_COLUMNS)]
+  for location in unique:
+    for date in dates:
+      forecast = forecasts.get(location, {}).get(date)
+      lines.append("|".join(str(value) for value in forecastRow(location, date, forecast)))
+  return "\n".join(lines)
+
+
+TOOLS = [getWeather, getWeatherBatch]
 
 
 class WeatherAgent(BaseAgent):
@@ -88,9 +168,10 @@ class WeatherAgent(BaseAgent):
   Specialized agent for fetching weather forecasts, uses LangChain framework and the python-weather library to get weather data.
   """
 
-  def __init__(self, apiKey, tools=TOOLS, promptTemplate=WEATHER_PROMPT_TEMPLATE):
+  def __init__(self, apiKey, tools=TOOLS, promptTemplate=WEATHER_PROMPT_TEMPLATE, **kwargs):
     super().__init__(
         apiKey=apiKey,
         tools=tools,
-        promptTemplate=promptTemplate
+        promptTemplate=promptTemplate,
+        **kwargs
     )